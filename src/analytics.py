@@ -0,0 +1,272 @@
+from helper import (
+    iter_revenue_samples, iter_jsonl_file, iter_json_array, hashrate_to_hs, get_partition_date, get_environ_or_default,
+    get_storage_format, get_partition_timestamp, get_date_from_timestamp, JSONL_EXTENSIONS, WORKERS_DIR
+)
+from timeseries import read_columns, REVENUE_COLUMNS, HASHRATE_COLUMNS
+from catalog import get_catalog, catalog_range
+from compaction import load_daily_tier
+from sqlite_store import query_samples, query_worker_samples, query_daily_totals
+import numpy as np
+import os
+
+# Analityka szeregów revenue60m i hashrate urządzeń na tablicach NumPy.
+# Szeregi wczytywane są do tablic jednym przebiegiem (kolumny formatu columnar bez kopiowania),
+# a wszystkie wskaźniki liczone są wektorowo - bez pętli po rekordach w Pythonie.
+
+# Typ rekordu próbki revenue60m (znacznik czasu w sekundach epoki, wartość)
+SAMPLE_DTYPE = np.dtype([("ts", np.int64), ("val", np.float64)])
+
+# Typ rekordu odczytu urządzenia (indeks urządzenia, znacznik czasu, hashrate [H/s])
+WORKER_ROW_DTYPE = np.dtype([("index", np.int64), ("ts", np.int64), ("val", np.float64)])
+
+# Pola rekordów urządzeń odczytywane z partycji json (iter_json_array)
+WORKER_FIELDS = ("timestamp", "hashrate24h.worker", "hashrate24h.hashrate", "hashrate24h.hashrate_unit")
+
+def get_analytics_settings():
+    """
+    Wczytuje parametry analityki: okno średniej kroczącej i zmienności (liczba próbek),
+    okno bazowe hashrate urządzeń (godziny) i próg spadku hashrate (%).
+    """
+    return {
+        "rolling_window": int(get_environ_or_default("ANALYTICS_WINDOW", 60)),
+        "baseline_hours": float(get_environ_or_default("HASHRATE_BASELINE_HOURS", 24)),
+        "drop_threshold": float(get_environ_or_default("HASHRATE_DROP_THRESHOLD", 20))
+    }
+
+def get_date_range(end_date_str, days):
+    """Zwraca zakres dat (start, end) "YYYY-MM-DD" obejmujący days dni kończących się dniem end_date_str."""
+    return get_date_from_timestamp(get_partition_timestamp(end_date_str) - (days - 1) * 86400), end_date_str
+
+def get_day_start(date_str):
+    """Zwraca początek dnia date_str (UTC) w sekundach epoki."""
+    return get_partition_timestamp(date_str)
+
+def get_timestamp_range(start, end):
+    """Zwraca zakres [początek dnia start, koniec dnia end) w sekundach epoki (granice opcjonalne)."""
+    return (
+        get_day_start(start) if start is not None else None,
+        get_day_start(end) + 86400 if end is not None else None
+    )
+
+def load_revenue_arrays(data_dir, revenue_dir, start=None, end=None):
+    """
+    Wczytuje próbki revenue60m z partycji z zakresu [start, end] do tablic NumPy.
+    Zwraca (znaczniki czasu int64, wartości float64) posortowane według czasu.
+    """
+    # Format sqlite: próbki z zakresu czasu (indeks (wallet, series, ts))
+    if get_storage_format() == "sqlite":
+        samples = np.array(query_samples(data_dir, revenue_dir, *get_timestamp_range(start, end)), dtype=np.float64).reshape(-1, 2)
+        return samples[:, 0].astype(np.int64), samples[:, 1]
+
+    path = os.path.join(data_dir, revenue_dir)
+    parts = []
+    for date_str, file in catalog_range(get_catalog(data_dir, revenue_dir), start, end):
+        if file.endswith(".val"):
+            columns = read_columns(path, date_str, REVENUE_COLUMNS)
+            part = np.empty(len(columns["ts"]), dtype=SAMPLE_DTYPE)
+            part["ts"] = np.frombuffer(columns["ts"], dtype=np.int64)
+            part["val"] = np.frombuffer(columns["val"], dtype=np.float64)
+        else:
+            samples = iter_revenue_samples(os.path.join(path, file))
+            if samples is None:
+                continue
+            part = np.fromiter(samples, dtype=SAMPLE_DTYPE)
+        parts.append(part)
+
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    samples = np.concatenate(parts)
+    samples = samples[np.argsort(samples["ts"], kind="stable")]
+    return samples["ts"], samples["val"]
+
+def load_daily_totals(data_dir, revenue_dir):
+    """
+    Zwraca (daty, sumy, liczby próbek) revenue60m dla wszystkich dni - z kubełków dziennych (compaction.py)
+    i podsumowań partycji w katalogu partycji, bez wczytywania surowych danych.
+    """
+    if get_storage_format() == "sqlite":
+        totals = query_daily_totals(data_dir, revenue_dir)
+    else:
+        totals = {date_str: (bucket["sum"], bucket["count"]) for date_str, bucket in load_daily_tier(data_dir, revenue_dir).items()}
+        catalog = get_catalog(data_dir, revenue_dir)
+        for date_str in catalog["dates"]:
+            rollup = catalog["partitions"][date_str]["rollup"]
+            totals[date_str] = (rollup["sum"], rollup["count"])
+    dates = sorted(totals)
+    sums = np.array([totals[date_str][0] for date_str in dates], dtype=np.float64)
+    counts = np.array([totals[date_str][1] for date_str in dates], dtype=np.float64)
+    return dates, sums, counts
+
+def rolling_mean(values, window):
+    """Średnia krocząca z okna window próbek (sumy skumulowane - O(n) niezależnie od okna)."""
+    window = max(1, min(window, len(values)))
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return (cumulative[window:] - cumulative[:-window]) / window
+
+def rolling_std(values, window):
+    """Odchylenie standardowe kroczące z okna window próbek (zmienność)."""
+    window = max(1, min(window, len(values)))
+    mean = rolling_mean(values, window)
+    mean_of_squares = rolling_mean(np.square(values, dtype=np.float64), window)
+    return np.sqrt(np.clip(mean_of_squares - np.square(mean), 0.0, None))
+
+def percent_change(current, previous):
+    """Zmiana procentowa (None, gdy brak punktu odniesienia)."""
+    if previous is None or current is None or not np.isfinite(previous) or previous == 0:
+        return None
+    return float((current - previous) / previous * 100)
+
+def compute_period_deltas(dates, sums, counts, current_date_str):
+    """Zwraca zmianę średniej dzień do dnia i tydzień do tygodnia (w %) dla dnia current_date_str."""
+    if not dates:
+        return None, None
+    # Numery dni od początku epoki
+    ordinals = np.array([get_partition_timestamp(date_str) // 86400 for date_str in dates])
+    current = get_partition_timestamp(current_date_str) // 86400
+
+    def period_mean(first, last):
+        mask = (ordinals >= first) & (ordinals <= last)
+        count = counts[mask].sum()
+        return sums[mask].sum() / count if count else None
+
+    day_over_day = percent_change(period_mean(current, current), period_mean(current - 1, current - 1))
+    week_over_week = percent_change(period_mean(current - 6, current), period_mean(current - 13, current - 7))
+    return day_over_day, week_over_week
+
+def load_hashrate_matrix(data_dir, hashrate_dir, start, end):
+    """
+    Wczytuje hashrate urządzeń (H/s) z partycji z zakresu [start, end] do macierzy [urządzenie, odczyt].
+    Brak odczytu urządzenia w danym cyklu to NaN. Zwraca (lista urządzeń, znaczniki czasu odczytów, macierz).
+    """
+    workers_path = os.path.join(data_dir, hashrate_dir, WORKERS_DIR)
+    worker_index = {}
+    indices, timestamps, values = [], [], []
+    if get_storage_format() == "sqlite":
+        # Format sqlite: odczyty wszystkich urządzeń portfela z zakresu czasu (indeks (wallet, ts))
+        rows = query_worker_samples(data_dir, *get_timestamp_range(start, end))
+        if rows:
+            row_workers, row_timestamps, row_values = zip(*rows)
+            indices.append(np.array([worker_index.setdefault(worker, len(worker_index)) for worker in row_workers], dtype=np.int64))
+            timestamps.append(np.array(row_timestamps, dtype=np.int64))
+            values.append(np.array(row_values, dtype=np.float64))
+    elif os.path.isdir(workers_path):
+        for entry in sorted(os.listdir(workers_path)):
+            entry_path = os.path.join(workers_path, entry)
+            # Format columnar: katalog urządzenia z kolumnami dziennymi
+            if os.path.isdir(entry_path):
+                for file in sorted(os.listdir(entry_path)):
+                    date_str = get_partition_date(file)
+                    if not file.endswith(".val") or date_str is None or not start <= date_str <= end:
+                        continue
+                    columns = read_columns(entry_path, date_str, HASHRATE_COLUMNS)
+                    index = worker_index.setdefault(entry, len(worker_index))
+                    timestamps.append(np.frombuffer(columns["ts"], dtype=np.int64))
+                    values.append(np.frombuffer(columns["val"], dtype=np.float64))
+                    indices.append(np.full(len(columns["ts"]), index, dtype=np.int64))
+                continue
+
+            # Formaty json i jsonl: rekordy wszystkich urządzeń w partycji dziennej
+            date_str = get_partition_date(entry)
+            if date_str is None or not start <= date_str <= end or not entry.endswith((".json",) + JSONL_EXTENSIONS):
+                continue
+            records = iter_jsonl_file(entry_path) if entry.endswith(JSONL_EXTENSIONS) else iter_json_array(entry_path, WORKER_FIELDS)
+            rows = np.fromiter((
+                (worker_index.setdefault(record["hashrate24h"]["worker"], len(worker_index)), record["timestamp"],
+                 hashrate_to_hs(record["hashrate24h"]["hashrate"], record["hashrate24h"]["hashrate_unit"]))
+                for record in records if "hashrate24h" in record and "timestamp" in record
+            ), dtype=WORKER_ROW_DTYPE)
+            if len(rows):
+                indices.append(rows["index"])
+                timestamps.append(rows["ts"])
+                values.append(rows["val"])
+
+    workers = sorted(worker_index, key=worker_index.get)
+    if not timestamps:
+        return workers, np.empty(0, dtype=np.int64), np.empty((len(workers), 0))
+
+    # Odczyty wszystkich urządzeń z jednego cyklu mają ten sam znacznik czasu
+    ticks, tick_index = np.unique(np.concatenate(timestamps), return_inverse=True)
+    matrix = np.full((len(workers), len(ticks)), np.nan)
+    matrix[np.concatenate(indices), tick_index] = np.concatenate(values)
+    return workers, ticks, matrix
+
+def row_nanmean(matrix):
+    """Średnia wierszy macierzy z pominięciem NaN (NaN dla wierszy bez wartości)."""
+    counts = np.count_nonzero(~np.isnan(matrix), axis=1)
+    sums = np.nansum(matrix, axis=1)
+    return np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
+
+def detect_hashrate_drops(workers, ticks, matrix, baseline_seconds, threshold_percent):
+    """
+    Oznacza urządzenia, których ostatni odczyt hashrate jest niższy od średniej z okna baseline_seconds
+    o więcej niż threshold_percent (brak ostatniego odczytu to spadek do zera). Zwraca listę anomalii.
+    """
+    if not len(ticks):
+        return []
+    window = ticks >= ticks[-1] - baseline_seconds
+    baseline = row_nanmean(matrix[:, window])
+    latest = np.nan_to_num(matrix[:, -1], nan=0.0)
+    drop = np.divide(baseline - latest, baseline, out=np.zeros(len(baseline)), where=baseline > 0) * 100
+    flagged = np.flatnonzero(drop > threshold_percent)
+    return [
+        {
+            "worker": workers[index],
+            "baseline_hs": float(baseline[index]),
+            "latest_hs": float(latest[index]),
+            "drop_percent": round(float(drop[index]), 2)
+        }
+        for index in flagged[np.argsort(-drop[flagged], kind="stable")]
+    ]
+
+def compute_efficiency(revenue_ts, revenue_values, ticks, matrix):
+    """
+    Zwraca średnią wydajność (revenue60m na TH/s hashrate wszystkich urządzeń) dla próbek revenue60m.
+    Każda próbka jest łączona z ostatnim odczytem hashrate nie późniejszym niż ona.
+    """
+    if not len(ticks) or not len(revenue_ts):
+        return None
+    total_ths = np.nansum(matrix, axis=0) / 1e12
+    index = np.searchsorted(ticks, revenue_ts, side="right") - 1
+    valid = index >= 0
+    valid[valid] = total_ths[index[valid]] > 0
+    if not valid.any():
+        return None
+    return float(np.mean(revenue_values[valid] / total_ths[index[valid]]))
+
+def compute_analytics(data_dir, revenue_dir, hashrate_dir, current_date_str, settings, daily_totals=None):
+    """
+    Oblicza wskaźniki analityczne dla dnia current_date_str:
+    średnią kroczącą i zmienność revenue60m, zmiany dzień do dnia i tydzień do tygodnia,
+    wydajność (revenue60m na TH/s) i anomalie hashrate urządzeń.
+    settings: {"rolling_window", "baseline_hours", "drop_threshold"}.
+    daily_totals: wynik load_daily_totals wczytany raz dla wielu dni (backfill.py).
+    """
+    # Próbki revenue60m dnia bieżącego
+    revenue_ts, revenue_values = load_revenue_arrays(data_dir, revenue_dir, current_date_str, current_date_str)
+    analytics = {
+        "rolling_mean_revenue60m": None,
+        "volatility_revenue60m": None,
+        "dod_percent": None,
+        "wow_percent": None,
+        "efficiency_revenue60m_per_ths": None,
+        "hashrate_ths": None,
+        "anomalies": []
+    }
+    if len(revenue_values):
+        analytics["rolling_mean_revenue60m"] = float(rolling_mean(revenue_values, settings["rolling_window"])[-1])
+        analytics["volatility_revenue60m"] = float(rolling_std(revenue_values, settings["rolling_window"])[-1])
+
+    # Zmiany średnich dziennych (z podsumowań, bez surowych danych)
+    dates, sums, counts = daily_totals or load_daily_totals(data_dir, revenue_dir)
+    analytics["dod_percent"], analytics["wow_percent"] = compute_period_deltas(dates, sums, counts, current_date_str)
+
+    # Hashrate urządzeń: dzień bieżący i poprzedni (okno bazowe)
+    if hashrate_dir:
+        start, end = get_date_range(current_date_str, 2)
+        workers, ticks, matrix = load_hashrate_matrix(data_dir, hashrate_dir, start, end)
+        if len(ticks):
+            analytics["hashrate_ths"] = float(np.nansum(matrix[:, -1]) / 1e12)
+            analytics["anomalies"] = detect_hashrate_drops(workers, ticks, matrix, settings["baseline_hours"] * 3600, settings["drop_threshold"])
+            current_ticks = ticks >= get_day_start(current_date_str)
+            analytics["efficiency_revenue60m_per_ths"] = compute_efficiency(revenue_ts, revenue_values, ticks[current_ticks], matrix[:, current_ticks])
+    return analytics
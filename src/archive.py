@@ -0,0 +1,121 @@
+from helper import (
+    iter_json_array, iter_jsonl_file, iter_revenue_values, write_json_file, get_file_signature, get_partition_date,
+    get_summary_path, fsync_directory, log, ARCHIVE_EXTENSION, JSONL_EXTENSIONS
+)
+from catalog import new_rollup, update_rollup, get_catalog_path, load_catalog, save_catalog
+from locks import partition_lock
+from stats import new_stats, update_stats
+import gzip
+import itertools
+import json
+import os
+
+# Archiwizacja zamkniętych partycji dziennych: po północy UTC partycje z poprzednich dni nie są już
+# zapisywane, więc pliki json (tablica z wcięciami) i jsonl są przepisywane do <data>.jsonl.gz
+# (JSON Lines skompresowany gzip, odczyt strumieniowy przez helper.iter_jsonl_file).
+# Dla szeregu revenue60m obok zapisywane jest podsumowanie <data>.summary (liczba, suma, min, max
+# i stan statystyk), dzięki któremu raporty i katalog partycji nie muszą dekompresować pliku.
+# Partycje formatu columnar są już zwartym zapisem binarnym odczytywanym przez mmap i nie są kompresowane.
+
+def get_archive_path(file_path):
+    """Zwraca ścieżkę skompresowanej partycji dla pliku partycji json lub jsonl."""
+    path, file = os.path.split(file_path)
+    return os.path.join(path, file.split(".", 1)[0] + ARCHIVE_EXTENSION)
+
+def write_archive(file_path, records):
+    """Zapisuje rekordy do skompresowanej partycji atomowo (plik tymczasowy, fsync, podmiana)."""
+    archive_path = get_archive_path(file_path)
+    tmp_path = f"{archive_path}.tmp"
+    with open(tmp_path, "wb") as raw_file:
+        # mtime=0 - identyczne dane dają identyczny plik
+        with gzip.GzipFile(fileobj=raw_file, mode="wb", mtime=0) as file:
+            for record in records:
+                file.write((json.dumps(record, separators=(",", ":")) + "\n").encode())
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+    os.replace(tmp_path, archive_path)
+    fsync_directory(os.path.dirname(archive_path))
+    return archive_path
+
+def write_summary(archive_path):
+    """Zapisuje podsumowanie skompresowanej partycji revenue60m (jeden przebieg po danych)."""
+    rollup = new_rollup()
+    stats = new_stats()
+    for value in iter_revenue_values(archive_path):
+        update_rollup(rollup, value)
+        update_stats(stats, value)
+    rollup["stats"] = stats
+    rollup["signature"] = get_file_signature(archive_path)
+    write_json_file(get_summary_path(archive_path), rollup)
+    return rollup
+
+def update_catalog_entry(data_dir, series_dir, date_str, archive_path):
+    """Podmienia plik partycji w katalogu partycji szeregu (liczba próbek i podsumowanie się nie zmieniają)."""
+    with partition_lock(data_dir, series_dir, "catalog"):
+        catalog_path = get_catalog_path(data_dir, series_dir)
+        catalog = load_catalog(catalog_path)
+        if catalog is None or date_str not in catalog["partitions"]:
+            return
+        entry = catalog["partitions"][date_str]
+        entry["file"] = os.path.basename(archive_path)
+        entry["bytes"] = os.path.getsize(archive_path)
+        save_catalog(catalog_path, catalog)
+
+def iter_partition_records(file_path):
+    """Zwraca strumieniowo rekordy partycji json, jsonl lub skompresowanej partycji .jsonl.gz."""
+    return iter_jsonl_file(file_path) if file_path.endswith(JSONL_EXTENSIONS) else iter_json_array(file_path)
+
+def archive_partition(file_paths):
+    """
+    Przepisuje partycje json i jsonl jednego dnia do <data>.jsonl.gz strumieniowo (rekord po rekordzie)
+    i usuwa pliki źródłowe. Oba pliki dnia (np. w katalogu częściowo przeniesionym między formatami)
+    i istniejące już archiwum tego dnia są łączone w jedno archiwum, więc żaden z nich nie nadpisuje pozostałych.
+    Zwraca ścieżkę archiwum lub None.
+    """
+    file_paths = [file_path for file_path in file_paths if os.path.exists(file_path)]
+    if not file_paths:
+        return None
+    archive_path = get_archive_path(file_paths[0])
+    sources = ([archive_path] if os.path.exists(archive_path) else []) + file_paths
+    records = itertools.chain.from_iterable(iter_partition_records(file_path) for file_path in sources)
+    write_archive(archive_path, records)
+    for file_path in file_paths:
+        os.remove(file_path)
+    return archive_path
+
+def archive_closed_partitions(data_dir, series_dir, today_str, summarize=False):
+    """
+    Kompresuje partycje json i jsonl szeregu series_dir sprzed dnia today_str.
+    Dla szeregu revenue60m (summarize=True) zapisuje podsumowania i aktualizuje katalog partycji.
+    Zwraca listę (data, ścieżka archiwum) zarchiwizowanych partycji.
+    """
+    path = os.path.join(data_dir, series_dir)
+    if not os.path.isdir(path):
+        return []
+
+    # Pliki json i jsonl tego samego dnia trafiają do jednego archiwum
+    partitions = {}
+    for file in sorted(os.listdir(path)):
+        if not file.endswith((".json",) + JSONL_EXTENSIONS) or file.endswith(ARCHIVE_EXTENSION):
+            continue
+        date_str = get_partition_date(file)
+        if date_str is None or date_str >= today_str:
+            continue
+        partitions.setdefault(date_str, []).append(os.path.join(path, file))
+
+    archived = []
+    for date_str, file_paths in partitions.items():
+        with partition_lock(data_dir, series_dir, date_str):
+            archive_path = archive_partition(file_paths)
+            if archive_path is None:
+                log(f"Nie można zarchiwizować plików: {', '.join(file_paths)}")
+                continue
+            if summarize:
+                write_summary(archive_path)
+                update_catalog_entry(data_dir, series_dir, date_str, archive_path)
+            # Zapamiętana ostatnia odpowiedź zamkniętego dnia nie jest już potrzebna (snapshot.py)
+            snapshot_path = os.path.join(path, f"{date_str}.snapshot")
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+        archived.append((date_str, archive_path))
+    return archived
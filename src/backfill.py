@@ -0,0 +1,167 @@
+from helper import (
+    get_environ, get_environ_or_default, get_datetime_utc, get_storage_format, log, iter_revenue_values,
+    get_partition_timestamp, get_date_from_timestamp
+)
+from catalog import get_catalog, catalog_range
+from locks import job_lock, partition_lock
+from tenants import get_wallet_registry
+from stats import new_stats, merge_stats, compute_stats
+from analytics import compute_analytics, get_analytics_settings, load_daily_totals
+from report_revenue_history_vs_current import load_daily_states, build_report_data, write_report
+from sqlite_store import query_daily_stats, query_date_range, get_day_range
+from metrics import instrumented_job
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import sys
+import os
+
+# Odtwarzanie raportów dziennych "historia do dnia D vs dzień D" (report_revenue_history_vs_current.py)
+# dla zakresu dat, np. po naprawie danych lub zmianie logiki raportu:
+#     python backfill.py 2024-01-01 2024-03-31
+# Stany statystyk dni wczytywane są raz (kubełki dzienne, podsumowania partycji), historia każdego dnia
+# to suma prefiksowa tych stanów (jedno łączenie na dzień), a raporty dni budowane są równolegle w puli procesów.
+
+def parse_date_range(args):
+    """Zwraca zakres dat (start, end) z argumentów "START [END]" w formacie YYYY-MM-DD lub None."""
+    if not 1 <= len(args) <= 2:
+        return None
+    try:
+        start, end = (datetime.strptime(arg, "%Y-%m-%d").strftime("%Y-%m-%d") for arg in (args[0], args[-1]))
+    except ValueError:
+        return None
+    return (start, end) if start <= end else None
+
+def get_next_date(date_str):
+    """Zwraca dzień następny po date_str."""
+    return get_date_from_timestamp(get_partition_timestamp(date_str) + 86400)
+
+# Sumy dzienne revenue60m (analytics.load_daily_totals) wspólne dla wszystkich dni zakresu,
+# przekazywane do procesów puli raz (inicjalizacja procesu), a nie z każdym zadaniem
+shared_daily_totals = None
+
+def init_worker(daily_totals):
+    """Inicjalizuje proces puli."""
+    global shared_daily_totals
+    shared_daily_totals = daily_totals
+
+def build_day_report(task):
+    """
+    Buduje i zapisuje raport jednego dnia (wykonywane w procesie puli).
+    Zwraca (data, ścieżka raportu lub None).
+    """
+    date_str = task["date"]
+    current_stats = task["current_stats"]
+
+    # Dzień bieżący (otwarta partycja) jest czytany z blokadą współdzieloną - kolektor może do niej dopisywać
+    with partition_lock(task["data_dir"], task["revenue_dir"], date_str, shared=True):
+        if task["current_file"] is not None:
+            values = iter_revenue_values(os.path.join(task["data_dir"], task["revenue_dir"], task["current_file"]))
+            if values is not None:
+                current_stats = compute_stats(values)
+        analytics = compute_analytics(
+            task["data_dir"], task["revenue_dir"], task["hashrate_dir"], date_str, task["analytics_settings"], shared_daily_totals
+        )
+
+    report_data = build_report_data(task["history_stats"], task["history_dates"], date_str, current_stats, analytics)
+    return date_str, write_report(os.path.join(task["data_dir"], task["report_dir"]), date_str, report_data)
+
+def get_backfill_tasks(data_dir, settings, start, end):
+    """
+    Przygotowuje zadania raportów dni z zakresu [start, end] katalogu data_dir.
+    Historia dnia D to suma prefiksowa stanów wszystkich wcześniejszych dni - liczona raz dla całego zakresu.
+    """
+    datetime_utc, today_str, datetime_utc_string = get_datetime_utc()
+    revenue_dir = settings["revenue_dir"]
+
+    # Stany statystyk wszystkich dni do końca zakresu (kubełki dzienne lub podsumowania partycji,
+    # w formacie sqlite - liczone przez SQLite dla wszystkich dni jednym zapytaniem)
+    if settings["storage_format"] == "sqlite":
+        catalog = {"partitions": {}}
+        daily_states = query_daily_stats(data_dir, revenue_dir, end_ts=get_day_range(end)[1])
+    else:
+        catalog = get_catalog(data_dir, revenue_dir)
+        daily_states = load_daily_states(data_dir, revenue_dir, settings["rollup_dir"], catalog_range(catalog, end=end), before=get_next_date(end))
+
+    tasks = []
+    history_stats = new_stats()
+    history_dates = []
+    for date_str, state in daily_states.items():
+        if date_str >= start and history_stats["count"] and state["count"]:
+            partition = catalog["partitions"].get(date_str)
+            tasks.append({
+                "data_dir": data_dir,
+                "report_dir": settings["report_dir"],
+                "revenue_dir": revenue_dir,
+                "hashrate_dir": settings["hashrate_dir"],
+                "date": date_str,
+                "history_stats": history_stats,
+                "history_dates": [history_dates[0], history_dates[-1]],
+                "current_stats": state,
+                # Partycja dnia dzisiejszego jest jeszcze zapisywana - statystyki liczone są z danych, a nie z cache
+                # (w formacie sqlite stany dni zawsze liczone są z aktualnych danych)
+                "current_file": partition["file"] if partition and date_str >= today_str else None,
+                "analytics_settings": settings["analytics"]
+            })
+        # Suma prefiksowa: historia kolejnego dnia obejmuje dzień bieżący
+        history_stats = merge_stats(history_stats, state)
+        history_dates.append(date_str)
+    return tasks
+
+def backfill(data_dir, settings, start, end):
+    """Odtwarza raporty dni z zakresu [start, end] katalogu data_dir. Zwraca liczbę zapisanych raportów."""
+    tasks = get_backfill_tasks(data_dir, settings, start, end)
+    if not tasks:
+        log(f"{data_dir}: brak dni z danymi historycznymi i bieżącymi w zakresie {start} - {end}")
+        return 0
+
+    daily_totals = load_daily_totals(data_dir, settings["revenue_dir"])
+    with ProcessPoolExecutor(max_workers=settings["max_workers"], initializer=init_worker, initargs=(daily_totals,)) as executor:
+        results = list(executor.map(build_day_report, tasks, chunksize=max(1, len(tasks) // (settings["max_workers"] * 4))))
+    written = sum(1 for date_str, file_path in results if file_path)
+    log(f"{data_dir}: odtworzono {written} z {len(tasks)} raportów dziennych ({start} - {end})")
+    return written
+
+@instrumented_job("backfill")
+def main():
+    # Zakres dat z argumentów
+    date_range = parse_date_range(sys.argv[1:])
+    if date_range is None:
+        log("Użycie: python backfill.py START [END] (daty w formacie YYYY-MM-DD, START <= END)")
+        return
+    start, end = date_range
+
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    report_dir = get_environ("REPORT_DIR")
+    if not report_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+
+    settings = {
+        "report_dir": report_dir,
+        "revenue_dir": revenue_dir,
+        "rollup_dir": get_environ_or_default("ROLLUP_DIR", "rollup"),
+        "hashrate_dir": get_environ_or_default("HASHRATE_DIR", None),
+        "analytics": get_analytics_settings(),
+        "max_workers": int(get_environ_or_default("BACKFILL_CONCURRENCY", os.cpu_count() or 1)),
+        "storage_format": get_storage_format()
+    }
+
+    # Katalog główny i katalogi portfeli z rejestru
+    data_dirs = [data_dir] + [tenant["data_dir"] for tenant in get_wallet_registry(data_dir)]
+
+    # Raporty nie są odtwarzane równolegle przez dwa uruchomienia
+    with job_lock(data_dir, "backfill") as acquired:
+        if not acquired: return
+        for directory in data_dirs:
+            if settings["storage_format"] == "sqlite":
+                has_data = query_date_range(directory, revenue_dir) is not None
+            else:
+                has_data = os.path.isdir(os.path.join(directory, revenue_dir))
+            if has_data:
+                backfill(directory, settings, start, end)
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+from helper import get_environ_or_default, get_datetime_utc, log
+from generate_data import get_generator_settings, get_worker_names, make_base_response, make_workers_response, generate_history
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from multiprocessing import get_context
+import socketserver
+import threading
+import tempfile
+import resource
+import random
+import shutil
+import json
+import time
+import os
+
+# Benchmark ścieżek zapisu i raportów na syntetycznej historii (generate_data.py), w całości offline:
+# zapytania kolektora obsługuje lokalny serwer API puli, a wiadomości przyjmuje lokalny serwer SMTP.
+# Każdy etap uruchamiany jest w osobnym procesie, dzięki czemu szczytowe zużycie pamięci (peak RSS)
+# dotyczy tylko tego etapu. Wyniki wypisywane są jako tabela i dopisywane jako wiersz JSON do BENCH_OUTPUT.
+
+# Etapy: (nazwa, zmienna z liczbą powtórzeń, domyślna liczba powtórzeń)
+STAGES = (
+    ("generate", None, 1),
+    ("ingest_tick", "BENCH_TICKS", 20),
+    ("report", "BENCH_REPORT_RUNS", 3),
+    ("report_history", "BENCH_REPORT_RUNS", 3),
+    ("range_query", "BENCH_QUERY_RUNS", 10),
+    ("render", "BENCH_RENDER_RUNS", 20),
+    ("smtp_send", "BENCH_SMTP_RUNS", 3)
+)
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Lokalne API puli: /user/base i /user/workers z losowymi danymi w formacie odpowiedzi puli."""
+    def do_GET(self):
+        server = self.server
+        timestamp = int(time.time())
+        with server.lock:
+            if "/user/base" in self.path:
+                data = make_base_response(server.rng, timestamp, 0)
+            elif "/user/workers" in self.path:
+                data = make_workers_response(server.rng, timestamp, server.worker_names, server.base_hashrates)
+            else:
+                self.send_error(404)
+                return
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubSmtpHandler(socketserver.StreamRequestHandler):
+    """Lokalny serwer SMTP: przyjmuje każdą wiadomość i zlicza wiadomości oraz odbiorców."""
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 benchmark")
+        in_data = False
+        for raw_line in self.rfile:
+            line = raw_line.decode(errors="replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.messages += 1
+                    self.reply("250 OK")
+                continue
+            command = line[:4].upper()
+            if command == "EHLO":
+                self.reply("250-benchmark")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("235 OK")
+            elif command == "RCPT":
+                self.server.recipients += 1
+                self.reply("250 OK")
+            elif command == "DATA":
+                in_data = True
+                self.reply("354 OK")
+            elif command == "QUIT":
+                self.reply("221 OK")
+                return
+            else:
+                self.reply("250 OK")
+
+def start_api_server(settings):
+    """Uruchamia lokalne API puli w wątku. Zwraca serwer."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubApiHandler)
+    server.lock = threading.Lock()
+    server.rng = random.Random(settings["seed"])
+    server.worker_names = get_worker_names(settings["workers"])
+    server.base_hashrates = [server.rng.uniform(50, 150) for _ in range(settings["workers"])]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_smtp_server():
+    """Uruchamia lokalny serwer SMTP w wątku. Zwraca serwer."""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubSmtpHandler)
+    server.daemon_threads = True
+    server.messages = 0
+    server.recipients = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_once(stage, context):
+    """Wykonuje jedno powtórzenie etapu. Zwraca True, gdy się powiodło."""
+    data_dir = os.environ["DATA_DIR"]
+    if stage == "generate":
+        settings = get_generator_settings()
+        settings["storage_format"] = context["storage_format"]
+        return generate_history(data_dir, os.environ["REVENUE_DIR"], os.environ["HASHRATE_DIR"], settings) is not None
+    if stage == "ingest_tick":
+        import ingest
+        ingest.main()
+        return True
+    if stage == "report":
+        import report
+        return report.generate_report(data_dir, os.environ["REPORT_DIR"], os.environ["REVENUE_DIR"]) is not None
+    if stage == "report_history":
+        import report_revenue_history_vs_current
+        return report_revenue_history_vs_current.generate_report(
+            data_dir, os.environ["REPORT_DIR"], os.environ["REVENUE_DIR"], os.environ["ROLLUP_DIR"], os.environ["HASHRATE_DIR"]
+        ) is not None
+    if stage == "range_query":
+        # Zapytania o zakres czasu: revenue60m z ostatnich 7 dni i hashrate jednego urządzenia z ostatnich 7 dni
+        # (formaty plikowe wczytują partycje dzienne, format sqlite korzysta z indeksów bazy)
+        from analytics import load_revenue_arrays, load_hashrate_matrix, get_date_range, get_timestamp_range
+        from sqlite_store import query_worker_samples
+        datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+        start, end = get_date_range(date_utc_string, 7)
+        timestamps, values = load_revenue_arrays(data_dir, os.environ["REVENUE_DIR"], start, end)
+        worker = get_worker_names(1)[0]
+        if context["storage_format"] == "sqlite":
+            worker_samples = query_worker_samples(data_dir, *get_timestamp_range(start, end), worker=worker)
+        else:
+            workers, ticks, matrix = load_hashrate_matrix(data_dir, os.environ["HASHRATE_DIR"], start, end)
+            worker_samples = matrix[workers.index(worker)] if worker in workers else []
+        return len(timestamps) > 0 and len(worker_samples) > 0
+    if stage == "render":
+        from send_report import render_report
+        datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+        return render_report(context["template"], data_dir, os.environ["REPORT_DIR"], "Benchmark", "Benchmark", date_utc_string) is not None
+    if stage == "smtp_send":
+        from send_report import render_report
+        from mailer import get_smtp_config, build_message, send_messages
+        datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+        html_content = render_report(context["template"], data_dir, os.environ["REPORT_DIR"], "Benchmark", "Benchmark", date_utc_string)
+        if html_content is None:
+            return False
+        message = build_message("benchmark@localhost", "Benchmark", html_content)
+        send_messages(get_smtp_config(), [{"from_email": "benchmark@localhost", "recipients": context["recipients"], "message": message}])
+        return True
+
+def run_stage(stage, runs, context):
+    """
+    Wykonuje etap runs razy w bieżącym procesie (uruchamianym przez run_benchmark).
+    Zwraca czasy powtórzeń [ms], liczbę błędów i szczytowe zużycie pamięci procesu [MB].
+    """
+    if stage in ("render", "smtp_send"):
+        from helper import get_compiled_template
+        context = dict(context, template=get_compiled_template(os.environ["TEMPLATE_DIR"], os.environ["TEMPLATE_FILE_NAME"]))
+    timings = []
+    failures = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        if not run_once(stage, context):
+            failures += 1
+        timings.append((time.perf_counter() - start) * 1000)
+    # ru_maxrss w kilobajtach (Linux)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"stage": stage, "runs": runs, "failures": failures, "timings_ms": timings, "peak_rss_mb": round(peak_rss_mb, 1)}
+
+def summarize(result):
+    """Zwraca podsumowanie czasów etapu (min, średnia, p95, max w ms)."""
+    timings = sorted(result["timings_ms"])
+    if not timings:
+        return dict(result, min_ms=None, mean_ms=None, p95_ms=None, max_ms=None)
+    rank = max(1, -(-95 * len(timings) // 100))
+    return dict(
+        {key: value for key, value in result.items() if key != "timings_ms"},
+        min_ms=round(timings[0], 2),
+        mean_ms=round(sum(timings) / len(timings), 2),
+        p95_ms=round(timings[rank - 1], 2),
+        max_ms=round(timings[-1], 2)
+    )
+
+def format_results(results):
+    """Formatuje wyniki etapów jako tabelę tekstową."""
+    lines = [f"{'etap':<16}{'powt.':>6}{'błędy':>7}{'min ms':>11}{'śr. ms':>11}{'p95 ms':>11}{'max ms':>11}{'RSS MB':>9}"]
+    for result in results:
+        lines.append(
+            f"{result['stage']:<16}{result['runs']:>6}{result['failures']:>7}{result['min_ms']:>11}"
+            f"{result['mean_ms']:>11}{result['p95_ms']:>11}{result['max_ms']:>11}{result['peak_rss_mb']:>9}"
+        )
+    return "\n".join(lines)
+
+def run_benchmark(bench_dir, settings):
+    """
+    Generuje historię w katalogu bench_dir i mierzy kolejne etapy, każdy w świeżym procesie.
+    Zwraca listę podsumowań etapów.
+    """
+    api_server = start_api_server(settings)
+    smtp_server = start_smtp_server()
+    api_url = f"http://127.0.0.1:{api_server.server_address[1]}/api"
+
+    # Konfiguracja etapów - dziedziczona przez procesy etapów (zmienne z pliku .env nie są nadpisywane)
+    os.environ.update({
+        "DATA_DIR": os.path.join(bench_dir, "data"),
+        "REVENUE_DIR": "revenue60m",
+        "HASHRATE_DIR": "hashrate",
+        "REPORT_DIR": "daily_revenue_report",
+        "ROLLUP_DIR": "rollup",
+        "TEMPLATE_DIR": os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"),
+        "TEMPLATE_FILE_NAME": "revenue_template.html",
+        "STORAGE_FORMAT": settings["storage_format"],
+        "API_URL_BASE": f"{api_url}/user/base/?wallet=kaspa:benchmark",
+        "API_URL_WORKERS": f"{api_url}/user/workers/?wallet=kaspa:benchmark",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp_server.server_address[1]),
+        "SMTP_USERNAME": "benchmark",
+        "SMTP_PASSWORD": "benchmark",
+        "SMTP_STARTTLS": "false",
+        # Bez cache odpowiedzi API - każdy cykl etapu ingest_tick pobiera, parsuje i zapisuje dane
+        "API_CACHE_TTL": "0"
+    })
+    context = {
+        "storage_format": settings["storage_format"],
+        "recipients": [f"user{index}@localhost" for index in range(settings["recipients"])]
+    }
+
+    results = []
+    try:
+        for stage, runs_env, default_runs in STAGES:
+            runs = int(get_environ_or_default(runs_env, default_runs)) if runs_env else default_runs
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                results.append(summarize(executor.submit(run_stage, stage, runs, context).result()))
+    finally:
+        api_server.shutdown()
+        smtp_server.shutdown()
+    log(f"Serwer SMTP przyjął {smtp_server.messages} wiadomości ({smtp_server.recipients} odbiorców)")
+    return results
+
+def main():
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+
+    # Parametry historii (generate_data.py) i benchmarku
+    settings = get_generator_settings()
+    settings["storage_format"] = get_environ_or_default("STORAGE_FORMAT", "json").strip().lower()
+    settings["recipients"] = int(get_environ_or_default("BENCH_RECIPIENTS", 100))
+    output_path = get_environ_or_default("BENCH_OUTPUT", None)
+
+    # Katalog roboczy (tymczasowy, usuwany po pomiarze, chyba że wskazano BENCH_DIR)
+    bench_dir = get_environ_or_default("BENCH_DIR", None)
+    keep = bench_dir is not None
+    if keep:
+        if os.path.exists(os.path.join(bench_dir, "data")):
+            log(f"Katalog {bench_dir} zawiera już dane. Benchmark wymaga pustego katalogu")
+            return
+    else:
+        bench_dir = tempfile.mkdtemp(prefix="mining_benchmark_")
+
+    try:
+        results = run_benchmark(bench_dir, settings)
+    finally:
+        if not keep:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+
+    log(f"Benchmark: {settings['days']} dni, {settings['samples_per_day']} próbek na dzień, "
+        f"{settings['workers']} urządzeń, {settings['recipients']} odbiorców, format {settings['storage_format']}")
+    print(format_results(results))
+
+    # Wyniki kolejnych uruchomień dopisywane do pliku (porównanie przed wdrożeniem zmian)
+    if output_path:
+        with open(output_path, "a") as file:
+            file.write(json.dumps({"datetime_utc": datetime_utc_string, "settings": settings, "results": results}) + "\n")
+        log(f"Wyniki dopisane do pliku: {output_path}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+from helper import get_partition_files, get_partition_date, iter_revenue_values, get_environ_or_default, write_json_file
+from locks import partition_lock
+import bisect
+import json
+import os
+
+# Katalogi partycji trzymane w pamięci: ścieżka -> (czas modyfikacji pliku w ns, katalog)
+catalogs = {}
+
+# Struktura katalogu partycji szeregu (np. revenue60m):
+# {
+#     "dates": ["YYYY-MM-DD", ...],  - posortowane daty partycji
+#     "partitions": {
+#         "YYYY-MM-DD": {
+#             "file": nazwa pliku partycji,
+#             "count": liczba próbek,
+#             "bytes": rozmiar pliku,
+#             "rollup": {"count": ..., "sum": ..., "min": ..., "max": ...}
+#         }
+#     }
+# }
+
+def get_catalog_path(data_dir, series_dir):
+    """Zwraca ścieżkę pliku katalogu partycji szeregu."""
+    catalog_dir = get_environ_or_default("CATALOG_DIR", "catalog")
+    return os.path.join(data_dir, catalog_dir, f"{series_dir}.json")
+
+def new_rollup():
+    """Zwraca puste podsumowanie partycji."""
+    return {"count": 0, "sum": 0.0, "min": None, "max": None}
+
+def update_rollup(rollup, value):
+    """Dodaje wartość do podsumowania partycji."""
+    rollup["count"] += 1
+    rollup["sum"] += value
+    rollup["min"] = value if rollup["min"] is None else min(rollup["min"], value)
+    rollup["max"] = value if rollup["max"] is None else max(rollup["max"], value)
+    return rollup
+
+def load_catalog(catalog_path):
+    """Wczytuje katalog partycji (z pamięci, jeśli plik się nie zmienił). Zwraca None, gdy go nie ma."""
+    try:
+        mtime_ns = os.stat(catalog_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = catalogs.get(catalog_path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    try:
+        with open(catalog_path, "r") as file:
+            catalog = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    catalogs[catalog_path] = (mtime_ns, catalog)
+    return catalog
+
+def save_catalog(catalog_path, catalog):
+    """Zapisuje katalog partycji atomowo (helper.write_json_file)."""
+    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+    if write_json_file(catalog_path, catalog, compact=True):
+        catalogs[catalog_path] = (os.stat(catalog_path).st_mtime_ns, catalog)
+
+def build_catalog(path):
+    """Buduje katalog partycji szeregu revenue60m na podstawie zawartości katalogu z danymi (jednorazowo)."""
+    catalog = {"dates": [], "partitions": {}}
+    if not os.path.isdir(path):
+        return catalog
+    for file in get_partition_files(path):
+        date_str = get_partition_date(file)
+        if date_str is None:
+            continue
+        rollup = new_rollup()
+        values = iter_revenue_values(os.path.join(path, file))
+        for value in values if values is not None else ():
+            update_rollup(rollup, value)
+        catalog["partitions"][date_str] = {
+            "file": file,
+            "count": rollup["count"],
+            "bytes": os.path.getsize(os.path.join(path, file)),
+            "rollup": rollup
+        }
+    catalog["dates"] = sorted(catalog["partitions"])
+    return catalog
+
+def get_catalog(data_dir, series_dir):
+    """Zwraca katalog partycji szeregu; gdy go nie ma, buduje go z zawartości katalogu z danymi i zapisuje."""
+    catalog_path = get_catalog_path(data_dir, series_dir)
+    catalog = load_catalog(catalog_path)
+    if catalog is None:
+        catalog = build_catalog(os.path.join(data_dir, series_dir))
+        save_catalog(catalog_path, catalog)
+    return catalog
+
+def invalidate_catalog(data_dir, series_dir):
+    """Usuwa katalog partycji szeregu (np. po migracji plików), aby został zbudowany ponownie."""
+    catalog_path = get_catalog_path(data_dir, series_dir)
+    catalogs.pop(catalog_path, None)
+    if os.path.exists(catalog_path):
+        os.remove(catalog_path)
+
+def record_sample(data_dir, series_dir, file_path, value):
+    """
+    Aktualizuje katalog po dopisaniu próbki do partycji file_path (wywoływane przez kolektor).
+    Katalog jest wspólny dla wszystkich partycji szeregu, więc jego aktualizacja ma osobną blokadę.
+    """
+    with partition_lock(data_dir, series_dir, "catalog"):
+        update_catalog(data_dir, series_dir, file_path, value)
+
+def update_catalog(data_dir, series_dir, file_path, value):
+    """Dopisuje próbkę do katalogu partycji (wywoływane z blokadą katalogu)."""
+    catalog_path = get_catalog_path(data_dir, series_dir)
+    catalog = load_catalog(catalog_path)
+    if catalog is None:
+        # Budowa z zawartości katalogu uwzględnia już dopisaną próbkę
+        save_catalog(catalog_path, build_catalog(os.path.join(data_dir, series_dir)))
+        return
+
+    file = os.path.basename(file_path)
+    date_str = get_partition_date(file)
+    entry = catalog["partitions"].get(date_str)
+    if entry is None:
+        entry = {"file": file, "count": 0, "bytes": 0, "rollup": new_rollup()}
+        catalog["partitions"][date_str] = entry
+        bisect.insort(catalog["dates"], date_str)
+    entry["file"] = file
+    entry["count"] += 1
+    entry["bytes"] = os.path.getsize(file_path)
+    update_rollup(entry["rollup"], value)
+    save_catalog(catalog_path, catalog)
+
+def catalog_genesis(catalog):
+    """Zwraca (data, plik) najwcześniejszej partycji lub None - O(1)."""
+    if not catalog["dates"]:
+        return None
+    date_str = catalog["dates"][0]
+    return date_str, catalog["partitions"][date_str]["file"]
+
+def catalog_latest(catalog):
+    """Zwraca (data, plik) najpóźniejszej partycji lub None - O(1)."""
+    if not catalog["dates"]:
+        return None
+    date_str = catalog["dates"][-1]
+    return date_str, catalog["partitions"][date_str]["file"]
+
+def catalog_range(catalog, start=None, end=None):
+    """Zwraca listę (data, plik) partycji z zakresu [start, end] (wyszukiwanie binarne - O(log n) + wynik)."""
+    dates = catalog["dates"]
+    low = 0 if start is None else bisect.bisect_left(dates, start)
+    high = len(dates) if end is None else bisect.bisect_right(dates, end)
+    return [(date_str, catalog["partitions"][date_str]["file"]) for date_str in dates[low:high]]
+
+def catalog_rollup(catalog, start=None, end=None):
+    """Łączy podsumowania partycji z zakresu [start, end] bez wczytywania plików z danymi."""
+    merged = new_rollup()
+    for date_str, file in catalog_range(catalog, start, end):
+        rollup = catalog["partitions"][date_str]["rollup"]
+        if not rollup["count"]:
+            continue
+        merged["count"] += rollup["count"]
+        merged["sum"] += rollup["sum"]
+        merged["min"] = rollup["min"] if merged["min"] is None else min(merged["min"], rollup["min"])
+        merged["max"] = rollup["max"] if merged["max"] is None else max(merged["max"], rollup["max"])
+    return merged
@@ -0,0 +1,84 @@
+from helper import make_api_request, get_environ, get_environ_or_default, get_datetime_utc, write_batch, log, API_POOL_SIZE
+from ingest import get_endpoint_sinks, dispatch
+from sqlite_store import insert_batch
+from locks import job_lock
+from tenants import get_wallet_slug, get_wallet_registry
+from metrics import instrumented_job, observe
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import os
+
+def get_wallet_url(url, wallet):
+    """Zwraca URL API z podmienionym parametrem "wallet"."""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != "wallet"]
+    query.append(("wallet", wallet))
+    return urlunsplit(parts._replace(query=urlencode(query, safe=":")))
+
+def get_wallets(data_dir):
+    """Zwraca listę portfeli z rejestru WALLETS_FILE lub ze zmiennej WALLETS (adresy oddzielone przecinkami)."""
+    wallets = [tenant["wallet"] for tenant in get_wallet_registry(data_dir)]
+    if not wallets:
+        log("Nie określono portfeli (zmienne WALLETS_FILE lub WALLETS)")
+    return wallets
+
+def collect_wallets(wallets, endpoints, max_workers):
+    """
+    Pobiera równolegle wszystkie endpointy dla wszystkich portfeli.
+    Zapytania korzystają ze współdzielonej puli połączeń, a liczba jednoczesnych zapytań
+    jest ograniczona do max_workers. Zwraca słownik {portfel: {endpoint: dane lub None}}.
+    """
+    results = {wallet: {} for wallet in wallets}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            (wallet, endpoint): executor.submit(make_api_request, get_wallet_url(url, wallet))
+            for wallet in wallets
+            for endpoint, url in endpoints.items()
+        }
+        for (wallet, endpoint), future in futures.items():
+            results[wallet][endpoint] = future.result()
+    return results
+
+@instrumented_job("collector")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    wallets = get_wallets(data_dir)
+    if not wallets: return
+    max_workers = int(get_environ_or_default("COLLECTOR_CONCURRENCY", API_POOL_SIZE))
+
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+
+    # Endpointy API (zmienna z URL -> URL)
+    endpoints = {}
+    for url_env in get_endpoint_sinks():
+        url = get_environ(url_env)
+        if url:
+            endpoints[url_env] = url
+
+    # Cykl jest pomijany, gdy poprzedni (np. poprzedni tick crona) jeszcze trwa
+    with job_lock(data_dir, "collector") as acquired:
+        if not acquired: return
+
+        # Równoległe pobieranie danych wszystkich portfeli
+        results = collect_wallets(wallets, endpoints, max_workers)
+
+        # Zapisywanie danych w katalogu każdego portfela (każda odpowiedź trafia do wszystkich odbiorników endpointu).
+        # Pliki wszystkich portfeli są utrwalane wspólnie na końcu cyklu (write_batch),
+        # a próbki formatu sqlite wszystkich portfeli wstawiane jedną transakcją (insert_batch)
+        samples = 0
+        with write_batch(), insert_batch():
+            for wallet, responses in results.items():
+                wallet_data_dir = os.path.join(data_dir, get_wallet_slug(wallet))
+                for url_env, data in responses.items():
+                    if data is not None:
+                        file_paths, count = dispatch(url_env, data, wallet_data_dir, datetime_utc)
+                        samples += count
+                log(f"Dane portfela {wallet} zapisane w katalogu: {wallet_data_dir}")
+        observe("samples_per_tick", samples)
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
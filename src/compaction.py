@@ -0,0 +1,226 @@
+from helper import (
+    get_environ, get_environ_or_default, get_datetime_utc, read_json_file, write_json_file, log,
+    iter_revenue_samples, get_file_signature, get_partition_date, WORKERS_DIR
+)
+from catalog import get_catalog, catalog_range, invalidate_catalog
+from archive import archive_closed_partitions
+from locks import job_lock, partition_lock
+from tenants import get_wallet_registry
+from stats import new_stats, update_stats
+from metrics import instrumented_job
+from datetime import timedelta
+import shutil
+import os
+
+# Poziomy (tiery) danych zagregowanych szeregu revenue60m w katalogu <DATA_DIR>/<DOWNSAMPLE_DIR>/<szereg>:
+# - 1h/<YYYY-MM-DD>.json - kubełki godzinowe dnia: {"HH": kubełek},
+# - 1d.json              - kubełki dzienne: {"YYYY-MM-DD": kubełek + "stats" (stan stats.new_stats)
+#                          + "file" i "signature" partycji źródłowej}.
+# Kubełek: {"min", "max", "sum", "count", "last"}. Stan statystyk kubełka dziennego pozwala łączyć dni
+# (merge_stats) razem z percentylami, więc raport historyczny nie potrzebuje surowych partycji.
+HOURLY_TIER = "1h"
+DAILY_TIER = "1d"
+
+def get_tier_path(data_dir, series_dir):
+    """Zwraca katalog danych zagregowanych szeregu."""
+    downsample_dir = get_environ_or_default("DOWNSAMPLE_DIR", "downsample")
+    return os.path.join(data_dir, downsample_dir, series_dir)
+
+def load_daily_tier(data_dir, series_dir):
+    """Wczytuje kubełki dzienne szeregu ({data: kubełek}). Zwraca pusty słownik, gdy ich nie ma."""
+    tier = read_json_file(os.path.join(get_tier_path(data_dir, series_dir), f"{DAILY_TIER}.json"))
+    return tier if isinstance(tier, dict) else {}
+
+def new_bucket():
+    """Zwraca pusty kubełek."""
+    return {"min": None, "max": None, "sum": 0.0, "count": 0, "last": None}
+
+def update_bucket(bucket, value):
+    """Dodaje próbkę do kubełka (próbki dodawane są w kolejności zapisu, więc "last" to ostatnia z nich)."""
+    bucket["min"] = value if bucket["min"] is None else min(bucket["min"], value)
+    bucket["max"] = value if bucket["max"] is None else max(bucket["max"], value)
+    bucket["sum"] += value
+    bucket["count"] += 1
+    bucket["last"] = value
+
+def downsample_partition(file_path):
+    """
+    Agreguje partycję dzienną do kubełków godzinowych i kubełka dziennego (jeden przebieg).
+    Zwraca (kubełki godzinowe, kubełek dzienny ze stanem statystyk) lub None, gdy partycji nie można wczytać.
+    """
+    samples = iter_revenue_samples(file_path)
+    if samples is None:
+        return None
+    hourly = {}
+    daily = new_bucket()
+    stats = new_stats()
+    for timestamp, value in samples:
+        hour = f"{timestamp % 86400 // 3600:02d}"
+        bucket = hourly.get(hour)
+        if bucket is None:
+            bucket = hourly[hour] = new_bucket()
+        update_bucket(bucket, value)
+        update_bucket(daily, value)
+        update_stats(stats, value)
+    daily["stats"] = stats
+    return dict(sorted(hourly.items())), daily
+
+def get_cutoff_date(today, days):
+    """Zwraca datę "YYYY-MM-DD" sprzed days dni lub None, gdy retencja jest wyłączona (0)."""
+    if days <= 0:
+        return None
+    return (today - timedelta(days=days)).strftime("%Y-%m-%d")
+
+def remove_or_archive(data_dir, file_path, action):
+    """Usuwa plik lub przenosi go do katalogu archiwum <DATA_DIR>/<ARCHIVE_DIR> (z zachowaniem ścieżki)."""
+    if action == "archive":
+        archive_dir = get_environ_or_default("ARCHIVE_DIR", "archive")
+        archive_path = os.path.join(data_dir, archive_dir, os.path.relpath(file_path, data_dir))
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        shutil.move(file_path, archive_path)
+    else:
+        os.remove(file_path)
+
+def get_partition_paths(path, date_str):
+    """Zwraca ścieżki wszystkich plików partycji date_str w katalogu (w tym pozostałe kolumny formatu columnar)."""
+    return [os.path.join(path, file) for file in sorted(os.listdir(path)) if get_partition_date(file) == date_str]
+
+def compact_revenue(data_dir, revenue_dir, today_str, settings):
+    """
+    Agreguje zamknięte partycje revenue60m (sprzed dnia today_str) do kubełków 1h i 1d, kompresuje je,
+    a następnie usuwa lub archiwizuje surowe partycje starsze niż RAW_RETENTION_DAYS (tylko już zagregowane)
+    oraz kubełki godzinowe starsze niż HOURLY_RETENTION_DAYS. Zwraca liczbę (zagregowanych, usuniętych) partycji.
+    """
+    revenue_path = os.path.join(data_dir, revenue_dir)
+    tier_path = get_tier_path(data_dir, revenue_dir)
+    hourly_path = os.path.join(tier_path, HOURLY_TIER)
+    daily_tier = load_daily_tier(data_dir, revenue_dir)
+
+    # Agregacja zamkniętych partycji, których nie ma w kubełkach dziennych lub które zmieniły się od agregacji
+    compacted = 0
+    for date_str, file in catalog_range(get_catalog(data_dir, revenue_dir), end=today_str):
+        if date_str >= today_str:
+            continue
+        file_path = os.path.join(revenue_path, file)
+        signature = get_file_signature(file_path)
+        entry = daily_tier.get(date_str)
+        if entry and entry.get("file") == file and entry.get("signature") == signature:
+            continue
+        result = downsample_partition(file_path)
+        if result is None:
+            log(f"Nie można wczytać danych z pliku: {file_path}")
+            continue
+        hourly, daily = result
+        os.makedirs(hourly_path, exist_ok=True)
+        write_json_file(os.path.join(hourly_path, f"{date_str}.json"), hourly)
+        daily["file"] = file
+        daily["signature"] = signature
+        daily_tier[date_str] = daily
+        compacted += 1
+
+    # Kompresja zamkniętych partycji (archive.py) - kubełki dzienne wskazują odtąd plik archiwum
+    archived = []
+    if settings["archive_partitions"]:
+        archived = archive_closed_partitions(data_dir, revenue_dir, today_str, summarize=True)
+        for date_str, archive_path in archived:
+            entry = daily_tier.get(date_str)
+            if entry:
+                entry["file"] = os.path.basename(archive_path)
+                entry["signature"] = get_file_signature(archive_path)
+
+    if compacted or archived:
+        os.makedirs(tier_path, exist_ok=True)
+        write_json_file(os.path.join(tier_path, f"{DAILY_TIER}.json"), dict(sorted(daily_tier.items())))
+
+    # Retencja surowych partycji (usuwane są tylko partycje, których kubełki zostały zapisane)
+    removed = 0
+    raw_cutoff = get_cutoff_date(settings["today"], settings["raw_retention_days"])
+    if raw_cutoff:
+        for date_str, file in catalog_range(get_catalog(data_dir, revenue_dir), end=raw_cutoff):
+            if date_str >= raw_cutoff or date_str not in daily_tier:
+                continue
+            with partition_lock(data_dir, revenue_dir, date_str):
+                for file_path in get_partition_paths(revenue_path, date_str):
+                    remove_or_archive(data_dir, file_path, settings["retention_action"])
+            removed += 1
+        if removed:
+            # Zmieniła się lista partycji - katalog partycji zostanie zbudowany ponownie
+            with partition_lock(data_dir, revenue_dir, "catalog"):
+                invalidate_catalog(data_dir, revenue_dir)
+
+    # Retencja kubełków godzinowych (kubełki dzienne przechowywane są bez limitu)
+    hourly_cutoff = get_cutoff_date(settings["today"], settings["hourly_retention_days"])
+    if hourly_cutoff and os.path.isdir(hourly_path):
+        for file in os.listdir(hourly_path):
+            date_str = get_partition_date(file)
+            if date_str and date_str < hourly_cutoff:
+                os.remove(os.path.join(hourly_path, file))
+
+    return compacted, removed
+
+def apply_snapshot_retention(data_dir, hashrate_dir, settings):
+    """
+    Usuwa lub archiwizuje pełne odpowiedzi /user/workers starsze niż SNAPSHOT_RETENTION_DAYS.
+    Szeregi hashrate urządzeń (katalog WORKERS_DIR) nie mają danych zagregowanych, więc retencja ich nie obejmuje.
+    Zwraca liczbę usuniętych plików.
+    """
+    cutoff = get_cutoff_date(settings["today"], settings["snapshot_retention_days"])
+    hashrate_path = os.path.join(data_dir, hashrate_dir)
+    if not cutoff or not os.path.isdir(hashrate_path):
+        return 0
+
+    removed = 0
+    for file in sorted(os.listdir(hashrate_path)):
+        date_str = get_partition_date(file)
+        if date_str is None or date_str >= cutoff or not os.path.isfile(os.path.join(hashrate_path, file)):
+            continue
+        remove_or_archive(data_dir, os.path.join(hashrate_path, file), settings["retention_action"])
+        removed += 1
+    return removed
+
+@instrumented_job("compaction")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+    hashrate_dir = get_environ("HASHRATE_DIR")
+    if not hashrate_dir: return
+
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+
+    # Harmonogram retencji w dniach (0 - dane przechowywane bez limitu). Retencja surowych danych jest domyślnie
+    # wyłączona, a stare pliki są domyślnie archiwizowane - usuwanie wymaga ustawienia RETENTION_ACTION=delete
+    settings = {
+        "today": datetime_utc,
+        "raw_retention_days": int(get_environ_or_default("RAW_RETENTION_DAYS", 0)),
+        "hourly_retention_days": int(get_environ_or_default("HOURLY_RETENTION_DAYS", 365)),
+        "snapshot_retention_days": int(get_environ_or_default("SNAPSHOT_RETENTION_DAYS", 0)),
+        "retention_action": get_environ_or_default("RETENTION_ACTION", "archive"),
+        "archive_partitions": get_environ_or_default("ARCHIVE_PARTITIONS", "true").lower() != "false"
+    }
+
+    # Katalog główny i katalogi portfeli z rejestru
+    data_dirs = [data_dir] + [tenant["data_dir"] for tenant in get_wallet_registry(data_dir)]
+
+    with job_lock(data_dir, "compaction") as acquired:
+        if not acquired: return
+
+        for directory in data_dirs:
+            if os.path.isdir(os.path.join(directory, revenue_dir)):
+                compacted, removed = compact_revenue(directory, revenue_dir, date_utc_string, settings)
+                log(f"{directory}: zagregowano {compacted} partycji revenue60m, usunięto {removed}")
+            if settings["archive_partitions"]:
+                archived = archive_closed_partitions(directory, hashrate_dir, date_utc_string)
+                archived += archive_closed_partitions(directory, os.path.join(hashrate_dir, WORKERS_DIR), date_utc_string)
+                if archived:
+                    log(f"{directory}: skompresowano {len(archived)} partycji hashrate")
+            removed = apply_snapshot_retention(directory, hashrate_dir, settings)
+            if removed:
+                log(f"{directory}: usunięto {removed} pełnych odpowiedzi /workers starszych niż {settings['snapshot_retention_days']} dni")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
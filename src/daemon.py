@@ -0,0 +1,119 @@
+from helper import get_environ_or_default, log
+from datetime import datetime, timedelta, timezone
+import helper
+import threading
+import signal
+import time
+import ingest
+import collector
+import compaction
+import report
+import report_revenue_history_vs_current
+import send_report
+import report_tenants
+import os
+
+# Zadania pobierające dane z API puli (ich interwał ogranicza czas cache odpowiedzi API)
+FETCH_JOBS = ("ingest", "collector")
+
+# Sygnał zatrzymania demona (SIGTERM, SIGINT)
+stop_event = threading.Event()
+
+def run_daily_reports():
+    """Generuje raporty dzienne i wysyła raport e-mail (dla wszystkich portfeli z rejestru, jeśli jest określony)."""
+    if os.environ.get("WALLETS_FILE") or os.environ.get("WALLETS"):
+        report_tenants.main()
+        return
+    report.main()
+    report_revenue_history_vs_current.main()
+    send_report.main()
+
+def get_next_daily_run(report_time, now):
+    """Zwraca najbliższy moment (UTC) o godzinie report_time w formacie HH:MM."""
+    hour, minute = (int(part) for part in report_time.split(":"))
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return next_run.timestamp()
+
+def limit_cache_ttl(jobs):
+    """
+    Skraca czas cache odpowiedzi API (API_CACHE_TTL) do połowy najkrótszego interwału zadań pobierających dane.
+    Cache dłuższy od interwału zwracałby w kolejnych cyklach tę samą odpowiedź i powtarzał nieaktualne próbki.
+    """
+    intervals = [job["interval"] for job in jobs if job["name"] in FETCH_JOBS]
+    if not intervals or helper.API_CACHE_TTL < min(intervals):
+        return
+    ttl = min(intervals) / 2
+    log(f"API_CACHE_TTL ({helper.API_CACHE_TTL:g} s) nie jest krótszy od interwału pobierania danych ({min(intervals)} s). Używam {ttl:g} s")
+    helper.API_CACHE_TTL = ttl
+
+def get_jobs():
+    """
+    Zwraca listę zadań demona na podstawie zmiennych środowiskowych.
+    Zadania cykliczne mają interwał w sekundach (0 wyłącza zadanie), zadanie dzienne
+    uruchamiane jest codziennie o godzinie REPORT_TIME (UTC).
+    """
+    now = time.time()
+    jobs = []
+    intervals = (
+        ("ingest", ingest.main, "INGEST_INTERVAL", 60),
+        ("collector", collector.main, "COLLECTOR_INTERVAL", 0),
+        ("compaction", compaction.main, "COMPACTION_INTERVAL", 86400)
+    )
+    for name, function, env_name, default in intervals:
+        interval = int(get_environ_or_default(env_name, default))
+        if interval > 0:
+            jobs.append({"name": name, "function": function, "interval": interval, "next_run": now})
+
+    limit_cache_ttl(jobs)
+
+    report_time = get_environ_or_default("REPORT_TIME", "23:55")
+    jobs.append({
+        "name": "daily_reports",
+        "function": run_daily_reports,
+        "report_time": report_time,
+        "next_run": get_next_daily_run(report_time, datetime.now(timezone.utc))
+    })
+    return jobs
+
+def run_job(job):
+    """Uruchamia zadanie i planuje jego kolejne wykonanie. Błąd zadania nie zatrzymuje demona."""
+    try:
+        job["function"]()
+    except Exception as e:
+        log(f"Zadanie {job['name']} zakończyło się błędem: {e}")
+
+    if "interval" in job:
+        # Kolejne uruchomienie liczone od planowanego czasu, aby zadania nie dryfowały
+        job["next_run"] += job["interval"]
+        if job["next_run"] <= time.time():
+            job["next_run"] = time.time() + job["interval"]
+    else:
+        job["next_run"] = get_next_daily_run(job["report_time"], datetime.now(timezone.utc))
+
+def handle_stop_signal(signum, frame):
+    """Obsługa SIGTERM/SIGINT - bieżące zadanie jest dokańczane, kolejne nie są uruchamiane."""
+    log(f"Otrzymano sygnał {signum}, zatrzymywanie demona")
+    stop_event.set()
+
+def main():
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+    signal.signal(signal.SIGINT, handle_stop_signal)
+
+    jobs = get_jobs()
+    log(f"Demon uruchomiony, zadania: {', '.join(job['name'] for job in jobs)}")
+
+    # Pętla planisty: oczekiwanie do najbliższego zadania lub sygnału zatrzymania
+    while not stop_event.is_set():
+        next_job = min(jobs, key=lambda job: job["next_run"])
+        delay = next_job["next_run"] - time.time()
+        if delay > 0 and stop_event.wait(delay):
+            break
+        run_job(next_job)
+
+    log("Demon zatrzymany")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
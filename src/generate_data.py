@@ -0,0 +1,193 @@
+from helper import (
+    get_environ, get_environ_or_default, get_storage_format, get_datetime_utc, write_json_file, append_jsonl_records,
+    get_data_file_path, hashrate_to_hs, get_partition_timestamp, log, WORKERS_DIR
+)
+from timeseries import get_column_path, COLUMN_TYPES
+from snapshot import encode_snapshot, get_last_snapshot_path, save_last_snapshot
+from catalog import get_catalog
+from sqlite_store import add_samples, add_worker_samples, insert_batch
+from datetime import timedelta
+from array import array
+import math
+import random
+import os
+
+# Generator syntetycznej historii danych do testów wydajności (benchmark.py).
+# Zapisuje dla każdego dnia partycje w tym samym układzie, co kolektory:
+# - <REVENUE_DIR>/<data>                  - próbki revenue60m,
+# - <HASHRATE_DIR>/<WORKERS_DIR>/<data>   - hashrate urządzeń (columnar: katalog urządzenia z kolumnami),
+# - <HASHRATE_DIR>/<data>                 - pełne odpowiedzi /user/workers (json) lub ich delty (jsonl, columnar, sqlite).
+# W formacie sqlite próbki revenue60m i hashrate urządzeń trafiają do bazy (jedna transakcja na dzień).
+# Partycja dnia zapisywana jest jednym zapisem, więc wygenerowanie lat historii trwa sekundy.
+
+def get_generator_settings():
+    """Wczytuje parametry generatora: liczbę dni, próbek na dzień, urządzeń i ziarno generatora liczb losowych."""
+    return {
+        "days": int(get_environ_or_default("GENERATOR_DAYS", 30)),
+        "samples_per_day": int(get_environ_or_default("GENERATOR_SAMPLES_PER_DAY", 1440)),
+        "workers": int(get_environ_or_default("GENERATOR_WORKERS", 10)),
+        "seed": int(get_environ_or_default("GENERATOR_SEED", 0))
+    }
+
+def get_worker_names(workers):
+    """Zwraca nazwy urządzeń."""
+    return [f"rig{index:03d}" for index in range(workers)]
+
+def make_base_response(rng, timestamp, day_index):
+    """Zwraca odpowiedź /user/base: revenue60m z wolnym trendem, cyklem dobowym i szumem."""
+    phase = 2 * math.pi * (timestamp % 86400) / 86400
+    revenue60m = 10.0 * (1 + 0.002 * day_index) * (1 + 0.05 * math.sin(phase)) * rng.uniform(0.9, 1.1)
+    return {"revenue": {"revenue60m": round(revenue60m, 8)}}
+
+def make_workers_response(rng, timestamp, worker_names, base_hashrates):
+    """
+    Zwraca odpowiedź /user/workers: hashrate24h urządzeń z szumem wokół wartości bazowej.
+    Urządzenie sporadycznie przestaje wysyłać udziały (brak w odpowiedzi).
+    """
+    workers = []
+    for name, base in zip(worker_names, base_hashrates):
+        if rng.random() < 0.001:
+            continue
+        workers.append({
+            "name": name,
+            "hashrate24h": {"hashrate": round(base * rng.uniform(0.95, 1.05), 2), "hashrate_unit": "TH/s"},
+            "last_share_time": timestamp - rng.randint(0, 30)
+        })
+    return {"workers": workers}
+
+def write_columns(path, name, columns):
+    """Zapisuje kolumny partycji <name> (każda kolumna jednym zapisem)."""
+    for column, values in columns.items():
+        with open(get_column_path(path, name, column), "wb") as file:
+            file.write(array(COLUMN_TYPES[column], values).tobytes())
+
+def write_records(path, name, records, storage_format):
+    """Zapisuje rekordy partycji <name> w formacie json lub jsonl."""
+    file_path = get_data_file_path(path, name, storage_format)
+    if storage_format == "json":
+        write_json_file(file_path, records)
+    else:
+        append_jsonl_records(file_path, records)
+    return file_path
+
+def generate_day(paths, date_str, day_index, settings, rng, base_hashrates, location):
+    """
+    Generuje próbki jednego dnia i zapisuje partycje revenue60m, hashrate urządzeń i pełnych odpowiedzi.
+    location to (katalog danych, katalog revenue60m) - nazwa szeregu w bazie formatu sqlite.
+    """
+    storage_format = settings["storage_format"]
+    worker_names = get_worker_names(settings["workers"])
+    day_start = get_partition_timestamp(date_str)
+    interval = 86400 // settings["samples_per_day"]
+    timestamps = [day_start + index * interval for index in range(settings["samples_per_day"])]
+    base_responses = [make_base_response(rng, timestamp, day_index) for timestamp in timestamps]
+    workers_responses = [make_workers_response(rng, timestamp, worker_names, base_hashrates) for timestamp in timestamps]
+
+    # revenue60m
+    revenues = [response["revenue"]["revenue60m"] for response in base_responses]
+    if storage_format == "sqlite":
+        add_samples(location[0], location[1], zip(timestamps, revenues))
+    elif storage_format == "columnar":
+        write_columns(paths["revenue"], date_str, {"ts": timestamps, "val": revenues})
+    else:
+        write_records(paths["revenue"], date_str, [
+            {"revenue60m": revenue60m, "timestamp": timestamp} for revenue60m, timestamp in zip(revenues, timestamps)
+        ], storage_format)
+
+    # Hashrate urządzeń
+    if storage_format == "sqlite":
+        add_worker_samples(location[0], [
+            (worker["name"], timestamp, hashrate_to_hs(worker["hashrate24h"]["hashrate"], worker["hashrate24h"]["hashrate_unit"]), worker["last_share_time"])
+            for timestamp, response in zip(timestamps, workers_responses) for worker in response["workers"]
+        ])
+    elif storage_format == "columnar":
+        samples = {}
+        for timestamp, response in zip(timestamps, workers_responses):
+            for worker in response["workers"]:
+                columns = samples.setdefault(worker["name"], {"ts": [], "val": [], "lst": []})
+                columns["ts"].append(timestamp)
+                columns["val"].append(hashrate_to_hs(worker["hashrate24h"]["hashrate"], worker["hashrate24h"]["hashrate_unit"]))
+                columns["lst"].append(worker["last_share_time"])
+        for name, columns in samples.items():
+            worker_path = os.path.join(paths["workers"], name)
+            os.makedirs(worker_path, exist_ok=True)
+            write_columns(worker_path, date_str, columns)
+    else:
+        write_records(paths["workers"], date_str, [
+            {
+                "hashrate24h": {
+                    "worker": worker["name"],
+                    "hashrate": worker["hashrate24h"]["hashrate"],
+                    "hashrate_unit": worker["hashrate24h"]["hashrate_unit"],
+                    "last_share_time": worker["last_share_time"]
+                },
+                "timestamp": timestamp
+            }
+            for timestamp, response in zip(timestamps, workers_responses) for worker in response["workers"]
+        ], storage_format)
+
+    # Pełne odpowiedzi /user/workers (w formatach jsonl, columnar i sqlite jako delty, tak jak hashrate_full_data.py)
+    if storage_format == "json":
+        write_records(paths["hashrate"], date_str, workers_responses, storage_format)
+        return
+    records = []
+    previous = None
+    for timestamp, response in zip(timestamps, workers_responses):
+        records.append(encode_snapshot(previous, response, timestamp))
+        previous = response
+    file_path = write_records(paths["hashrate"], date_str, records, storage_format)
+    return file_path, previous
+
+def generate_history(data_dir, revenue_dir, hashrate_dir, settings):
+    """
+    Generuje historię settings["days"] dni kończącą się dniem dzisiejszym (UTC) w pustym katalogu data_dir.
+    Zwraca liczbę wygenerowanych próbek revenue60m lub None, gdy katalog zawiera już dane.
+    """
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+    paths = {
+        "revenue": os.path.join(data_dir, revenue_dir),
+        "hashrate": os.path.join(data_dir, hashrate_dir),
+        "workers": os.path.join(data_dir, hashrate_dir, WORKERS_DIR)
+    }
+    if os.path.exists(paths["revenue"]) or os.path.exists(paths["hashrate"]):
+        log(f"Katalog {data_dir} zawiera już dane. Generator wymaga pustego katalogu")
+        return
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+
+    rng = random.Random(settings["seed"])
+    base_hashrates = [rng.uniform(50, 150) for _ in range(settings["workers"])]
+    today = datetime_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+    last_snapshot = None
+    for day_index in range(settings["days"]):
+        date_str = (today - timedelta(days=settings["days"] - 1 - day_index)).strftime("%Y-%m-%d")
+        with insert_batch():
+            last_snapshot = generate_day(paths, date_str, day_index, settings, rng, base_hashrates, (data_dir, revenue_dir))
+
+    # Ostatnia odpowiedź dnia dzisiejszego - kolejny zapis hashrate_full_data.py będzie deltą
+    if last_snapshot:
+        file_path, data = last_snapshot
+        save_last_snapshot(file_path, get_last_snapshot_path(paths["hashrate"], date_utc_string), data)
+
+    # Katalog partycji revenue60m (w kolektorach aktualizowany przy każdym zapisie)
+    if settings["storage_format"] != "sqlite":
+        get_catalog(data_dir, revenue_dir)
+    return settings["days"] * settings["samples_per_day"]
+
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("GENERATOR_DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ_or_default("REVENUE_DIR", "revenue60m")
+    hashrate_dir = get_environ_or_default("HASHRATE_DIR", "hashrate")
+
+    settings = get_generator_settings()
+    settings["storage_format"] = get_storage_format()
+
+    samples = generate_history(data_dir, revenue_dir, hashrate_dir, settings)
+    if samples is None: return
+    log(f"Wygenerowano {samples} próbek revenue60m ({settings['days']} dni, {settings['workers']} urządzeń, format {settings['storage_format']}) w katalogu {data_dir}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
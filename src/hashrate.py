@@ -1,7 +1,71 @@
-from helper import make_api_request, read_json_file, write_json_file, get_environ
+from helper import make_api_request, append_records, ensure_directory, get_environ, get_storage_format, hashrate_to_hs, log, WORKERS_DIR
+from timeseries import append_columns
+from sqlite_store import add_worker_samples
+from locks import job_lock, partition_lock
+from metrics import instrumented_job
 from datetime import datetime, timezone
 import os
 
+def store_hashrate(data, data_dir, hashrate_dir, datetime_utc):
+    """
+    Zapisuje hashrate wszystkich urządzeń z odpowiedzi /user/workers do dziennej partycji.
+    W formatach json i jsonl rekordy wszystkich urządzeń trafiają do pliku workers/<data> jednym zapisem,
+    w formacie columnar każde urządzenie ma katalog workers/<urządzenie> z kolumnami dziennymi,
+    a w formacie sqlite odczyty trafiają do tabeli worker_samples.
+    Zwraca ścieżkę ostatniego zapisanego pliku.
+    """
+    date_utc_string = datetime_utc.strftime("%Y-%m-%d")
+
+    # ścieżka
+    path = os.path.join(data_dir, hashrate_dir, WORKERS_DIR)
+    storage_format = get_storage_format()
+
+    # Czas próbki w sekundach epoki
+    timestamp = int(datetime_utc.timestamp())
+
+    # Format sqlite: odczyty wszystkich urządzeń w bazie (hashrate w H/s)
+    if storage_format == "sqlite":
+        return add_worker_samples(data_dir, [
+            (worker["name"], timestamp, hashrate_to_hs(worker["hashrate24h"]["hashrate"], worker["hashrate24h"]["hashrate_unit"]), worker["last_share_time"])
+            for worker in data["workers"]
+        ])
+
+    # Tworzenie katalogu, jeśli nie istnieje
+    ensure_directory(path)
+
+    # Format columnar: hashrate w H/s i czas ostatniego udziału jako int64
+    if storage_format == "columnar":
+        file_path = None
+        with partition_lock(data_dir, os.path.join(hashrate_dir, WORKERS_DIR), date_utc_string):
+            for worker in data["workers"]:
+                worker_path = os.path.join(path, worker["name"])
+                ensure_directory(worker_path)
+                file_path = append_columns(worker_path, date_utc_string, {
+                    "ts": timestamp,
+                    "val": hashrate_to_hs(worker["hashrate24h"]["hashrate"], worker["hashrate24h"]["hashrate_unit"]),
+                    "lst": worker["last_share_time"]
+                })
+        return file_path
+
+    # Rekordy wszystkich urządzeń (czytelne daty wyznaczane są dopiero przy prezentacji, helper.format_timestamp)
+    records = [
+        {
+            "hashrate24h": {
+                "worker": worker["name"],
+                "hashrate": worker["hashrate24h"]["hashrate"],
+                "hashrate_unit": worker["hashrate24h"]["hashrate_unit"],
+                "last_share_time": worker["last_share_time"]
+            },
+            "timestamp": timestamp
+        }
+        for worker in data["workers"]
+    ]
+
+    # Zapisywanie danych wszystkich urządzeń jedną operacją (z blokadą partycji)
+    with partition_lock(data_dir, os.path.join(hashrate_dir, WORKERS_DIR), date_utc_string):
+        return append_records(path, date_utc_string, records, storage_format)
+
+@instrumented_job("hashrate")
 def main():
     # Pobieranie zmiennych
     url = get_environ("API_URL_WORKERS")
@@ -10,50 +74,23 @@ def main():
     if not data_dir: return
     hashrate_dir = get_environ("HASHRATE_DIR")
     if not hashrate_dir: return
-    
-    # ścieżka
-    path = os.path.join(data_dir, hashrate_dir)
 
     # Aktualna data i czas UTC
     datetime_utc = datetime.now(timezone.utc)
-    datetime_utc_string = datetime_utc.strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Wysłanie zapytania
-    data = make_api_request(url)
-    if data is None:
-        return
     
-    # Przechodzenie przez wszystkie urządzenia
-    for worker in data["workers"]:
-        # Ścieżka pliku
-        file_name = f"{worker['name']}.json"
-        file_path = os.path.join(path, file_name)
-
-        # Tworzenie katalogu, jeśli nie istnieje
-        os.makedirs(path, exist_ok=True)
-        
-        # Odczytywanie istniejących danych
-        existing_data = read_json_file(file_path)
-        
-        # Konwersja timestampu na czytelną datę UTC
-        last_share_time_utc = datetime.fromtimestamp(worker["last_share_time"], timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Dodawanie nowych danych
-        new_data = {
-            "hashrate24h": {
-                "worker": worker["name"],
-                "hashrate": worker["hashrate24h"]["hashrate"],
-                "hashrate_unit": worker["hashrate24h"]["hashrate_unit"],
-                "last_share_time": worker["last_share_time"],
-                "last_share_time_utc": last_share_time_utc
-            }
-        }
-        existing_data.append(new_data)
-        
-        # Zapisywanie zaktualizowanych danych do pliku
-        write_json_file(file_path, existing_data)
+    # Pominięcie uruchomienia, gdy poprzednie (np. poprzedni tick crona) jeszcze trwa
+    with job_lock(data_dir, "hashrate") as acquired:
+        if not acquired: return
+
+        # Wysłanie zapytania
+        data = make_api_request(url)
+        if data is None:
+            return
+
+        # Zapisywanie danych urządzeń
+        file_path = store_hashrate(data, data_dir, hashrate_dir, datetime_utc)
 
-    print(f"{datetime_utc_string}(UTC) - Dane zapisane do pliku: {file_path}")
+    log(f"Dane zapisane do pliku: {file_path}")
 
 # Wykonanie funkcji
 if __name__ == "__main__":
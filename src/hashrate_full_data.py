@@ -1,6 +1,46 @@
-from helper import make_api_request, read_json_file, write_json_file, get_environ, get_datetime_utc
+from helper import make_api_request, append_record, append_jsonl_file, get_data_file_path, get_environ, get_datetime_utc, get_storage_format, log
+from locks import job_lock, partition_lock
+from snapshot import encode_snapshot, get_last_snapshot_path, load_last_snapshot, save_last_snapshot, remove_last_snapshots
+from metrics import instrumented_job
 import os
 
+def store_full_data(data, data_dir, hashrate_dir, datetime_utc):
+    """
+    Zapisuje odpowiedź /user/workers do dziennego pliku. Zwraca ścieżkę pliku.
+    W formatach jsonl i columnar pierwsza odpowiedź dnia zapisywana jest w całości,
+    a kolejne jako delty względem poprzedniej (snapshot.encode_snapshot).
+    W formacie json odpowiedź identyczna z poprzednią zapisywana jest jako znacznik "same".
+    """
+    date_utc_string = datetime_utc.strftime("%Y-%m-%d")
+
+    # ścieżka
+    path = os.path.join(data_dir, hashrate_dir)
+
+    # Tworzenie katalogu, jeśli nie istnieje
+    os.makedirs(path, exist_ok=True)
+
+    # Zapis z blokadą partycji (plik dzienny i zapamiętana ostatnia odpowiedź muszą pozostać zgodne)
+    storage_format = get_storage_format()
+    with partition_lock(data_dir, hashrate_dir, date_utc_string):
+        file_path = get_data_file_path(path, date_utc_string, storage_format)
+        last_snapshot_path = get_last_snapshot_path(path, date_utc_string)
+        previous = load_last_snapshot(file_path, last_snapshot_path)
+        if previous is None:
+            remove_last_snapshots(path)
+
+        # Format json: pełna odpowiedź dopisywana do tablicy, a odpowiedź niezmieniona jako znacznik "same"
+        if storage_format == "json":
+            record = data if previous != data else {"ts": int(datetime_utc.timestamp()), "same": True}
+            file_path = append_record(path, date_utc_string, record, storage_format)
+            save_last_snapshot(file_path, last_snapshot_path, data)
+            return file_path
+
+        # Zapisywanie delty względem poprzedniej odpowiedzi
+        append_jsonl_file(file_path, encode_snapshot(previous, data, int(datetime_utc.timestamp())))
+        save_last_snapshot(file_path, last_snapshot_path, data)
+        return file_path
+
+@instrumented_job("hashrate_full_data")
 def main():
     # Pobieranie zmiennych
     url = get_environ("API_URL_WORKERS")
@@ -10,33 +50,21 @@ def main():
     hashrate_dir = get_environ("HASHRATE_DIR")
     if not hashrate_dir: return
 
-    # Wysłanie zapytania
-    data = make_api_request(url)
-    if data is None: return
-
-    # Aktualna data i czas UTC
-    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
-    
-    # ścieżka
-    path = os.path.join(data_dir, hashrate_dir)
-
-    # Ścieżka pliku
-    file_name = f"{date_utc_string}.json"
-    file_path = os.path.join(path, file_name)
-    
-    # Tworzenie katalogu, jeśli nie istnieje
-    os.makedirs(path, exist_ok=True)
+    # Pominięcie uruchomienia, gdy poprzednie (np. poprzedni tick crona) jeszcze trwa
+    with job_lock(data_dir, "hashrate_full_data") as acquired:
+        if not acquired: return
 
-    # Odczytywanie istniejących danych
-    existing_data = read_json_file(file_path)
+        # Wysłanie zapytania
+        data = make_api_request(url)
+        if data is None: return
 
-    # Dodawanie nowych danych
-    existing_data.append(data)
+        # Aktualna data i czas UTC
+        datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
 
-    # Zapisywanie zaktualizowanych danych do pliku
-    write_json_file(file_path, existing_data)
+        # Zapisywanie danych do pliku
+        file_path = store_full_data(data, data_dir, hashrate_dir, datetime_utc)
 
-    print(f"{datetime_utc_string}(UTC) - Dane zapisane do pliku: {file_path}")
+    log(f"Dane zapisane do pliku: {file_path}")
 
 # Wykonanie funkcji
 if __name__ == "__main__":
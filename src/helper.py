@@ -1,16 +1,103 @@
 import requests
+from requests.adapters import HTTPAdapter
+import gzip
+import hashlib
+import itertools
 import json
 import os
-from datetime import datetime, timezone
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, date, timezone
+from functools import lru_cache
 from dotenv import load_dotenv
+from timeseries import read_columns, REVENUE_COLUMNS
+from stats import compute_stats
+from metrics import log, span, inc_counter
 
 # Wczytywanie zmiennych środowiskowych z pliku .env
 load_dotenv()
 
-# Aktualna data i czas UTC
-datetime_utc = datetime.now(timezone.utc)
-date_utc_string = datetime_utc.strftime("%Y-%m-%d")
-datetime_utc_string = datetime_utc.strftime("%Y-%m-%d %H:%M:%S")
+# Obsługiwane formaty zapisu danych
+STORAGE_FORMATS = ("json", "jsonl", "columnar", "sqlite")
+
+# Rozszerzenia plików partycji dziennych (".val" to kolumna wartości formatu columnar,
+# ".jsonl.gz" to zamknięta partycja skompresowana przez archive.py)
+ARCHIVE_EXTENSION = ".jsonl.gz"
+JSONL_EXTENSIONS = (".jsonl", ARCHIVE_EXTENSION)
+PARTITION_EXTENSIONS = (".json", ".jsonl", ".val", ARCHIVE_EXTENSION)
+
+# Rozszerzenie pliku z podsumowaniem skompresowanej partycji (bez ".json", aby nie był traktowany jak partycja)
+SUMMARY_EXTENSION = ".summary"
+
+# Mnożniki jednostek hashrate względem H/s
+HASHRATE_UNITS = {
+    "H/s": 1,
+    "KH/s": 1e3,
+    "MH/s": 1e6,
+    "GH/s": 1e9,
+    "TH/s": 1e12,
+    "PH/s": 1e15,
+    "EH/s": 1e18
+}
+
+# Parametry zapytań HTTP do API puli
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT") or 10)
+API_RETRIES = int(os.environ.get("API_RETRIES") or 3)
+API_BACKOFF = float(os.environ.get("API_BACKOFF") or 0.5)
+API_POOL_SIZE = int(os.environ.get("API_POOL_SIZE") or 10)
+
+# Kody HTTP, po których zapytanie jest ponawiane
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Cache odpowiedzi API: czas [s], przez który odpowiedź jest używana ponownie bez zapytania
+# (np. przez kolejne zadania tego samego cyklu), i katalog cache w DATA_DIR współdzielony przez procesy
+API_CACHE_TTL = float(os.environ.get("API_CACHE_TTL") or 30)
+API_CACHE_DIR = os.environ.get("API_CACHE_DIR") or "api_cache"
+
+# Odpowiedzi API w pamięci procesu: URL -> wpis cache (get_cached_response)
+response_cache = {}
+response_cache_lock = threading.Lock()
+
+# Współdzielona sesja HTTP (keep-alive, pula połączeń)
+http_session = None
+http_session_lock = threading.Lock()
+
+# Podkatalog katalogu HASHRATE_DIR z dziennymi partycjami hashrate urządzeń
+WORKERS_DIR = "workers"
+
+# Katalogi utworzone w tym procesie (bez ponownego os.makedirs przy każdym zapisie)
+created_directories = set()
+
+# Numer dnia 1970-01-01 (date.toordinal) - początek dnia w sekundach epoki liczony arytmetycznie
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Symbol zastępczy w szablonie HTML: [[[KLUCZ]]]
+PLACEHOLDER_PATTERN = re.compile(r"\[\[\[([A-Z0-9-]+)\]\]\]")
+
+# Skompilowane szablony HTML: ścieżka -> skompilowany szablon (compile_template)
+compiled_templates = {}
+
+# Podsumowania partycji trzymane w pamięci między uruchomieniami raportu w tym samym procesie (daemon.py)
+rollup_caches = {}
+
+# Pola rekordów revenue60m odczytywane z partycji json (pozostałe pola odpowiedzi API są pomijane)
+REVENUE_FIELDS = ("timestamp", "datetime_utc", "revenue60m")
+
+# Rozmiar fragmentu pliku czytanego przez strumieniowy odczyt tablic JSON (iter_json_array)
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Uprawnienia plików zapisywanych atomowo (tempfile.mkstemp tworzy pliki 0600) - jak przy open(), z uwzględnieniem umask
+FILE_UMASK = os.umask(0)
+os.umask(FILE_UMASK)
+FILE_MODE = 0o666 & ~FILE_UMASK
+
+# Grupowy zapis (write_batch): pliki zapisane w bieżącym bloku, które czekają na wspólne fsync
+write_batch_state = threading.local()
 
 def get_datetime_utc():
     """Aktualna data i czas UTC"""
@@ -19,92 +106,735 @@ def get_datetime_utc():
     datetime_utc_string = datetime_utc.strftime("%Y-%m-%d %H:%M:%S")
     return datetime_utc, date_utc_string, datetime_utc_string
 
-def make_api_request(url):
-    """Wysyła zapytanie GET do podanego URL i zwraca dane JSON."""
+def get_http_session():
+    """Zwraca współdzieloną sesję HTTP z ograniczoną pulą połączeń (tworzoną przy pierwszym użyciu)."""
+    global http_session
+    with http_session_lock:
+        if http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            http_session = session
+        return http_session
+
+def get_retry_delay(attempt):
+    """Zwraca czas oczekiwania przed kolejną próbą (wykładniczy backoff z pełnym jitterem)."""
+    return random.uniform(0, API_BACKOFF * 2 ** attempt)
+
+def get_api_cache_path(url):
+    """Zwraca ścieżkę pliku cache odpowiedzi URL lub None, gdy DATA_DIR nie jest określony."""
+    data_dir = os.environ.get("DATA_DIR")
+    if not data_dir:
+        return None
+    return os.path.join(data_dir, API_CACHE_DIR, f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.cache")
+
+def get_cached_response(url):
+    """
+    Zwraca wpis cache odpowiedzi URL ({"etag", "last_modified", "hash", "fetched_at", "body", "data"}) lub None.
+    Wpis z pamięci procesu ma już sparsowane dane, wpis z pliku (zapisany przez inny proces) - tylko treść odpowiedzi.
+    Plik cache: pierwsza linia to metadane JSON, dalej surowa treść odpowiedzi.
+    """
+    with response_cache_lock:
+        entry = response_cache.get(url)
+    if entry is not None:
+        return entry
+    cache_path = get_api_cache_path(url)
+    if cache_path is None or not os.path.exists(cache_path):
+        return None
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"{datetime_utc_string}(UTC) - Nie udało się połączyć z API: {e}")
+        with open(cache_path, "rb") as file:
+            entry = json.loads(file.readline())
+            entry["body"] = file.read()
+    except (OSError, ValueError):
         return None
+    if hashlib.sha256(entry["body"]).hexdigest() != entry.get("hash"):
+        return None  # Uszkodzony lub niepełny plik cache
+    entry["data"] = None
+    return entry
+
+def save_cached_response(url, entry):
+    """Zapisuje wpis cache odpowiedzi URL w pamięci procesu i atomowo w pliku (dla kolejnych procesów)."""
+    with response_cache_lock:
+        response_cache[url] = entry
+    cache_path = get_api_cache_path(url)
+    if cache_path is None:
+        return
+    metadata = {key: entry[key] for key in ("url", "etag", "last_modified", "hash", "fetched_at")}
+    tmp_path = f"{cache_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        ensure_directory(os.path.dirname(cache_path))
+        with open(tmp_path, "wb") as file:
+            file.write(json.dumps(metadata, separators=(",", ":")).encode() + b"\n")
+            file.write(entry["body"])
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log(f"Nie udało się zapisać cache odpowiedzi API do pliku {cache_path}: {e}")
+
+def get_entry_data(entry):
+    """Zwraca sparsowane dane wpisu cache (treść z pliku cache parsowana jest raz na proces)."""
+    if entry["data"] is None:
+        with span("json_parse"):
+            entry["data"] = json.loads(entry["body"])
+    return entry["data"]
+
+def get_conditional_headers(entry):
+    """Zwraca nagłówki zapytania warunkowego (If-None-Match, If-Modified-Since) dla wpisu cache."""
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def make_api_request(url, session=None):
+    """
+    Wysyła zapytanie GET do podanego URL i zwraca dane JSON.
+    Zapytanie ma limit czasu API_TIMEOUT i jest ponawiane do API_RETRIES razy
+    przy błędach połączenia oraz odpowiedziach 429/5xx.
+    Odpowiedzi są zapisywane w cache: w ciągu API_CACHE_TTL sekund zwracana jest odpowiedź z cache
+    bez zapytania, a później zapytanie jest warunkowe (ETag, Last-Modified). Odpowiedź 304 lub treść
+    o niezmienionym skrócie SHA-256 nie jest ponownie parsowana. Zwrócone dane są współdzielone
+    przez kolejne wywołania i nie mogą być modyfikowane.
+    """
+    if session is None:
+        session = get_http_session()
+
+    # Odpowiedź z bieżącego cyklu (np. pobrana przez poprzednie zadanie)
+    entry = get_cached_response(url)
+    if entry is not None and API_CACHE_TTL > 0 and 0 <= time.time() - entry["fetched_at"] < API_CACHE_TTL:
+        inc_counter("api_cache_hits_total", reason="ttl")
+        return get_entry_data(entry)
+
+    for attempt in range(API_RETRIES + 1):
+        try:
+            inc_counter("api_requests_total")
+            with span("api_fetch"):
+                response = session.get(url, timeout=API_TIMEOUT, headers=get_conditional_headers(entry))
+            if response.status_code in RETRY_STATUS_CODES and attempt < API_RETRIES:
+                inc_counter("api_errors_total", reason=str(response.status_code))
+                log(f"API zwróciło kod {response.status_code}, ponawiam zapytanie")
+                time.sleep(get_retry_delay(attempt))
+                continue
+
+            # Odpowiedź niezmieniona (serwer obsługuje zapytania warunkowe)
+            if response.status_code == 304 and entry is not None:
+                inc_counter("api_cache_hits_total", reason="not_modified")
+                entry = dict(entry, fetched_at=time.time())
+                save_cached_response(url, entry)
+                return get_entry_data(entry)
+
+            response.raise_for_status()
+            body = response.content
+            inc_counter("bytes_read_total", len(body), source="api")
+            digest = hashlib.sha256(body).hexdigest()
+            new_entry = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": digest,
+                "fetched_at": time.time(),
+                "body": body,
+                "data": None
+            }
+
+            # Treść identyczna z poprzednią - bez ponownego parsowania
+            if entry is not None and entry["hash"] == digest:
+                inc_counter("api_cache_hits_total", reason="same_hash")
+                new_entry["data"] = entry["data"]
+            data = get_entry_data(new_entry)
+            save_cached_response(url, new_entry)
+            return data
+        except requests.exceptions.HTTPError as e:
+            inc_counter("api_errors_total", reason="http")
+            log(f"Nie udało się połączyć z API: {e}")
+            return None
+        except requests.exceptions.RequestException as e:
+            inc_counter("api_errors_total", reason="connection")
+            if attempt >= API_RETRIES:
+                log(f"Nie udało się połączyć z API: {e}")
+                return None
+            log(f"Błąd połączenia z API ({e}), ponawiam zapytanie")
+            time.sleep(get_retry_delay(attempt))
+        except ValueError as e:
+            inc_counter("api_errors_total", reason="json")
+            log(f"Niepoprawna odpowiedź JSON z API: {e}")
+            return None
 
 def read_json_file(file_path):
-    """Odczytuje dane JSON z pliku i zwraca je jako obiekt Python."""
+    """
+    Odczytuje dane JSON z pliku i zwraca je jako obiekt Python.
+    Uszkodzony plik (np. ucięty przez przerwany zapis) nie jest traktowany jak pusty: kompletne rekordy
+    są odzyskiwane, a oryginał zachowywany jako <plik>.corrupt, zanim kolejny zapis go nadpisze.
+    """
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r") as file:
+            with span("file_read"), open(file_path, "r") as file:
+                inc_counter("bytes_read_total", os.fstat(file.fileno()).st_size, source="file")
                 return json.load(file)
         except json.JSONDecodeError:
-            print(f"{datetime_utc_string}(UTC) - Błąd dekodowania JSON z pliku: {file_path}")
-            return []
+            log(f"Błąd dekodowania JSON z pliku: {file_path}. Odzyskiwanie kompletnych rekordów")
+            shutil.copyfile(file_path, f"{file_path}.corrupt")
+            return salvage_json_file(file_path)
         except Exception as e:
-            print(f"{datetime_utc_string}(UTC) - Nie udało się otworzyć pliku {file_path}: {e}")
+            log(f"Nie udało się otworzyć pliku {file_path}: {e}")
             return []
     else:
         return []
 
-def write_json_file(file_path, data):
-    """Zapisuje dane JSON do pliku."""
+def salvage_json_array(text):
+    """Zwraca listę kompletnych elementów z uszkodzonej (np. uciętej) tablicy JSON."""
+    decoder = json.JSONDecoder()
+    records = []
+    index = text.find("[")
+    if index < 0:
+        return records
+    index += 1
+    length = len(text)
+    while True:
+        while index < length and text[index] in " \t\r\n,":
+            index += 1
+        if index >= length or text[index] == "]":
+            break
+        try:
+            record, index = decoder.raw_decode(text, index)
+        except json.JSONDecodeError:
+            break
+        records.append(record)
+    return records
+
+def salvage_json_file(file_path):
+    """Odzyskuje kompletne rekordy z uszkodzonego pliku z tablicą JSON."""
+    with open(file_path, "r", errors="replace") as file:
+        records = salvage_json_array(file.read())
+    log(f"Odzyskano {len(records)} rekordów z pliku: {file_path}")
+    return records
+
+def project_fields(record, fields):
+    """
+    Zwraca rekord ograniczony do wybranych pól. Pola zagnieżdżone podawane są jako ścieżki z kropkami
+    (np. "hashrate24h.worker"), a brakujące pola są pomijane.
+    """
+    projected = {}
+    for field in fields:
+        keys = field.split(".")
+        value = record
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return projected
+
+def iter_json_array(file_path, fields=None, keep_corrupt=False):
+    """
+    Zwraca kolejne elementy tablicy JSON z pliku bez wczytywania całego pliku do pamięci: plik czytany jest
+    fragmentami (JSON_CHUNK_SIZE), a elementy dekodowane pojedynczo (raw_decode), więc zużycie pamięci zależy
+    od rozmiaru elementu, a nie pliku. Opcjonalnie zwraca tylko wybrane pola elementów (project_fields).
+    Uszkodzony plik (np. ucięty przez przerwany zapis) zwraca kompletne elementy sprzed uszkodzenia,
+    a z keep_corrupt=True oryginał zachowywany jest jako <plik>.corrupt.
+    """
+    decoder = json.JSONDecoder()
+    inc_counter("bytes_read_total", os.path.getsize(file_path), source="file")
+    with open(file_path, "r", errors="replace") as file:
+        buffer = ""
+        while not buffer:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer = chunk.lstrip()
+        if not buffer.startswith("["):
+            log(f"Plik {file_path} nie zawiera tablicy JSON.")
+            return
+        index = 1
+        end_of_file = False
+        while True:
+            # Pominięcie separatorów, wczytanie kolejnego fragmentu po wyczerpaniu bufora
+            while index < len(buffer) and buffer[index] in " \t\r\n,":
+                index += 1
+            if index >= len(buffer):
+                if end_of_file:
+                    break
+                buffer = file.read(JSON_CHUNK_SIZE)
+                index = 0
+                end_of_file = not buffer
+                continue
+            if buffer[index] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, index)
+                # Po elemencie musi wystąpić separator ("," lub "]"). Liczba ucięta na granicy fragmentu
+                # (np. "0." z "0.1" lub "1" z "12") jest dekodowana ponownie po doczytaniu danych
+                delimiter = end
+                while delimiter < len(buffer) and buffer[delimiter] in " \t\r\n":
+                    delimiter += 1
+                if (delimiter < len(buffer) and buffer[delimiter] not in ",]") or (delimiter == len(buffer) and not end_of_file):
+                    raise json.JSONDecodeError("Niekompletny element", buffer, end)
+            except json.JSONDecodeError:
+                if end_of_file:
+                    break
+                # Doczytanie co najmniej tylu danych, ile zawiera niekompletny element (liniowy koszt dużych elementów)
+                chunk = file.read(max(JSON_CHUNK_SIZE, len(buffer) - index))
+                buffer = buffer[index:] + chunk
+                index = 0
+                end_of_file = not chunk
+                continue
+            index = end
+            yield record if fields is None or not isinstance(record, dict) else project_fields(record, fields)
+
+    # Tablica bez zamykającego "]" - plik ucięty lub uszkodzony
+    log(f"Błąd dekodowania JSON z pliku: {file_path}. Odzyskano kompletne rekordy sprzed uszkodzenia")
+    if keep_corrupt:
+        shutil.copyfile(file_path, f"{file_path}.corrupt")
+
+def defer_sync(file_path):
+    """Rejestruje plik do wspólnego fsync, jeśli trwa blok write_batch(). Zwraca True, gdy fsync jest odłożony."""
+    files = getattr(write_batch_state, "files", None)
+    if files is None:
+        return False
+    files.add(file_path)
+    return True
+
+def defer_directory_sync(path):
+    """Rejestruje katalog do wspólnego fsync, jeśli trwa blok write_batch(). Zwraca True, gdy fsync jest odłożony."""
+    directories = getattr(write_batch_state, "directories", None)
+    if directories is None:
+        return False
+    directories.add(path)
+    return True
+
+def fsync_directory(path):
+    """Synchronizuje katalog, aby podmiana pliku (os.replace) przetrwała awarię zasilania."""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return  # Systemy bez możliwości otwarcia katalogu (np. Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def sync_files(file_paths, directories=()):
+    """
+    Utrwala zapisane pliki (fsync każdego pliku) oraz ich katalogi i katalogi podmienionych plików
+    (każdy katalog raz). Błąd utrwalenia pliku jest zapisywany w logu.
+    """
+    for file_path in file_paths:
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError as e:
+            log(f"Nie udało się otworzyć pliku {file_path} do synchronizacji: {e}")
+            continue
+        try:
+            os.fsync(fd)
+        except OSError as e:
+            log(f"Nie udało się utrwalić pliku {file_path}: {e}")
+        finally:
+            os.close(fd)
+    for directory in {os.path.dirname(file_path) for file_path in file_paths} | set(directories):
+        fsync_directory(directory)
+
+@contextmanager
+def write_batch():
+    """
+    Grupowy zapis (group commit) dla jednego cyklu kolektora.
+    Pliki zapisane w bloku są od razu widoczne i podmieniane atomowo (plik tymczasowy jest utrwalany
+    przed podmianą), a fsync dopisanych plików i katalogów jest odkładany do końca bloku
+    i wykonywany raz dla każdego pliku i katalogu.
+    """
+    if getattr(write_batch_state, "files", None) is not None:
+        yield  # Blok zagnieżdżony - pliki utrwala blok zewnętrzny
+        return
+    write_batch_state.files = set()
+    write_batch_state.directories = set()
     try:
-        with open(file_path, "w") as file:
-            json.dump(data, file, indent=4)
+        yield
+    finally:
+        files, directories = write_batch_state.files, write_batch_state.directories
+        write_batch_state.files = write_batch_state.directories = None
+        sync_files(files, directories)
+
+def dump_json_array(records, file):
+    """
+    Zapisuje rekordy iteratora jako tablicę JSON po jednym elemencie (format identyczny z json.dump(..., indent=4)),
+    bez budowania listy w pamięci.
+    """
+    file.write("[")
+    separator = "\n    "
+    for record in records:
+        file.write(separator + json.dumps(record, indent=4).replace("\n", "\n    "))
+        separator = ",\n    "
+    file.write("]" if separator == "\n    " else "\n]")
+
+def write_json_file(file_path, data, compact=False):
+    """
+    Zapisuje dane JSON do pliku atomowo: dane trafiają do pliku tymczasowego, który po fsync
+    zastępuje plik docelowy (os.replace), po czym synchronizowany jest katalog.
+    Przerwany zapis nigdy nie zostawia uciętego pliku. W bloku write_batch() odkładany jest tylko fsync katalogu.
+    Iterator (np. iter_json_array tego samego pliku z dopisanymi rekordami) zapisywany jest strumieniowo jako tablica.
+    compact=True zapisuje dane bez wcięć (stan zapisywany w każdym cyklu). Zwraca True, gdy plik został zapisany.
+    """
+    try:
+        with span("file_write"):
+            # Unikalny plik tymczasowy <plik>.tmp.<losowy sufiks> - równoległe zapisy tego samego pliku
+            # nie nadpisują nawzajem swoich plików tymczasowych
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(file_path)}.tmp.", dir=os.path.dirname(file_path) or ".")
+            try:
+                with os.fdopen(fd, "w") as file:
+                    os.chmod(tmp_path, FILE_MODE)
+                    if compact:
+                        file.write(json.dumps(data, separators=(",", ":")))
+                    elif isinstance(data, (list, dict)):
+                        json.dump(data, file, indent=4)
+                    else:
+                        dump_json_array(data, file)
+                    file.flush()
+                    inc_counter("bytes_written_total", file.tell())
+                    # Dane pliku tymczasowego muszą trafić na dysk przed podmianą - inaczej awaria mogłaby
+                    # zostawić pusty plik w miejscu poprzedniej poprawnej wersji
+                    os.fsync(file.fileno())
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            if not defer_directory_sync(os.path.dirname(file_path)):
+                fsync_directory(os.path.dirname(file_path))
+        return True
     except Exception as e:
-        print(f"{datetime_utc_string}(UTC) - Nie udało się zapisać danych do pliku {file_path}: {e}")
+        log(f"Nie udało się zapisać danych do pliku {file_path}: {e}")
+        return False
+
+def iter_existing_records(file_path):
+    """Zwraca strumieniowo rekordy istniejącej tablicy JSON (uszkodzony oryginał zachowywany jako <plik>.corrupt)."""
+    if not os.path.exists(file_path):
+        return iter(())
+    return iter_json_array(file_path, keep_corrupt=True)
 
 def append_data_to_json_file(file_path, new_data):
-    """Dodaje nowe dane do istniejącego pliku JSON."""
-    existing_data = read_json_file(file_path)
-    existing_data.append(new_data)
-    write_json_file(file_path, existing_data)
+    """
+    Dodaje nowe dane do istniejącego pliku JSON. Istniejące rekordy są przepisywane strumieniowo
+    do pliku tymczasowego (bez wczytywania całej tablicy do pamięci).
+    """
+    write_json_file(file_path, itertools.chain(iter_existing_records(file_path), [new_data]))
+
+def get_storage_format():
+    """Zwraca format zapisu danych ze zmiennej STORAGE_FORMAT (domyślnie "json")."""
+    storage_format = os.environ.get("STORAGE_FORMAT", "json").strip().lower()
+    if storage_format not in STORAGE_FORMATS:
+        log(f"Nieznany format zapisu danych: {storage_format}. Używam formatu json")
+        return "json"
+    return storage_format
+
+def get_data_file_path(path, name, storage_format):
+    """
+    Zwraca ścieżkę pliku danych z rozszerzeniem odpowiednim dla formatu zapisu.
+    Rekordy dokumentowe (np. pełne odpowiedzi API) w formatach columnar i sqlite są zapisywane jako jsonl.
+    """
+    extension = "json" if storage_format == "json" else "jsonl"
+    return os.path.join(path, f"{name}.{extension}")
+
+def append_jsonl_file(file_path, new_data):
+    """
+    Dopisuje jeden rekord na końcu pliku JSON Lines bez odczytywania istniejących danych.
+    Plik jest utrwalany (fsync) od razu lub na końcu bloku write_batch().
+    """
+    try:
+        line = json.dumps(new_data, separators=(",", ":")) + "\n"
+        with span("file_write"), open(file_path, "a") as file:
+            file.write(line)
+            # Poza blokiem write_batch() (np. zadanie uruchomione z crona) plik jest utrwalany od razu
+            if not defer_sync(file_path):
+                file.flush()
+                os.fsync(file.fileno())
+        inc_counter("bytes_written_total", len(line))
+    except Exception as e:
+        log(f"Nie udało się dopisać danych do pliku {file_path}: {e}")
+
+def iter_jsonl_file(file_path):
+    """
+    Zwraca kolejne rekordy z pliku JSON Lines bez wczytywania całego pliku do pamięci.
+    Pliki skompresowane (.jsonl.gz) są dekompresowane strumieniowo.
+    """
+    inc_counter("bytes_read_total", os.path.getsize(file_path), source="file")
+    with (gzip.open(file_path, "rt") if file_path.endswith(".gz") else open(file_path, "r")) as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                log(f"Pomijanie uszkodzonej linii {line_number} w pliku: {file_path}")
+
+def read_jsonl_file(file_path):
+    """Odczytuje rekordy z pliku JSON Lines i zwraca je jako listę."""
+    return list(iter_jsonl_file(file_path))
+
+def append_jsonl_records(file_path, records):
+    """Dopisuje wiele rekordów na końcu pliku JSON Lines jednym zapisem (fsync jak w append_jsonl_file)."""
+    try:
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with span("file_write"), open(file_path, "a") as file:
+            file.write(lines)
+            if not defer_sync(file_path):
+                file.flush()
+                os.fsync(file.fileno())
+        inc_counter("bytes_written_total", len(lines))
+    except Exception as e:
+        log(f"Nie udało się dopisać danych do pliku {file_path}: {e}")
+
+def append_records(path, name, records, storage_format):
+    """Zapisuje wiele rekordów do pliku danych jedną operacją i zwraca ścieżkę pliku."""
+    file_path = get_data_file_path(path, name, storage_format)
+    if storage_format != "json":
+        append_jsonl_records(file_path, records)
+    else:
+        write_json_file(file_path, itertools.chain(iter_existing_records(file_path), records))
+    return file_path
+
+def ensure_directory(path):
+    """Tworzy katalog, jeśli nie istnieje (każdy katalog sprawdzany jest raz na proces)."""
+    if path not in created_directories:
+        os.makedirs(path, exist_ok=True)
+        created_directories.add(path)
+
+def append_record(path, name, new_data, storage_format):
+    """Zapisuje rekord do pliku danych w wybranym formacie i zwraca ścieżkę pliku."""
+    file_path = get_data_file_path(path, name, storage_format)
+    if storage_format != "json":
+        append_jsonl_file(file_path, new_data)
+    else:
+        append_data_to_json_file(file_path, new_data)
+    return file_path
 
 def get_json_files(directory):
-    """Zwraca listę plików JSON w danym katalogu."""
-    return [f for f in os.listdir(directory) if f.endswith(".json")]
+    """Zwraca listę plików JSON i JSON Lines w danym katalogu."""
+    return [f for f in os.listdir(directory) if f.endswith((".json", ".jsonl"))]
 
-def parse_date_from_filename(filename):
-    """Ekstrahuje datę z nazwy pliku w formacie YYYY-MM-DD.json."""
+def get_partition_files(directory):
+    """Zwraca listę plików partycji dziennych (json, jsonl, columnar) w danym katalogu."""
+    return [f for f in os.listdir(directory) if f.endswith(PARTITION_EXTENSIONS)]
+
+@lru_cache(maxsize=None)
+def get_partition_date(filename):
+    """
+    Zwraca klucz partycji "YYYY-MM-DD" z nazwy pliku w formacie YYYY-MM-DD.<rozszerzenie> lub None.
+    Klucze sortują się leksykograficznie w kolejności chronologicznej, więc nie trzeba ich parsować
+    do obiektów datetime (bez strptime, wynik zapamiętywany dla każdej nazwy pliku).
+    """
+    date_str = filename.split(".", 1)[0]
+    if len(date_str) != 10 or date_str[4] != "-" or date_str[7] != "-":
+        return None
+    year, month, day = date_str[:4], date_str[5:7], date_str[8:]
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return None
     try:
-        date_str = os.path.splitext(filename)[0]
-        return datetime.strptime(date_str, "%Y-%m-%d")
+        date(int(year), int(month), int(day))
     except ValueError:
         return None
+    return date_str
+
+def parse_date_from_filename(filename):
+    """Ekstrahuje datę z nazwy pliku w formacie YYYY-MM-DD.json."""
+    date_str = get_partition_date(filename)
+    if date_str is None:
+        return None
+    return datetime(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:]))
+
+@lru_cache(maxsize=4096)
+def format_timestamp(timestamp):
+    """Zamienia znacznik czasu (sekundy epoki) na czytelną datę UTC "YYYY-mm-dd HH:MM:SS" (tylko do prezentacji)."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def get_date_from_timestamp(timestamp):
+    """Zwraca klucz partycji "YYYY-MM-DD" dla znacznika czasu (sekundy epoki)."""
+    return format_timestamp(timestamp - timestamp % 86400)[:10]
+
+@lru_cache(maxsize=4096)
+def get_partition_timestamp(date_str):
+    """
+    Zwraca początek dnia "YYYY-MM-DD" (UTC) w sekundach epoki. Klucz jest dzielony na części jak w get_partition_date,
+    a czas liczony z numeru dnia (bez strptime, wynik zapamiętywany dla każdego klucza).
+    """
+    return (date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:])).toordinal() - EPOCH_ORDINAL) * 86400
+
+def get_datetime_timestamp(datetime_utc_string):
+    """Zamienia datę "YYYY-mm-dd HH:MM:SS" (UTC, rekordy sprzed wprowadzenia znaczników epoki) na sekundy epoki."""
+    return (
+        get_partition_timestamp(datetime_utc_string[:10])
+        + int(datetime_utc_string[11:13]) * 3600 + int(datetime_utc_string[14:16]) * 60 + int(datetime_utc_string[17:19])
+    )
 
 def compute_statistics(data):
-    """Oblicza minimalną, maksymalną i średnią wartość "revenue60m" w danych."""
-    revenues = [entry["revenue60m"] for entry in data if "revenue60m" in entry]
-    if not revenues:
+    """Oblicza minimalną, maksymalną i średnią wartość "revenue60m" w danych (jeden przebieg, bez kopiowania)."""
+    state = compute_stats(entry["revenue60m"] for entry in data if "revenue60m" in entry)
+    if not state["count"]:
         return None, None, None
-    min_revenue = min(revenues)
-    max_revenue = max(revenues)
-    avg_revenue = sum(revenues) / len(revenues)
-    return min_revenue, max_revenue, avg_revenue
+    return state["min"], state["max"], state["mean"]
+
+def iter_revenue_values(file_path):
+    """
+    Zwraca iterator wartości "revenue60m" z partycji dziennej lub None, gdy pliku nie można wczytać.
+    Dla formatu columnar jest to memoryview odwzorowanej w pamięci kolumny (bez kopiowania),
+    dla jsonl plik czytany jest linia po linii, a dla json strumieniowo element po elemencie (iter_json_array).
+    """
+    if file_path.endswith(".val"):
+        path, file_name = os.path.split(file_path)
+        name = os.path.splitext(file_name)[0]
+        return read_columns(path, name, REVENUE_COLUMNS)["val"]
+
+    if file_path.endswith(JSONL_EXTENSIONS):
+        if not os.path.exists(file_path):
+            log(f"Plik {file_path} nie istnieje.")
+            return None
+        return (entry["revenue60m"] for entry in iter_jsonl_file(file_path) if "revenue60m" in entry)
+
+    if not os.path.exists(file_path):
+        log(f"Plik {file_path} nie istnieje.")
+        return None
+    return (entry["revenue60m"] for entry in iter_json_array(file_path, REVENUE_FIELDS) if "revenue60m" in entry)
+
+def iter_revenue_samples(file_path):
+    """
+    Zwraca iterator par (znacznik czasu w sekundach epoki, revenue60m) z partycji dziennej lub None.
+    Rekordy bez znacznika czasu (zapisane przed jego wprowadzeniem) otrzymują czas z pola "datetime_utc"
+    lub północ dnia partycji.
+    """
+    path, file_name = os.path.split(file_path)
+    if file_path.endswith(".val"):
+        columns = read_columns(path, os.path.splitext(file_name)[0], REVENUE_COLUMNS)
+        return zip(columns["ts"], columns["val"])
+
+    if not os.path.exists(file_path):
+        log(f"Plik {file_path} nie istnieje.")
+        return None
+    data = iter_jsonl_file(file_path) if file_path.endswith(JSONL_EXTENSIONS) else iter_json_array(file_path, REVENUE_FIELDS)
+
+    partition_timestamp = get_partition_timestamp(get_partition_date(file_name))
+
+    def get_timestamp(entry):
+        if "timestamp" in entry:
+            return entry["timestamp"]
+        if "datetime_utc" in entry:
+            return get_datetime_timestamp(entry["datetime_utc"])
+        return partition_timestamp
+
+    return ((get_timestamp(entry), entry["revenue60m"]) for entry in data if "revenue60m" in entry)
+
+def get_file_signature(file_path):
+    """Zwraca sygnaturę pliku (czas modyfikacji w ns i rozmiar) do unieważniania podsumowań."""
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def load_rollup_cache(cache_path):
+    """Wczytuje zapisane podsumowania partycji (plik -> sygnatura i stan statystyk)."""
+    if cache_path in rollup_caches:
+        return rollup_caches[cache_path]
+    cache = read_json_file(cache_path)
+    if not isinstance(cache, dict):
+        cache = {}
+    rollup_caches[cache_path] = cache
+    return cache
+
+def get_partition_rollup(path, file, cache):
+    """
+    Zwraca stan statystyk (stats.new_stats) partycji revenue60m.
+    Plik jest wczytywany tylko wtedy, gdy nie ma go w cache lub zmieniła się jego sygnatura.
+    """
+    file_path = os.path.join(path, file)
+    signature = get_file_signature(file_path)
+    cached = cache.get(file)
+    if cached and cached["signature"] == signature and "stats" in cached:
+        return cached["stats"]
+
+    # Partycja skompresowana ma podsumowanie obok - bez dekompresji
+    summary = load_partition_summary(file_path)
+    if summary is not None:
+        cache[file] = {"signature": signature, "stats": summary["stats"]}
+        return summary["stats"]
+
+    values = iter_revenue_values(file_path)
+    if values is None:
+        return None
+    state = compute_stats(values)
+    cache[file] = {"signature": signature, "stats": state}
+    return state
+
+def get_summary_path(file_path):
+    """Zwraca ścieżkę podsumowania partycji (<data>.summary) dla pliku partycji."""
+    path, file = os.path.split(file_path)
+    return os.path.join(path, file.split(".", 1)[0] + SUMMARY_EXTENSION)
+
+def load_partition_summary(file_path):
+    """
+    Zwraca podsumowanie skompresowanej partycji revenue60m ({"signature", "count", "sum", "min", "max", "stats"})
+    lub None, gdy go nie ma albo nie odpowiada aktualnemu plikowi partycji.
+    """
+    if not file_path.endswith(ARCHIVE_EXTENSION):
+        return None
+    summary_path = get_summary_path(file_path)
+    if not os.path.exists(summary_path):
+        return None
+    summary = read_json_file(summary_path)
+    if not isinstance(summary, dict) or summary.get("signature") != get_file_signature(file_path):
+        return None
+    return summary
+
+def save_rollup_cache(cache_path, cache, files):
+    """Zapisuje podsumowania partycji, usuwając wpisy plików, których już nie ma."""
+    files = set(files)
+    for file in [file for file in cache if file not in files]:
+        del cache[file]
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    write_json_file(cache_path, cache)
+
+def hashrate_to_hs(hashrate, hashrate_unit):
+    """Przelicza hashrate na H/s."""
+    multiplier = HASHRATE_UNITS.get(hashrate_unit)
+    if multiplier is None:
+        log(f"Nieznana jednostka hashrate: {hashrate_unit}")
+        return float(hashrate)
+    return float(hashrate) * multiplier
 
 def load_data(file_path):
-    """Wczytuje dane JSON z pliku."""
+    """Wczytuje dane z pliku JSON lub JSON Lines."""
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r") as f:
+            if file_path.endswith(JSONL_EXTENSIONS):
+                return read_jsonl_file(file_path)
+            with span("file_read"), open(file_path, "r") as f:
+                inc_counter("bytes_read_total", os.fstat(f.fileno()).st_size, source="file")
                 return json.load(f)
         except json.JSONDecodeError:
-            print(f"{datetime_utc_string}(UTC) - Błąd dekodowania JSON w pliku: {file_path}")
-            return None
+            log(f"Błąd dekodowania JSON w pliku: {file_path}")
+            return salvage_json_file(file_path)
         except Exception as e:
-            print(f"{datetime_utc_string}(UTC) - Nie udało się otworzyć pliku {file_path}: {e}")
+            log(f"Nie udało się otworzyć pliku {file_path}: {e}")
             return None
     else:
-        print(f"{datetime_utc_string}(UTC) - Plik {file_path} nie istnieje.")
+        log(f"Plik {file_path} nie istnieje.")
         return None
     
 def get_environ(env_name):
     """Wczytuje dane z pliku env."""
     value = os.environ.get(env_name)
     if not value:
-        print(f"{datetime_utc_string}(UTC) - Wartość nie został określona w pliku .env (zmienna {env_name}).")
+        log(f"Wartość nie został określona w pliku .env (zmienna {env_name}).")
         return None
     
     return value
 
+def get_environ_or_default(env_name, default):
+    """Wczytuje dane z pliku env, a gdy zmienna nie jest określona zwraca wartość domyślną."""
+    return os.environ.get(env_name) or default
+
 def replace_placeholders(html_content, placeholders):
     """Zamienia symbole zastępcze "placeholders" na rzeczywiste dane"""
     for key, value in placeholders.items():
@@ -119,11 +849,65 @@ def get_html_template(template_dir, template_file_name):
             html_template = file.read()
             return html_template
     except Exception as e:
-        print(f"{datetime_utc_string}(UTC) - Wystąpił błąd podczas wczytywania szablonu HTML: {e}")
+        log(f"Wystąpił błąd podczas wczytywania szablonu HTML: {e}")
+        return
+
+def compile_template(html_template):
+    """
+    Dzieli szablon na segmenty: na parzystych pozycjach tekst, na nieparzystych klucze symboli zastępczych.
+    Zwraca słownik z segmentami i zbiorem kluczy.
+    """
+    segments = PLACEHOLDER_PATTERN.split(html_template)
+    return {"segments": segments, "keys": frozenset(segments[1::2])}
+
+def get_compiled_template(template_dir, template_file_name):
+    """Zwraca skompilowany szablon HTML; plik jest wczytywany ponownie tylko po jego zmianie."""
+    template_file_path = os.path.join(template_dir, template_file_name)
+    try:
+        mtime_ns = os.stat(template_file_path).st_mtime_ns
+    except OSError as e:
+        log(f"Wystąpił błąd podczas wczytywania szablonu HTML: {e}")
         return
 
-def get_revenue60m_data(data_dir, report_dir):
-    """Wczytuje dane z plików revenue60m"""
+    cached = compiled_templates.get(template_file_path)
+    if cached and cached["mtime_ns"] == mtime_ns:
+        return cached
+
+    html_template = get_html_template(template_dir, template_file_name)
+    if not html_template: return
+    compiled_template = compile_template(html_template)
+    compiled_template["mtime_ns"] = mtime_ns
+    compiled_templates[template_file_path] = compiled_template
+    return compiled_template
+
+def render_template(compiled_template, placeholders):
+    """
+    Składa treść wiadomości ze skompilowanego szablonu jednym łączeniem segmentów.
+    Zwraca None, gdy brakuje wartości dla symbolu zastępczego. Wartości, których szablon nie używa
+    (np. sekcje analityki pominięte w starszym szablonie), są ignorowane - ostrzeżenie zapisywane jest
+    raz dla każdego szablonu.
+    """
+    missing = compiled_template["keys"] - placeholders.keys()
+    if missing:
+        log(f"Brak wartości dla symboli zastępczych: {', '.join(sorted(missing))}")
+        return
+
+    unknown = placeholders.keys() - compiled_template["keys"] - compiled_template.setdefault("unknown_keys", set())
+    if unknown:
+        log(f"Szablon nie zawiera symboli zastępczych: {', '.join(sorted(unknown))}. Wartości zostaną pominięte")
+        compiled_template["unknown_keys"].update(unknown)
+
+    parts = list(compiled_template["segments"])
+    parts[1::2] = [placeholders[key] for key in parts[1::2]]
+    return "".join(parts)
+
+def get_revenue60m_data(data_dir, report_dir, date_utc_string=None):
+    """
+    Wczytuje dane z raportu revenue60m z dnia date_utc_string (domyślnie dzisiejszego)
+    oraz sekcję "analytics" raportu (None dla starszych raportów)
+    """
+    if date_utc_string is None:
+        datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
     report_path = os.path.join(data_dir, report_dir)
     report_file_name = f"{date_utc_string}.json"
     report_file_path = os.path.join(report_path, report_file_name)
@@ -131,7 +915,7 @@ def get_revenue60m_data(data_dir, report_dir):
     report_data = read_json_file(report_file_path)
 
     if not report_data:
-        print(f"{datetime_utc_string}(UTC) - Brak raportu z dnia {date_utc_string}")
+        log(f"Brak raportu z dnia {date_utc_string}")
         return
     
     def calculate_percentage_change(current, history):
@@ -158,7 +942,7 @@ def get_revenue60m_data(data_dir, report_dir):
     max_revenue_percent = round(max_revenue_percent, 2)
     avg_revenue_percent = round(avg_revenue_percent, 2)
 
-    return (min_revenue_history, max_revenue_history, avg_revenue_history, min_revenue_current, max_revenue_current, avg_revenue_current, min_revenue_percent, max_revenue_percent, avg_revenue_percent)
+    return (min_revenue_history, max_revenue_history, avg_revenue_history, min_revenue_current, max_revenue_current, avg_revenue_current, min_revenue_percent, max_revenue_percent, avg_revenue_percent, report_data.get("analytics"))
 
 def set_bg_color(revenue_percent):
     """
@@ -0,0 +1,90 @@
+from helper import make_api_request, get_environ, get_environ_or_default, get_datetime_utc, write_batch, log
+from revenue import store_revenue
+from hashrate import store_hashrate
+from hashrate_full_data import store_full_data
+from monitor import store_monitor
+from sqlite_store import insert_batch
+from locks import job_lock
+from metrics import instrumented_job, inc_counter, observe
+
+# Odbiorniki danych: (zmienna z URL endpointu, zmienna z katalogiem danych, funkcja zapisu).
+# Każdy endpoint pobierany jest raz na cykl, a odpowiedź trafia do wszystkich jego odbiorników.
+SINKS = (
+    ("API_URL_BASE", "REVENUE_DIR", store_revenue),
+    ("API_URL_WORKERS", "HASHRATE_DIR", store_hashrate),
+    ("API_URL_WORKERS", "HASHRATE_DIR", store_full_data),
+    ("API_URL_WORKERS", "MONITOR_DIR", store_monitor)
+)
+
+# Katalogi odbiorników opcjonalnych - odbiornik jest pomijany bez komunikatu, gdy zmienna nie jest określona
+OPTIONAL_SINK_DIRS = ("MONITOR_DIR",)
+
+def get_endpoint_sinks():
+    """Grupuje odbiorniki według endpointu. Zwraca słownik {zmienna URL: [(zmienna katalogu, funkcja)]}."""
+    endpoint_sinks = {}
+    for url_env, dir_env, store in SINKS:
+        endpoint_sinks.setdefault(url_env, []).append((dir_env, store))
+    return endpoint_sinks
+
+def count_samples(store, data):
+    """
+    Zwraca liczbę próbek zapisywanych przez odbiornik (hashrate urządzeń: jedna próbka na urządzenie,
+    monitor urządzeń nie zapisuje próbek).
+    """
+    if store is store_hashrate:
+        return len(data.get("workers") or [])
+    if store is store_monitor:
+        return 0
+    return 1
+
+def dispatch(url_env, data, data_dir, datetime_utc):
+    """
+    Przekazuje odpowiedź endpointu do wszystkich jego odbiorników.
+    Zwraca listę zapisanych plików i liczbę zapisanych próbek.
+    """
+    file_paths = []
+    samples = 0
+    for dir_env, store in get_endpoint_sinks()[url_env]:
+        directory = get_environ_or_default(dir_env, None) if dir_env in OPTIONAL_SINK_DIRS else get_environ(dir_env)
+        if not directory:
+            continue
+        file_path = store(data, data_dir, directory, datetime_utc)
+        if file_path is not None:
+            file_paths.append(file_path)
+            count = count_samples(store, data)
+            inc_counter("samples_written_total", count, sink=store.__name__)
+            samples += count
+    return file_paths, samples
+
+@instrumented_job("ingest")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+
+    # Jedno zapytanie na endpoint, odpowiedź rozsyłana do odbiorników.
+    # Pliki dopisane w cyklu i katalogi podmienionych plików są utrwalane wspólnie na końcu cyklu (write_batch),
+    # próbki formatu sqlite wstawiane jedną transakcją (insert_batch), a cykl jest pomijany,
+    # gdy poprzedni (np. poprzedni tick crona) jeszcze trwa
+    with job_lock(data_dir, "ingest") as acquired, write_batch(), insert_batch():
+        if not acquired: return
+        samples = 0
+        for url_env in get_endpoint_sinks():
+            url = get_environ(url_env)
+            if not url:
+                continue
+            data = make_api_request(url)
+            if data is None:
+                continue
+            file_paths, count = dispatch(url_env, data, data_dir, datetime_utc)
+            samples += count
+            for file_path in file_paths:
+                log(f"Dane zapisane do pliku: {file_path}")
+        observe("samples_per_tick", samples)
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
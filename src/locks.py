@@ -0,0 +1,79 @@
+from helper import get_environ_or_default, log
+from contextlib import contextmanager, ExitStack
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Brak blokad doradczych (np. Windows) - zapis bez koordynacji między procesami
+
+# Blokady doradcze (flock) koordynujące procesy zapisujące i czytające te same dane:
+# - blokada zadania: drugie uruchomienie zadania (np. kolejny tick crona) jest pomijane,
+#   jeśli poprzednie jeszcze trwa,
+# - blokada partycji: tylko jeden proces naraz wykonuje zapis (odczyt-modyfikacja-zapis) partycji,
+#   a raporty czytają partycję z blokadą współdzieloną, więc widzą ją w spójnym stanie.
+# Pliki blokad znajdują się w katalogu <DATA_DIR>/<LOCK_DIR>. Blokada jest zwalniana przez system
+# również wtedy, gdy proces zostanie zabity.
+
+# Zadania zapisujące pliki w katalogu DATA_DIR (wszystkie zakładają blokadę zadania w katalogu DATA_DIR),
+# również raporty (plik raportu, cache podsumowań partycji, katalog partycji)
+WRITER_JOBS = (
+    "backfill", "collector", "compaction", "hashrate", "hashrate_full_data", "ingest", "monitor",
+    "report", "report_revenue_history_vs_current", "report_tenants", "revenue", "send_report"
+)
+
+def get_lock_path(data_dir, *parts):
+    """Zwraca ścieżkę pliku blokady <data_dir>/<LOCK_DIR>/<parts...>.lock (tworzy katalog)."""
+    lock_dir = get_environ_or_default("LOCK_DIR", "locks")
+    lock_path = os.path.join(data_dir, lock_dir, *parts) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    return lock_path
+
+@contextmanager
+def file_lock(lock_path, shared=False, blocking=True):
+    """
+    Zakłada blokadę na pliku lock_path (wyłączną lub współdzieloną) na czas bloku with.
+    Zwraca True, gdy blokada została założona, lub False, gdy blocking=False, a blokadę trzyma inny proces.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(lock_path, "a") as file:
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(file.fileno(), operation)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def job_lock(data_dir, job_name):
+    """
+    Blokada zadania bez oczekiwania. Zwraca False (i wypisuje komunikat), gdy poprzednie
+    uruchomienie zadania jeszcze trwa - zadanie należy wtedy pominąć.
+    """
+    with file_lock(get_lock_path(data_dir, "jobs", job_name), blocking=False) as acquired:
+        if not acquired:
+            log(f"Poprzednie uruchomienie zadania {job_name} jeszcze trwa, pomijam")
+        yield acquired
+
+def partition_lock(data_dir, series_dir, partition, shared=False):
+    """Blokada partycji <partition> szeregu series_dir (wyłączna dla zapisu, współdzielona dla odczytu)."""
+    return file_lock(get_lock_path(data_dir, series_dir, partition), shared=shared)
+
+@contextmanager
+def exclusive_jobs(data_dir, job_names=WRITER_JOBS):
+    """
+    Zakłada blokady zadań job_names na czas bloku with, czekając na zakończenie trwających uruchomień.
+    Zadania uruchomione w tym czasie (job_lock) są pomijane, więc blok ma wyłączny dostęp do ich danych.
+    """
+    with ExitStack() as stack:
+        for job_name in sorted(job_names):
+            stack.enter_context(file_lock(get_lock_path(data_dir, "jobs", job_name)))
+        yield
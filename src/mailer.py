@@ -0,0 +1,125 @@
+from helper import get_environ, get_environ_or_default, log
+from metrics import span, inc_counter
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from concurrent.futures import ThreadPoolExecutor
+import smtplib
+import queue
+
+def get_smtp_config():
+    """
+    Wczytuje konfigurację serwera SMTP ze zmiennych środowiskowych. Zwraca None, gdy jej brakuje.
+    SMTP_STARTTLS=false wyłącza szyfrowanie (np. dla lokalnego serwera testowego).
+    """
+    smtp_server = get_environ("SMTP_SERVER")
+    if not smtp_server: return
+    smtp_port = get_environ("SMTP_PORT")
+    if not smtp_port: return
+    smtp_username = get_environ("SMTP_USERNAME")
+    if not smtp_username: return
+    smtp_password = get_environ("SMTP_PASSWORD")
+    if not smtp_password: return
+
+    return {
+        "server": smtp_server,
+        "port": int(smtp_port),
+        "username": smtp_username,
+        "password": smtp_password,
+        "starttls": get_environ_or_default("SMTP_STARTTLS", "true").lower() != "false",
+        "timeout": float(get_environ_or_default("SMTP_TIMEOUT", 30)),
+        "batch_size": int(get_environ_or_default("SMTP_BATCH_SIZE", 50)),
+        "max_connections": int(get_environ_or_default("SMTP_MAX_CONNECTIONS", 4))
+    }
+
+def smtp_connect(smtp_config):
+    """Otwiera połączenie SMTP (TLS i logowanie zgodnie z konfiguracją)."""
+    server = smtplib.SMTP(smtp_config["server"], smtp_config["port"], timeout=smtp_config["timeout"])
+    if smtp_config["starttls"]:
+        server.starttls()  # Inicjowanie szyfrowania TLS
+    server.login(smtp_config["username"], smtp_config["password"])
+    return server
+
+def build_message(from_email, subject, html_content):
+    """
+    Tworzy wiadomość HTML i zwraca ją w postaci tekstowej (serializacja tylko raz).
+    Odbiorcy podawani są wyłącznie w kopercie SMTP, więc nie widzą swoich adresów nawzajem.
+    """
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = from_email
+    msg["To"] = "undisclosed-recipients:;"
+    msg.attach(MIMEText(html_content, "html"))
+    return msg.as_string()
+
+def send_message(server, from_email, recipients, message, batch_size):
+    """
+    Wysyła jedną wiadomość do wielu odbiorców: jedna transakcja SMTP (wiele RCPT TO) na paczkę batch_size adresów.
+    Zwraca listę adresów, do których nie udało się dostarczyć wiadomości.
+    """
+    failed = []
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        inc_counter("smtp_messages_total")
+        try:
+            with span("smtp_send"):
+                refused = server.sendmail(from_email, batch, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        if refused:
+            inc_counter("smtp_errors_total", len(refused), reason="refused")
+        for recipient in batch:
+            if recipient in refused:
+                log(f"Wystąpił błąd podczas wysyłania do {recipient}: {refused[recipient]}")
+                failed.append(recipient)
+            else:
+                log(f"Wiadomość została wysłana do {recipient}")
+    return failed
+
+def send_messages(smtp_config, messages):
+    """
+    Wysyła listę wiadomości ({"from_email", "recipients", "message"}) przez pulę połączeń SMTP.
+    Liczba jednoczesnych połączeń jest ograniczona do smtp_config["max_connections"], a połączenia
+    są używane ponownie dla kolejnych wiadomości. Zwraca listę list nieobsłużonych adresów (dla każdej wiadomości).
+    """
+    pool = queue.LifoQueue()
+
+    def deliver(item):
+        try:
+            server = pool.get_nowait()
+        except queue.Empty:
+            try:
+                server = smtp_connect(smtp_config)
+            except Exception as e:
+                inc_counter("smtp_errors_total", reason="connection")
+                log(f"Wystąpił błąd podczas łączenia z serwerem SMTP: {e}")
+                return list(item["recipients"])
+
+        try:
+            failed = send_message(server, item["from_email"], item["recipients"], item["message"], smtp_config["batch_size"])
+        except smtplib.SMTPServerDisconnected:
+            # Połączenie z puli mogło zostać zamknięte przez serwer - jedna próba z nowym połączeniem
+            try:
+                server = smtp_connect(smtp_config)
+                failed = send_message(server, item["from_email"], item["recipients"], item["message"], smtp_config["batch_size"])
+            except Exception as e:
+                inc_counter("smtp_errors_total", reason="send")
+                log(f"Wystąpił błąd podczas wysyłania wiadomości: {e}")
+                return list(item["recipients"])
+        except Exception as e:
+            inc_counter("smtp_errors_total", reason="send")
+            log(f"Wystąpił błąd podczas wysyłania wiadomości: {e}")
+            return list(item["recipients"])
+
+        pool.put(server)
+        return failed
+
+    with ThreadPoolExecutor(max_workers=smtp_config["max_connections"]) as executor:
+        results = list(executor.map(deliver, messages))
+
+    # Zamknięcie połączeń SMTP
+    while not pool.empty():
+        try:
+            pool.get_nowait().quit()
+        except Exception:
+            pass
+    return results
@@ -0,0 +1,200 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+import threading
+import time
+import sys
+import os
+
+# Metryki procesu w formacie tekstowym Prometheusa (np. dla kolektora textfile node_exportera).
+# Liczniki i histogramy są przechowywane w pamięci procesu, a po zakończeniu każdego zadania (job)
+# zapisywane atomowo do pliku <DATA_DIR>/<METRICS_DIR>/<nazwa skryptu>.prom - demon (daemon.py)
+# gromadzi w jednym pliku metryki wszystkich swoich zadań, skrypty uruchamiane z crona mają osobne pliki.
+# Moduł nie korzysta z helper.py (helper.py mierzy przez niego zapytania API i operacje na plikach).
+
+METRIC_PREFIX = "mining_"
+
+# Progi histogramów: czasy w sekundach oraz liczby próbek
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Opisy metryk: nazwa -> (typ, opis, progi histogramu)
+METRICS = {
+    "span_duration_seconds": ("histogram", "Czas operacji (span): pobranie API, parsowanie JSON, odczyt i zapis plików, statystyki, wysyłka SMTP", LATENCY_BUCKETS),
+    "job_duration_seconds": ("histogram", "Czas wykonania zadania", LATENCY_BUCKETS),
+    "samples_per_tick": ("histogram", "Liczba próbek zapisanych w jednym cyklu kolektora", COUNT_BUCKETS),
+    "job_runs_total": ("counter", "Liczba uruchomień zadania", None),
+    "job_errors_total": ("counter", "Liczba zadań zakończonych wyjątkiem", None),
+    "api_requests_total": ("counter", "Liczba zapytań do API", None),
+    "api_errors_total": ("counter", "Liczba błędów zapytań do API", None),
+    "api_cache_hits_total": ("counter", "Liczba odpowiedzi API z cache (ttl, not_modified, same_hash)", None),
+    "bytes_read_total": ("counter", "Liczba bajtów odczytanych z plików i API", None),
+    "bytes_written_total": ("counter", "Liczba bajtów zapisanych do plików", None),
+    "samples_written_total": ("counter", "Liczba zapisanych próbek", None),
+    "smtp_messages_total": ("counter", "Liczba transakcji SMTP", None),
+    "smtp_errors_total": ("counter", "Liczba błędów wysyłki SMTP", None),
+    "monitor_events_total": ("counter", "Liczba zdarzeń monitora urządzeń (offline, online, drop)", None),
+    "sqlite_rows_written_total": ("counter", "Liczba wierszy zapisanych do bazy SQLite (format sqlite)", None)
+}
+
+# Wartości metryk: nazwa -> {etykiety (krotka par): wartość licznika lub stan histogramu}
+metric_values = {}
+metrics_lock = threading.Lock()
+
+def log(message):
+    """Wypisuje komunikat z aktualnym czasem UTC."""
+    print(f"{datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}(UTC) - {message}")
+
+def get_labels_key(labels):
+    """Zwraca klucz etykiet (posortowana krotka par)."""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc_counter(name, value=1, **labels):
+    """Zwiększa licznik name o value."""
+    key = get_labels_key(labels)
+    with metrics_lock:
+        series = metric_values.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+def observe(name, value, **labels):
+    """Dodaje obserwację do histogramu name."""
+    buckets = METRICS[name][2]
+    key = get_labels_key(labels)
+    with metrics_lock:
+        series = metric_values.setdefault(name, {})
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+                break
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+@contextmanager
+def span(name, **labels):
+    """Mierzy czas bloku i dodaje go do histogramu span_duration_seconds (etykieta span=name)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("span_duration_seconds", time.perf_counter() - start, span=name, **labels)
+
+def format_labels(key, extra=()):
+    """Formatuje etykiety w składni Prometheusa."""
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for key, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def render_metrics():
+    """Zwraca wszystkie metryki procesu w formacie tekstowym Prometheusa."""
+    lines = []
+    with metrics_lock:
+        for name in sorted(metric_values):
+            metric_type, description, buckets = METRICS[name]
+            full_name = METRIC_PREFIX + name
+            lines.append(f"# HELP {full_name} {description}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for key, value in sorted(metric_values[name].items()):
+                if metric_type == "counter":
+                    lines.append(f"{full_name}{format_labels(key)} {value}")
+                    continue
+                # Histogram: progi skumulowane, suma i liczba obserwacji
+                cumulative = 0
+                for bound, count in zip(buckets, value["buckets"]):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{format_labels(key, [('le', str(bound))])} {cumulative}")
+                lines.append(f"{full_name}_bucket{format_labels(key, [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{full_name}_sum{format_labels(key)} {value['sum']}")
+                lines.append(f"{full_name}_count{format_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+def get_metrics_path(data_dir):
+    """Zwraca ścieżkę pliku metryk procesu (nazwa uruchomionego skryptu)."""
+    metrics_dir = os.environ.get("METRICS_DIR") or "metrics"
+    process_name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+    return os.path.join(data_dir, metrics_dir, f"{process_name}.prom")
+
+def write_metrics(data_dir):
+    """Zapisuje metryki procesu atomowo (plik tymczasowy i podmiana). Zwraca ścieżkę pliku lub None."""
+    file_path = get_metrics_path(data_dir)
+    tmp_path = f"{file_path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(tmp_path, "w") as file:
+            file.write(render_metrics())
+        os.replace(tmp_path, file_path)
+    except OSError as e:
+        log(f"Nie udało się zapisać metryk do pliku {file_path}: {e}")
+        return None
+    return file_path
+
+def is_profiling_enabled(job):
+    """Sprawdza, czy zadanie jest wymienione w PROFILE_JOBS (nazwy oddzielone przecinkami lub "all")."""
+    jobs = {name.strip() for name in (os.environ.get("PROFILE_JOBS") or "").split(",") if name.strip()}
+    return "all" in jobs or job in jobs
+
+@contextmanager
+def profile(job, data_dir):
+    """
+    Profiluje blok zadania: cProfile zapisuje statystyki do <DATA_DIR>/<PROFILE_DIR>/<zadanie>-<czas>.prof
+    (odczyt przez pstats lub snakeviz), a tracemalloc zapisuje szczytowe zużycie pamięci i 25 miejsc
+    alokujących najwięcej pamięci do pliku .mem.txt obok.
+    """
+    import cProfile
+    import tracemalloc
+
+    profile_dir = os.path.join(data_dir, os.environ.get("PROFILE_DIR") or "profiles")
+    base_path = os.path.join(profile_dir, f"{job}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}")
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(f"{base_path}.prof")
+        with open(f"{base_path}.mem.txt", "w") as file:
+            file.write(f"Szczytowe zużycie pamięci: {peak / 1024 / 1024:.2f} MB\n")
+            for statistic in snapshot.statistics("lineno")[:25]:
+                file.write(f"{statistic}\n")
+        log(f"Profil zadania {job} zapisany do plików: {base_path}.prof, {base_path}.mem.txt")
+
+def instrumented_job(job):
+    """
+    Dekorator funkcji main zadania: mierzy czas i liczbę uruchomień, opcjonalnie profiluje zadanie
+    (PROFILE_JOBS) i po jego zakończeniu zapisuje metryki procesu do katalogu DATA_DIR.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            data_dir = os.environ.get("DATA_DIR")
+            start = time.perf_counter()
+            status = "error"
+            try:
+                if data_dir and is_profiling_enabled(job):
+                    with profile(job, data_dir):
+                        result = function(*args, **kwargs)
+                else:
+                    result = function(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                inc_counter("job_runs_total", job=job)
+                if status != "ok":
+                    inc_counter("job_errors_total", job=job)
+                observe("job_duration_seconds", time.perf_counter() - start, job=job)
+                if data_dir:
+                    write_metrics(data_dir)
+        return wrapper
+    return decorator
@@ -0,0 +1,111 @@
+from helper import (
+    get_environ, get_json_files, load_data, hashrate_to_hs, log, get_partition_date, get_date_from_timestamp,
+    get_partition_timestamp, get_datetime_timestamp, WORKERS_DIR
+)
+from timeseries import read_columns, replace_columns, REVENUE_COLUMNS, HASHRATE_COLUMNS
+from catalog import invalidate_catalog
+import os
+
+def merge_columns(path, name, columns, rows):
+    """
+    Dopisuje wiersze rows (krotki wartości kolumn columns) do kolumn partycji <name> i zapisuje kolumny atomowo
+    (timeseries.replace_columns). Wiersze obecne już w partycji są pomijane, więc ponowienie przerwanej migracji
+    nie duplikuje próbek.
+    """
+    existing = read_columns(path, name, columns)
+    existing_rows = list(zip(*(existing[column] for column in columns)))
+    present = set(existing_rows)
+    merged = existing_rows + [row for row in rows if row not in present]
+    replace_columns(path, name, {column: [row[index] for row in merged] for index, column in enumerate(columns)})
+
+def migrate_revenue_file(path, file):
+    """Przepisuje dzienny plik revenue60m (json lub jsonl) do kolumn ts/val i usuwa plik źródłowy."""
+    file_path = os.path.join(path, file)
+    data = load_data(file_path)
+    if not isinstance(data, list):
+        return False
+
+    # Rekordy bez czasu próbki otrzymują północ dnia partycji, aby nie utracić wartości
+    name = os.path.splitext(file)[0]
+    partition_timestamp = get_partition_timestamp(name)
+    rows = []
+    for entry in data:
+        if "revenue60m" not in entry:
+            continue
+        if "timestamp" in entry:
+            timestamp = entry["timestamp"]
+        elif "datetime_utc" in entry:
+            timestamp = get_datetime_timestamp(entry["datetime_utc"])
+        else:
+            timestamp = partition_timestamp
+        rows.append((int(timestamp), float(entry["revenue60m"])))
+    merge_columns(path, name, REVENUE_COLUMNS, rows)
+    os.remove(file_path)
+    return True
+
+def migrate_worker_file(file_path, workers_path):
+    """
+    Przepisuje plik z rekordami hashrate24h (dawny plik urządzenia lub dzienna partycja workers/<data>)
+    do katalogów urządzeń workers/<urządzenie> z kolumnami dziennymi i usuwa plik źródłowy.
+    Rekordy bez czasu próbki (timestamp) otrzymują jako ts czas ostatniego udziału.
+    """
+    data = load_data(file_path)
+    if not isinstance(data, list):
+        return False
+
+    # Wiersze grupowane według urządzenia i dnia - każda partycja urządzenia zapisywana jest raz
+    partitions = {}
+    for entry in data:
+        sample = entry.get("hashrate24h") if isinstance(entry, dict) else None
+        if not sample:
+            continue
+        last_share_time = int(sample["last_share_time"])
+        timestamp = int(entry.get("timestamp", last_share_time))
+        partitions.setdefault((sample["worker"], get_date_from_timestamp(timestamp)), []).append(
+            (timestamp, hashrate_to_hs(sample["hashrate"], sample["hashrate_unit"]), last_share_time)
+        )
+    for (worker, date_string), rows in partitions.items():
+        worker_path = os.path.join(workers_path, worker)
+        os.makedirs(worker_path, exist_ok=True)
+        merge_columns(worker_path, date_string, HASHRATE_COLUMNS, rows)
+    os.remove(file_path)
+    return True
+
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+    hashrate_dir = get_environ("HASHRATE_DIR")
+    if not hashrate_dir: return
+
+    # Dzienne pliki revenue60m
+    revenue_path = os.path.join(data_dir, revenue_dir)
+    if os.path.isdir(revenue_path):
+        for file in sorted(get_json_files(revenue_path)):
+            if migrate_revenue_file(revenue_path, file):
+                log(f"Plik przekonwertowany do formatu columnar: {os.path.join(revenue_path, file)}")
+
+    # Nazwy plików partycji uległy zmianie - katalog partycji zostanie zbudowany ponownie
+    invalidate_catalog(data_dir, revenue_dir)
+
+    # Dawne pliki urządzeń (pliki dzienne z pełnymi odpowiedziami API pozostają bez zmian)
+    hashrate_path = os.path.join(data_dir, hashrate_dir)
+    workers_path = os.path.join(hashrate_path, WORKERS_DIR)
+    if os.path.isdir(hashrate_path):
+        for file in sorted(get_json_files(hashrate_path)):
+            if get_partition_date(file):
+                continue
+            if migrate_worker_file(os.path.join(hashrate_path, file), workers_path):
+                log(f"Plik przekonwertowany do formatu columnar: {os.path.join(hashrate_path, file)}")
+
+    # Dzienne partycje urządzeń w formatach json i jsonl
+    if os.path.isdir(workers_path):
+        for file in sorted(get_json_files(workers_path)):
+            if migrate_worker_file(os.path.join(workers_path, file), workers_path):
+                log(f"Plik przekonwertowany do formatu columnar: {os.path.join(workers_path, file)}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from helper import get_environ, load_data, read_jsonl_file, log
+import json
+from catalog import invalidate_catalog
+import os
+
+def migrate_file(file_path):
+    """Konwertuje plik z tablicą JSON do formatu JSON Lines i usuwa plik źródłowy."""
+    data = load_data(file_path)
+    if not isinstance(data, list):
+        return False
+
+    # Plik docelowy mógł już powstać po przełączeniu kolektorów na format jsonl
+    target_path = os.path.splitext(file_path)[0] + ".jsonl"
+    if os.path.exists(target_path):
+        data.extend(read_jsonl_file(target_path))
+
+    # Zapis do pliku tymczasowego i podmiana, aby nie zostawić połowicznie zapisanego pliku
+    tmp_path = target_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        for record in data:
+            file.write(json.dumps(record, separators=(",", ":")) + "\n")
+    os.replace(tmp_path, target_path)
+    os.remove(file_path)
+    return True
+
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+    hashrate_dir = get_environ("HASHRATE_DIR")
+    if not hashrate_dir: return
+
+    # Konwersja wszystkich plików JSON w katalogach z danymi
+    for directory in (revenue_dir, hashrate_dir):
+        path = os.path.join(data_dir, directory)
+        if not os.path.isdir(path):
+            log(f"Katalog {path} nie istnieje")
+            continue
+
+        for file in sorted(os.listdir(path)):
+            if not file.endswith(".json"):
+                continue
+            file_path = os.path.join(path, file)
+            if migrate_file(file_path):
+                log(f"Plik przekonwertowany do formatu jsonl: {file_path}")
+            else:
+                log(f"Pominięto plik, którego nie można przekonwertować: {file_path}")
+
+    # Nazwy plików partycji uległy zmianie - katalog partycji zostanie zbudowany ponownie
+    invalidate_catalog(data_dir, revenue_dir)
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
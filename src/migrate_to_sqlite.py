@@ -0,0 +1,102 @@
+from helper import (
+    get_environ, iter_json_array, iter_jsonl_file, iter_revenue_samples, hashrate_to_hs, log,
+    get_partition_date, JSONL_EXTENSIONS, WORKERS_DIR
+)
+from timeseries import read_columns, HASHRATE_COLUMNS
+from catalog import get_catalog, catalog_range
+from tenants import get_wallet_registry
+from sqlite_store import add_samples, add_worker_samples, delete_samples, delete_worker_samples, get_day_range
+import os
+
+# Import istniejących danych (formaty json, jsonl, columnar i archiwa .jsonl.gz) do bazy formatu sqlite:
+# partycje revenue60m i hashrate urządzeń katalogu DATA_DIR oraz katalogów portfeli z rejestru.
+# Pliki źródłowe pozostają bez zmian. Przed importem dnia jego próbki są usuwane z bazy, a próbki dnia
+# wstawiane są jedną transakcją - ponowne uruchomienie importu (np. po przerwaniu) nie duplikuje próbek.
+# Dni, których surowe partycje usunęła retencja (compaction.py), mają tylko kubełki zagregowane i nie są importowane.
+
+def import_revenue(data_dir, revenue_dir):
+    """Importuje partycje revenue60m katalogu data_dir. Zwraca liczbę zaimportowanych próbek."""
+    path = os.path.join(data_dir, revenue_dir)
+    if not os.path.isdir(path):
+        return 0
+    imported = 0
+    for date_str, file in catalog_range(get_catalog(data_dir, revenue_dir)):
+        samples = iter_revenue_samples(os.path.join(path, file))
+        if samples is None:
+            continue
+        samples = [(int(timestamp), value) for timestamp, value in samples]
+        delete_samples(data_dir, revenue_dir, *get_day_range(date_str))
+        add_samples(data_dir, revenue_dir, samples)
+        imported += len(samples)
+    return imported
+
+def get_worker_partitions(workers_path):
+    """
+    Grupuje partycje urządzeń według dnia: {data: [ścieżki]} - pliki dzienne (json, jsonl, archiwa)
+    i katalogi urządzeń formatu columnar (ścieżka kolumny "val").
+    """
+    partitions = {}
+    for entry in sorted(os.listdir(workers_path)):
+        entry_path = os.path.join(workers_path, entry)
+        if os.path.isdir(entry_path):
+            for file in sorted(os.listdir(entry_path)):
+                date_str = get_partition_date(file)
+                if file.endswith(".val") and date_str:
+                    partitions.setdefault(date_str, []).append(os.path.join(entry_path, file))
+            continue
+        date_str = get_partition_date(entry)
+        if date_str and entry.endswith((".json",) + JSONL_EXTENSIONS):
+            partitions.setdefault(date_str, []).append(entry_path)
+    return partitions
+
+def read_worker_partition(file_path):
+    """Zwraca odczyty (urządzenie, znacznik czasu, hashrate [H/s], ostatni udział) z partycji urządzeń."""
+    if file_path.endswith(".val"):
+        path, file = os.path.split(file_path)
+        columns = read_columns(path, os.path.splitext(file)[0], HASHRATE_COLUMNS)
+        worker = os.path.basename(path)
+        return [(worker, ts, value, last_share) for ts, value, last_share in zip(columns["ts"], columns["val"], columns["lst"])]
+
+    records = iter_jsonl_file(file_path) if file_path.endswith(JSONL_EXTENSIONS) else iter_json_array(file_path)
+    return [
+        (
+            record["hashrate24h"]["worker"],
+            int(record.get("timestamp", record["hashrate24h"]["last_share_time"])),
+            hashrate_to_hs(record["hashrate24h"]["hashrate"], record["hashrate24h"]["hashrate_unit"]),
+            int(record["hashrate24h"]["last_share_time"])
+        )
+        for record in records if isinstance(record, dict) and "hashrate24h" in record
+    ]
+
+def import_workers(data_dir, hashrate_dir):
+    """Importuje partycje hashrate urządzeń katalogu data_dir. Zwraca liczbę zaimportowanych odczytów."""
+    workers_path = os.path.join(data_dir, hashrate_dir, WORKERS_DIR)
+    if not os.path.isdir(workers_path):
+        return 0
+    imported = 0
+    for date_str, file_paths in sorted(get_worker_partitions(workers_path).items()):
+        samples = [sample for file_path in file_paths for sample in read_worker_partition(file_path)]
+        delete_worker_samples(data_dir, *get_day_range(date_str))
+        add_worker_samples(data_dir, samples)
+        imported += len(samples)
+    return imported
+
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+    hashrate_dir = get_environ("HASHRATE_DIR")
+    if not hashrate_dir: return
+
+    # Katalog główny i katalogi portfeli z rejestru
+    for directory in [data_dir] + [tenant["data_dir"] for tenant in get_wallet_registry(data_dir)]:
+        revenue_samples = import_revenue(directory, revenue_dir)
+        worker_samples = import_workers(directory, hashrate_dir)
+        if revenue_samples or worker_samples:
+            log(f"Zaimportowano {revenue_samples} próbek revenue60m i {worker_samples} odczytów urządzeń z katalogu {directory}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from helper import get_environ, get_json_files, load_data, append_records, log, get_storage_format, get_partition_date, get_date_from_timestamp, WORKERS_DIR
+import os
+
+def split_worker_file(file_path, workers_path, storage_format):
+    """
+    Rozdziela dawny plik urządzenia (pełna historia) na dzienne partycje workers/<data>.
+    Rekordy bez czasu próbki (timestamp) przypisywane są do dnia wyznaczonego z last_share_time.
+    """
+    data = load_data(file_path)
+    if not isinstance(data, list):
+        return False
+
+    # Grupowanie rekordów według dnia, aby każda partycja była zapisana jedną operacją
+    records_by_date = {}
+    for entry in data:
+        sample = entry.get("hashrate24h") if isinstance(entry, dict) else None
+        if not sample:
+            continue
+        date_string = get_date_from_timestamp(int(entry.get("timestamp", sample["last_share_time"])))
+        records_by_date.setdefault(date_string, []).append(entry)
+
+    for date_string, records in sorted(records_by_date.items()):
+        append_records(workers_path, date_string, records, storage_format)
+    os.remove(file_path)
+    return True
+
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    hashrate_dir = get_environ("HASHRATE_DIR")
+    if not hashrate_dir: return
+
+    # Ścieżki
+    hashrate_path = os.path.join(data_dir, hashrate_dir)
+    workers_path = os.path.join(hashrate_path, WORKERS_DIR)
+    if not os.path.isdir(hashrate_path):
+        log(f"Katalog {hashrate_path} nie istnieje")
+        return
+    os.makedirs(workers_path, exist_ok=True)
+
+    # Format columnar ma własny migrator (migrate_to_columnar.py)
+    storage_format = get_storage_format()
+    if storage_format == "columnar":
+        storage_format = "jsonl"
+
+    # Dawne pliki urządzeń (pliki dzienne z pełnymi odpowiedziami API pozostają bez zmian)
+    for file in sorted(get_json_files(hashrate_path)):
+        if get_partition_date(file):
+            continue
+        file_path = os.path.join(hashrate_path, file)
+        if split_worker_file(file_path, workers_path, storage_format):
+            log(f"Plik urządzenia podzielony na partycje dzienne: {file_path}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+from helper import (
+    make_api_request, get_environ, get_environ_or_default, get_datetime_utc, ensure_directory, hashrate_to_hs,
+    format_timestamp, get_file_signature, write_json_file, log
+)
+from mailer import get_smtp_config, build_message, send_messages
+from tenants import get_wallet_registry, split_list
+from locks import job_lock, partition_lock
+from metrics import instrumented_job, span, inc_counter
+import heapq
+import html
+import json
+import os
+
+# Monitor urządzeń: wykrywa urządzenia, które przestały wysyłać udziały (offline), ich powrót (online)
+# oraz spadki hashrate względem średniej z ostatnich HASHRATE_BASELINE_HOURS godzin.
+# Każde urządzenie ma termin last_share_time + MONITOR_OFFLINE_AFTER w kolejce priorytetowej (heapq),
+# więc cykl sprawdza tylko terminy, które minęły (O(log n) na urządzenie), a nie wszystkie urządzenia.
+# Zdarzenia gromadzone są w stanie monitora i wysyłane zbiorczo (digest) co MONITOR_DIGEST_INTERVAL sekund.
+# Monitor działa jako odbiornik endpointu /user/workers w ingest.py i collector.py (gdy określony jest
+# MONITOR_DIR) lub samodzielnie z crona (python monitor.py). Stan zapisywany jest w pliku
+# <DATA_DIR>/<MONITOR_DIR>/state.json, a w demonie (daemon.py) pozostaje w pamięci między cyklami.
+
+# Maksymalna liczba niewysłanych zdarzeń (np. przy niedostępnym serwerze SMTP) - starsze są pomijane
+MAX_PENDING_EVENTS = 1000
+
+# Stany monitorów w pamięci procesu: ścieżka pliku stanu -> {"state", "heap", "signature"}
+monitors = {}
+
+def get_monitor_settings():
+    """Wczytuje parametry monitora: czas bez udziałów [s], okno średniej [h], próg spadku [%] i interwał digestu [s]."""
+    return {
+        "offline_after": int(get_environ_or_default("MONITOR_OFFLINE_AFTER", 600)),
+        "baseline_hours": int(get_environ_or_default("HASHRATE_BASELINE_HOURS", 24)),
+        "drop_threshold": float(get_environ_or_default("HASHRATE_DROP_THRESHOLD", 20)),
+        "digest_interval": int(get_environ_or_default("MONITOR_DIGEST_INTERVAL", 900))
+    }
+
+def get_state_path(data_dir, monitor_dir):
+    """Zwraca ścieżkę pliku stanu monitora."""
+    return os.path.join(data_dir, monitor_dir, "state.json")
+
+def build_deadline_heap(workers):
+    """Buduje kolejkę terminów (termin, urządzenie) urządzeń online."""
+    heap = [(worker["deadline"], name) for name, worker in workers.items() if not worker["offline"]]
+    heapq.heapify(heap)
+    return heap
+
+def load_monitor(state_path):
+    """
+    Zwraca monitor (stan i kolejkę terminów) z pamięci procesu lub z pliku stanu.
+    Stan w pamięci jest wczytywany ponownie, gdy plik zmienił inny proces (np. monitor.py z crona i kolektor).
+    """
+    signature = get_file_signature(state_path) if os.path.exists(state_path) else None
+    monitor = monitors.get(state_path)
+    if monitor is not None and monitor["signature"] == signature:
+        return monitor
+
+    state = {}
+    if signature is not None:
+        try:
+            with open(state_path, "r") as file:
+                state = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            log(f"Nie udało się wczytać stanu monitora z pliku {state_path}: {e}")
+    state.setdefault("workers", {})
+    state.setdefault("pending", [])
+    state.setdefault("last_digest", 0)
+    monitor = monitors[state_path] = {"state": state, "heap": build_deadline_heap(state["workers"]), "signature": signature}
+    return monitor
+
+def save_monitor(state_path, monitor):
+    """
+    Zapisuje stan monitora atomowo (helper.write_json_file) i zapamiętuje sygnaturę pliku.
+    Stan zapisywany jest w każdym cyklu, więc w zwartej postaci (json.dumps korzysta z kodera w C).
+    """
+    if write_json_file(state_path, monitor["state"], compact=True):
+        monitor["signature"] = get_file_signature(state_path)
+
+def add_event(state, event):
+    """Dodaje zdarzenie do kolejki digestu."""
+    inc_counter("monitor_events_total", type=event["type"])
+    state["pending"].append(event)
+    del state["pending"][:-MAX_PENDING_EVENTS]
+
+def update_baseline(worker, hashrate, timestamp, baseline_hours):
+    """
+    Dodaje próbkę hashrate [H/s] do kubełków godzinowych urządzenia ([godzina, suma, liczba]) i usuwa kubełki
+    starsze niż baseline_hours. Zwraca średnią z pełnych godzin przed bieżącą lub None, gdy brak danych.
+    """
+    hour = timestamp // 3600
+    buckets = worker["baseline"]
+    if buckets and buckets[-1][0] == hour:
+        buckets[-1][1] += hashrate
+        buckets[-1][2] += 1
+    else:
+        buckets.append([hour, hashrate, 1])
+    while buckets[0][0] < hour - baseline_hours:
+        buckets.pop(0)
+
+    total = sum(bucket[1] for bucket in buckets[:-1])
+    count = sum(bucket[2] for bucket in buckets[:-1])
+    return total / count if count else None
+
+def observe_worker(monitor, name, hashrate, last_share_time, timestamp, settings):
+    """Aktualizuje stan urządzenia po odczycie z API i zgłasza powrót online oraz spadek hashrate."""
+    state = monitor["state"]
+    worker = state["workers"].get(name)
+    if worker is None:
+        worker = state["workers"][name] = {
+            "last_share": last_share_time, "deadline": None, "offline": False, "dropped": False, "baseline": []
+        }
+    elif last_share_time <= worker["last_share"]:
+        last_share_time = None  # Brak nowego udziału - termin bez zmian
+
+    # Nowy udział: przesunięcie terminu (poprzedni wpis w kolejce staje się nieaktualny)
+    if last_share_time is not None:
+        if worker["offline"]:
+            worker["offline"] = False
+            add_event(state, {"type": "online", "worker": name, "ts": timestamp, "last_share": last_share_time})
+        worker["last_share"] = last_share_time
+        worker["deadline"] = last_share_time + settings["offline_after"]
+        heapq.heappush(monitor["heap"], (worker["deadline"], name))
+
+    # Spadek hashrate względem średniej z ostatnich godzin (zgłaszany raz, do powrotu powyżej progu)
+    baseline = update_baseline(worker, hashrate, timestamp, settings["baseline_hours"])
+    if baseline:
+        drop_percent = (baseline - hashrate) / baseline * 100
+        if drop_percent >= settings["drop_threshold"]:
+            if not worker["dropped"]:
+                worker["dropped"] = True
+                add_event(state, {
+                    "type": "drop", "worker": name, "ts": timestamp,
+                    "baseline_hs": round(baseline, 2), "latest_hs": round(hashrate, 2), "drop_percent": round(drop_percent, 2)
+                })
+        else:
+            worker["dropped"] = False
+
+def expire_deadlines(monitor, timestamp):
+    """Zgłasza urządzenia, których termin minął (offline). Nieaktualne wpisy kolejki są pomijane."""
+    state = monitor["state"]
+    heap = monitor["heap"]
+    while heap and heap[0][0] <= timestamp:
+        deadline, name = heapq.heappop(heap)
+        worker = state["workers"].get(name)
+        if worker is None or worker["offline"] or worker["deadline"] != deadline:
+            continue
+        worker["offline"] = True
+        add_event(state, {"type": "offline", "worker": name, "ts": timestamp, "last_share": worker["last_share"]})
+
+    # Przebudowa kolejki, gdy nieaktualne wpisy przeważają (każdy nowy udział dodaje wpis)
+    if len(heap) > 4 * len(state["workers"]) + 64:
+        monitor["heap"] = build_deadline_heap(state["workers"])
+
+def get_digest_recipients(data_dir):
+    """Zwraca odbiorców alertów: MONITOR_EMAILS, odbiorców portfela z rejestru (katalog portfela) lub TO_EMAILS."""
+    recipients = split_list(os.environ.get("MONITOR_EMAILS"))
+    if recipients:
+        return recipients
+    for tenant in get_wallet_registry(os.path.dirname(os.path.normpath(data_dir))):
+        if os.path.normpath(tenant["data_dir"]) == os.path.normpath(data_dir):
+            return tenant["recipients"]
+    return split_list(os.environ.get("TO_EMAILS"))
+
+def render_digest(data_dir, events):
+    """Zwraca treść HTML digestu zdarzeń."""
+    descriptions = {"offline": "brak udziałów (offline)", "online": "ponownie online", "drop": "spadek hashrate"}
+    rows = []
+    for event in events:
+        if event["type"] == "drop":
+            details = f"{event['latest_hs'] / 1e12:.2f} TH/s wobec średniej {event['baseline_hs'] / 1e12:.2f} TH/s (-{event['drop_percent']}%)"
+        else:
+            details = f"ostatni udział: {format_timestamp(event['last_share'])}"
+        rows.append(
+            f"<tr><td>{html.escape(format_timestamp(event['ts']))}</td><td>{html.escape(event['worker'])}</td>"
+            f"<td>{descriptions[event['type']]}</td><td>{html.escape(details)}</td></tr>"
+        )
+    return (
+        f"<html><body><p>Zdarzenia urządzeń ({html.escape(data_dir)}): {len(events)}</p>"
+        "<table border=\"1\" cellpadding=\"4\" cellspacing=\"0\">"
+        "<tr><th>Czas (UTC)</th><th>Urządzenie</th><th>Zdarzenie</th><th>Szczegóły</th></tr>"
+        f"{''.join(rows)}</table></body></html>"
+    )
+
+def send_digest(data_dir, state, timestamp, settings):
+    """
+    Wysyła zebrane zdarzenia jedną wiadomością, jeśli od poprzedniego digestu minęło MONITOR_DIGEST_INTERVAL sekund.
+    Zdarzenia pozostają w kolejce, gdy wiadomości nie udało się dostarczyć do żadnego odbiorcy.
+    """
+    if not state["pending"] or timestamp - state["last_digest"] < settings["digest_interval"]:
+        return
+    state["last_digest"] = timestamp
+
+    from_email = get_environ("FROM_EMAIL")
+    if not from_email: return
+    recipients = get_digest_recipients(data_dir)
+    if not recipients:
+        log(f"Brak odbiorców alertów monitora urządzeń ({data_dir})")
+        return
+    smtp_config = get_smtp_config()
+    if not smtp_config: return
+
+    events = state["pending"]
+    subject = f"{get_environ_or_default('MONITOR_SUBJECT', 'Alerty urządzeń')} ({len(events)})"
+    message = build_message(from_email, subject, render_digest(data_dir, events))
+    failed = send_messages(smtp_config, [{"from_email": from_email, "recipients": recipients, "message": message}])[0]
+    if len(failed) < len(recipients):
+        state["pending"] = []
+
+def store_monitor(data, data_dir, monitor_dir, datetime_utc, settings=None):
+    """
+    Aktualizuje monitor urządzeń katalogu data_dir odpowiedzią /user/workers (odbiornik ingest.py).
+    Zwraca ścieżkę pliku stanu monitora.
+    """
+    settings = settings or get_monitor_settings()
+    timestamp = int(datetime_utc.timestamp())
+    state_path = get_state_path(data_dir, monitor_dir)
+    ensure_directory(os.path.dirname(state_path))
+
+    with partition_lock(data_dir, monitor_dir, "state"), span("monitor_update"):
+        monitor = load_monitor(state_path)
+        for worker in data["workers"]:
+            hashrate = hashrate_to_hs(worker["hashrate24h"]["hashrate"], worker["hashrate24h"]["hashrate_unit"])
+            observe_worker(monitor, worker["name"], hashrate, worker["last_share_time"], timestamp, settings)
+        expire_deadlines(monitor, timestamp)
+        send_digest(data_dir, monitor["state"], timestamp, settings)
+        save_monitor(state_path, monitor)
+    return state_path
+
+@instrumented_job("monitor")
+def main():
+    # Pobieranie zmiennych
+    url = get_environ("API_URL_WORKERS")
+    if not url: return
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    monitor_dir = get_environ_or_default("MONITOR_DIR", "monitor")
+
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+
+    # Pominięcie uruchomienia, gdy poprzednie (np. poprzedni tick crona) jeszcze trwa
+    with job_lock(data_dir, "monitor") as acquired:
+        if not acquired: return
+
+        # Wysłanie zapytania (odpowiedź pobrana w tym samym cyklu przez hashrate.py jest brana z cache API)
+        data = make_api_request(url)
+        if data is None:
+            return
+
+        state_path = store_monitor(data, data_dir, monitor_dir, datetime_utc)
+
+    log(f"Stan monitora urządzeń zapisany do pliku: {state_path}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
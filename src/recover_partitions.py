@@ -0,0 +1,142 @@
+from helper import get_environ, get_environ_or_default, log, salvage_json_array, write_json_file
+from timeseries import COLUMN_TYPES
+from catalog import invalidate_catalog
+from locks import job_lock, exclusive_jobs
+from metrics import instrumented_job
+from array import array
+import json
+import os
+import shutil
+
+def is_valid_json_file(file_path):
+    """Sprawdza, czy plik zawiera poprawny dokument JSON."""
+    try:
+        with open(file_path, "r") as file:
+            json.load(file)
+        return True
+    except (OSError, ValueError):
+        return False
+
+def recover_tmp_file(tmp_path):
+    """
+    Obsługuje plik tymczasowy pozostawiony przez przerwany zapis atomowy.
+    Gdy plik docelowy jest poprawny, plik tymczasowy jest usuwany. Gdy plik docelowy nie istnieje
+    lub jest uszkodzony, a plik tymczasowy jest kompletny, plik tymczasowy zastępuje plik docelowy.
+    Plik tymczasowy nazywa się <plik>.tmp lub <plik>.tmp.<losowy sufiks> (helper.write_json_file).
+    """
+    target_path = tmp_path[:tmp_path.rindex(".tmp")]
+    if (not os.path.exists(target_path) or not is_valid_json_file(target_path)) and is_valid_json_file(tmp_path):
+        os.replace(tmp_path, target_path)
+        return f"przywrócono plik z kopii tymczasowej: {target_path}"
+    os.remove(tmp_path)
+    return f"usunięto niedokończony plik tymczasowy: {tmp_path}"
+
+def recover_json_file(file_path):
+    """
+    Odzyskuje kompletne rekordy z uciętej tablicy JSON i zapisuje je atomowo (oryginał trafia do <plik>.corrupt).
+    Uszkodzony plik innego typu (raport, katalog partycji, cache) jest odkładany jako <plik>.corrupt,
+    aby został wygenerowany ponownie.
+    """
+    if is_valid_json_file(file_path):
+        return None
+    with open(file_path, "r", errors="replace") as file:
+        text = file.read()
+    shutil.copyfile(file_path, f"{file_path}.corrupt")
+    if not text.lstrip().startswith("["):
+        os.remove(file_path)
+        return f"odłożono uszkodzony plik: {file_path}.corrupt"
+    records = salvage_json_array(text)
+    write_json_file(file_path, records)
+    return f"odzyskano {len(records)} rekordów: {file_path}"
+
+def recover_jsonl_file(file_path):
+    """Obcina niepełny ostatni rekord pliku JSON Lines (zapis przerwany w połowie linii)."""
+    with open(file_path, "rb") as file:
+        content = file.read()
+    if not content or content.endswith(b"\n"):
+        return None
+    size = content.rfind(b"\n") + 1
+    with open(file_path, "r+b") as file:
+        file.truncate(size)
+    return f"obcięto niepełny rekord ({len(content) - size} B): {file_path}"
+
+def recover_columns(path, name, columns):
+    """Przycina pliki kolumn partycji do pełnych rekordów i do wspólnej liczby próbek."""
+    sizes = {column: os.path.getsize(os.path.join(path, f"{name}.{column}")) for column in columns}
+    length = min(size // array(COLUMN_TYPES[column]).itemsize for column, size in sizes.items())
+    repaired = []
+    for column, size in sizes.items():
+        expected = length * array(COLUMN_TYPES[column]).itemsize
+        if size != expected:
+            with open(os.path.join(path, f"{name}.{column}"), "r+b") as file:
+                file.truncate(expected)
+            repaired.append(column)
+    if not repaired:
+        return None
+    return f"przycięto kolumny {', '.join(repaired)} do {length} próbek: {os.path.join(path, name)}"
+
+def recover_directory(path):
+    """Naprawia pliki w katalogu. Zwraca listę opisów wykonanych napraw."""
+    files = sorted(os.listdir(path))
+    repairs = []
+
+    # Najpierw pliki tymczasowe - mogą zawierać kompletną wersję uszkodzonego pliku docelowego
+    for file in files:
+        if file.endswith(".tmp") or ".tmp." in file:
+            repairs.append(recover_tmp_file(os.path.join(path, file)))
+    files = sorted(os.listdir(path))
+
+    columns = {}
+    for file in files:
+        file_path = os.path.join(path, file)
+        name, extension = os.path.splitext(file)
+        if extension == ".json":
+            repairs.append(recover_json_file(file_path))
+        elif extension == ".jsonl":
+            repairs.append(recover_jsonl_file(file_path))
+        elif extension[1:] in COLUMN_TYPES:
+            columns.setdefault(name, []).append(extension[1:])
+
+    for name, column_names in columns.items():
+        repairs.append(recover_columns(path, name, column_names))
+    return [repair for repair in repairs if repair]
+
+@instrumented_job("recover_partitions")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ_or_default("REVENUE_DIR", "revenue60m")
+
+    if not os.path.isdir(data_dir):
+        log(f"Katalog {data_dir} nie istnieje")
+        return
+
+    # Przegląd wszystkich katalogów z danymi (również katalogów portfeli) z blokadami zadań zapisujących dane:
+    # naprawa czeka na zakończenie trwających zapisów, a zadania uruchomione w jej trakcie są pomijane,
+    # więc nie zostanie usunięty plik tymczasowy zapisu w toku ani obcięta dopisywana właśnie linia
+    skipped_dirs = {get_environ_or_default("METRICS_DIR", "metrics"), get_environ_or_default("PROFILE_DIR", "profiles")}
+    total = 0
+    with job_lock(data_dir, "recover_partitions") as acquired:
+        if not acquired: return
+        with exclusive_jobs(data_dir):
+            for path, directories, files in os.walk(data_dir):
+                # Metryki i profile zapisuje każde zadanie po zakończeniu (również poza blokadą zadania),
+                # a pliki te są generowane ponownie - nie wymagają naprawy
+                if path == data_dir:
+                    directories[:] = [directory for directory in directories if directory not in skipped_dirs]
+                directories.sort()
+                repairs = recover_directory(path)
+                for repair in repairs:
+                    log(f"Naprawa: {repair}")
+                total += len(repairs)
+
+                # Zawartość partycji revenue60m uległa zmianie - katalog partycji zostanie zbudowany ponownie
+                if repairs and os.path.basename(path) == revenue_dir:
+                    invalidate_catalog(os.path.dirname(path), revenue_dir)
+
+    log(f"Przegląd zakończony, liczba napraw: {total}")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,122 @@
-from helper import get_json_files, parse_date_from_filename, compute_statistics, load_data, write_json_file, get_environ
-from datetime import datetime, timezone
+from helper import iter_revenue_values, write_json_file, get_environ, get_storage_format, log
+from catalog import get_catalog, catalog_genesis, catalog_latest
+from locks import job_lock, partition_lock
+from compaction import load_daily_tier
+from sqlite_store import query_stats, query_date_range, get_day_range
+from stats import compute_stats, stats_percentile
+from metrics import instrumented_job, span
 import os
 
-def main():
-    # Pobieranie zmiennych
-    data_dir = get_environ("DATA_DIR")
-    if not data_dir: return
-    report_dir = get_environ("REPORT_DIR")
-    if not report_dir: return
-    revenue_dir = get_environ("REVENUE_DIR")
-    if not revenue_dir: return
-
-    # Ścieżki
-    report_path = os.path.join(data_dir, report_dir)
+def load_file_stats(data_dir, revenue_dir, report_date):
+    """
+    Zwraca (dzień genesis, stan statystyk genesis, dzień current, stan statystyk current) z partycji dziennych
+    lub None, gdy danych nie można wczytać.
+    """
     revenue_path = os.path.join(data_dir, revenue_dir)
 
-    # Aktualna data i czas UTC
-    datetime_utc = datetime.now(timezone.utc)
-    datetime_utc_string = datetime_utc.strftime("%Y-%m-%d %H:%M:%S")
-    
     # Sprawdzenie, czy katalog z danymi istnieje
     if not os.path.isdir(revenue_path):
-        print(f"{datetime_utc_string}(UTC) - Katalog {revenue_path} nie istnieje")
+        log(f"Katalog {revenue_path} nie istnieje")
         return
 
-    # Pobranie listy plików JSON
-    json_files = get_json_files(revenue_path)
-    if not json_files:
-        print(f"{datetime_utc_string}(UTC) - Brak plików JSON w katalogu {revenue_path}")
+    # Katalog partycji (bez listowania katalogu z danymi)
+    catalog = get_catalog(data_dir, revenue_dir)
+    if not catalog["dates"]:
+        log(f"Brak plików z danymi w katalogu {revenue_path}")
         return
 
-    # Parsowanie dat z nazw plików i filtrowanie poprawnych
-    dated_files = []
-    for file in json_files:
-        file_date = parse_date_from_filename(file)
-        if file_date:
-            dated_files.append((file_date, file))
-        else:
-            print(f"{datetime_utc_string}(UTC) - Pomijanie pliku z niepoprawnym formatem daty: {file}")
-
-    if not dated_files:
-        print(f"{datetime_utc_string}(UTC) - Nie znaleziono żadnych plików z poprawnym formatem daty")
+    # Plik genesis (najwcześniejszy) i current (najpóźniejszy lub z dnia report_date)
+    genesis_date_str, genesis_file = catalog_genesis(catalog)
+    if report_date is None:
+        current_date_str, current_file = catalog_latest(catalog)
+    elif report_date in catalog["partitions"]:
+        current_date_str, current_file = report_date, catalog["partitions"][report_date]["file"]
+    else:
+        log(f"Brak partycji z dnia {report_date} w katalogu {revenue_path}")
         return
 
-    # Sortowanie plików według daty
-    dated_files.sort(key=lambda x: x[0])
-
-    # Plik genesis (najwcześniejszy) i current (najpóźniejszy)
-    genesis_date, genesis_file = dated_files[0]
-    current_date, current_file = dated_files[-1]
-
-    genesis_date_str = genesis_date.strftime("%Y-%m-%d")
-    current_date_str = current_date.strftime("%Y-%m-%d")
+    # Dzień genesis, którego surowa partycja została usunięta przez retencję (compaction.py),
+    # jest odczytywany z kubełka dziennego
+    daily_tier = load_daily_tier(data_dir, revenue_dir)
+    tier_genesis_date_str = min(daily_tier) if daily_tier else None
+    use_tier_genesis = tier_genesis_date_str is not None and tier_genesis_date_str < genesis_date_str
 
     # Wczytywanie danych z plików
-    genesis_data = load_data(os.path.join(revenue_path, genesis_file))
-    current_data = load_data(os.path.join(revenue_path, current_file))
+    if use_tier_genesis:
+        genesis_date_str = tier_genesis_date_str
+        genesis_data = ()
+    else:
+        genesis_data = iter_revenue_values(os.path.join(revenue_path, genesis_file))
+    current_data = iter_revenue_values(os.path.join(revenue_path, current_file))
 
     if genesis_data is None or current_data is None:
-        print(f"{datetime_utc_string}(UTC) - Nie można wczytać danych z plików. Przerywam działanie skryptu")
+        log("Nie można wczytać danych z plików. Przerywam działanie skryptu")
         return
     
-    # Obliczanie statystyk
-    genesis_min, genesis_max, genesis_avg = compute_statistics(genesis_data)
-    current_min, current_max, current_avg = compute_statistics(current_data)
+    # Obliczanie statystyk (jeden przebieg po danych każdego pliku).
+    # Partycja bieżąca jest czytana z blokadą współdzieloną - kolektor nie dopisuje do niej w trakcie odczytu
+    with span("statistics"):
+        genesis_stats = daily_tier[genesis_date_str]["stats"] if use_tier_genesis else compute_stats(genesis_data)
+        with partition_lock(data_dir, revenue_dir, current_date_str, shared=True):
+            current_stats = compute_stats(current_data)
+    return genesis_date_str, genesis_stats, current_date_str, current_stats
+
+def load_sqlite_stats(data_dir, revenue_dir, report_date):
+    """
+    Zwraca (dzień genesis, stan statystyk genesis, dzień current, stan statystyk current) z bazy formatu sqlite
+    (statystyki dni liczone przez SQLite) lub None, gdy brak próbek.
+    """
+    end_ts = get_day_range(report_date)[1] if report_date is not None else None
+    date_range = query_date_range(data_dir, revenue_dir, end_ts)
+    if date_range is None:
+        log(f"Brak próbek {revenue_dir} w bazie")
+        return
+    genesis_date_str, current_date_str = date_range
+    if report_date is not None and current_date_str != report_date:
+        log(f"Brak próbek {revenue_dir} z dnia {report_date} w bazie")
+        return
 
-    if None in [genesis_min, genesis_max, genesis_avg, current_min, current_max, current_avg]:
-        print(f"{datetime_utc_string}(UTC) - Błąd w obliczaniu statystyk. Upewnij się, że dane są poprawne")
+    with span("statistics"):
+        genesis_stats = query_stats(data_dir, revenue_dir, *get_day_range(genesis_date_str))
+        current_stats = query_stats(data_dir, revenue_dir, *get_day_range(current_date_str))
+    return genesis_date_str, genesis_stats, current_date_str, current_stats
+
+def generate_report(data_dir, report_dir, revenue_dir, report_date=None):
+    """
+    Generuje raport genesis vs current dla katalogu z danymi data_dir. Zwraca ścieżkę raportu lub None.
+    Dniem current jest najpóźniejsza partycja lub dzień report_date ("YYYY-MM-DD").
+    """
+    # Ścieżki
+    report_path = os.path.join(data_dir, report_dir)
+
+    # Statystyki dni genesis i current (partycje dzienne lub baza formatu sqlite)
+    load_stats = load_sqlite_stats if get_storage_format() == "sqlite" else load_file_stats
+    result = load_stats(data_dir, revenue_dir, report_date)
+    if result is None:
+        return
+    genesis_date_str, genesis_stats, current_date_str, current_stats = result
+
+    if not genesis_stats["count"] or not current_stats["count"]:
+        log("Błąd w obliczaniu statystyk. Upewnij się, że dane są poprawne")
         return
 
     # Przygotowanie danych do raportu
     report_data = {
         "genesis": {
             "date": genesis_date_str,
-            "min_revenue60m": genesis_min,
-            "max_revenue60m": genesis_max,
-            "avg_revenue60m": genesis_avg
+            "min_revenue60m": genesis_stats["min"],
+            "max_revenue60m": genesis_stats["max"],
+            "avg_revenue60m": genesis_stats["mean"],
+            "p50_revenue60m": stats_percentile(genesis_stats, 50),
+            "p95_revenue60m": stats_percentile(genesis_stats, 95)
         },
         "current": {
             "date": current_date_str,
-            "min_revenue60m": current_min,
-            "max_revenue60m": current_max,
-            "avg_revenue60m": current_avg
+            "min_revenue60m": current_stats["min"],
+            "max_revenue60m": current_stats["max"],
+            "avg_revenue60m": current_stats["mean"],
+            "p50_revenue60m": stats_percentile(current_stats, 50),
+            "p95_revenue60m": stats_percentile(current_stats, 95)
         }
     }
 
@@ -95,7 +130,22 @@ def main():
     # Zapisywanie raportu
     write_json_file(file_path, report_data)
 
-    print(f"{datetime_utc_string}(UTC) - Dane zapisane do pliku: {file_path}")
+    log(f"Dane zapisane do pliku: {file_path}")
+    return file_path
+
+@instrumented_job("report")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    report_dir = get_environ("REPORT_DIR")
+    if not report_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+
+    with job_lock(data_dir, "report") as acquired:
+        if not acquired: return
+        generate_report(data_dir, report_dir, revenue_dir)
 
 if __name__ == "__main__":
     main()
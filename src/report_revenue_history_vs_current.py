@@ -1,115 +1,199 @@
-from helper import get_json_files, parse_date_from_filename, compute_statistics, load_data, write_json_file, get_environ
-from datetime import datetime, timezone
+from helper import (
+    iter_revenue_values, write_json_file, get_environ, log,
+    get_environ_or_default, load_rollup_cache, get_partition_rollup, save_rollup_cache, get_file_signature,
+    get_partition_date, get_storage_format
+)
+from catalog import get_catalog, catalog_range
+from compaction import load_daily_tier
+from locks import job_lock, partition_lock
+from sqlite_store import query_stats, query_daily_stats, query_date_range, get_day_range
+from stats import compute_stats, merge_stats, stats_percentile
+from analytics import compute_analytics, get_analytics_settings
+from metrics import instrumented_job, span
+from contextlib import nullcontext
 import os
 
-def main():
-    # Pobieranie zmiennych
-    data_dir = get_environ("DATA_DIR")
-    if not data_dir: return
-    report_dir = get_environ("REPORT_DIR")
-    if not report_dir: return
-    revenue_dir = get_environ("REVENUE_DIR")
-    if not revenue_dir: return
+def load_daily_states(data_dir, revenue_dir, rollup_dir, dated_files, before=None):
+    """
+    Zwraca stany statystyk dni z partycji dated_files i kubełków dziennych sprzed dnia before
+    ({data: stan}, posortowane według daty).
+    Używany jest kubełek dzienny (compaction.py), gdy surowej partycji już nie ma (retencja) lub nie zmieniła się
+    od agregacji, a w pozostałych przypadkach podsumowanie partycji z cache (wczytywane są tylko pliki nowe lub zmienione).
+    """
+    revenue_path = os.path.join(data_dir, revenue_dir)
+    rollup_cache_path = os.path.join(data_dir, rollup_dir, f"{revenue_dir}.json")
+
+    # Kubełki dzienne (najgrubszy poziom danych wystarczający do raportu)
+    daily_tier = {date: bucket for date, bucket in load_daily_tier(data_dir, revenue_dir).items() if before is None or date < before}
+    for date, file in dated_files:
+        bucket = daily_tier.get(date)
+        if bucket and (bucket["file"] != file or bucket["signature"] != get_file_signature(os.path.join(revenue_path, file))):
+            del daily_tier[date]
+    states = {date: bucket["stats"] for date, bucket in daily_tier.items()}
+
+    # Podsumowania (rollup) pozostałych plików (jeszcze niezagregowanych)
+    other_files = [(date, file) for date, file in dated_files if date not in daily_tier]
+    rollup_cache = load_rollup_cache(rollup_cache_path)
+    for date, file in other_files:
+        rollup = get_partition_rollup(revenue_path, file, rollup_cache)
+        if rollup is not None:
+            states[date] = rollup
+        else:
+            log(f"Nie można wczytać danych z pliku: {file}")
+    # Wpisy dni od before (np. przy raporcie dla dnia z przeszłości) pozostają w cache
+    kept_files = [file for date, file in other_files]
+    if before is not None:
+        kept_files += [file for file in rollup_cache if (get_partition_date(file) or "") >= before]
+    save_rollup_cache(rollup_cache_path, rollup_cache, kept_files)
+    return dict(sorted(states.items()))
+
+def build_report_data(history_stats, history_dates, current_date_str, current_stats, analytics):
+    """Przygotowuje dane raportu historia (dni history_dates) vs dzień current_date_str."""
+    return {
+        "history": {
+            "start_date": history_dates[0],
+            "end_date": history_dates[-1],
+            "min_revenue60m": history_stats["min"],
+            "max_revenue60m": history_stats["max"],
+            "avg_revenue60m": history_stats["mean"],
+            "p50_revenue60m": stats_percentile(history_stats, 50),
+            "p95_revenue60m": stats_percentile(history_stats, 95)
+        },
+        "current": {
+            "date": current_date_str,
+            "min_revenue60m": current_stats["min"],
+            "max_revenue60m": current_stats["max"],
+            "avg_revenue60m": current_stats["mean"],
+            "p50_revenue60m": stats_percentile(current_stats, 50),
+            "p95_revenue60m": stats_percentile(current_stats, 95)
+        },
+        "analytics": analytics
+    }
 
-    # Ścieżki
-    report_path = os.path.join(data_dir, report_dir)
+def write_report(report_path, current_date_str, report_data):
+    """Zapisuje raport do pliku <data>.json w katalogu report_path. Zwraca ścieżkę pliku."""
+    file_path = os.path.join(report_path, f"{current_date_str}.json")
+
+    # Tworzenie katalogu na raport, jeśli nie istnieje
+    os.makedirs(report_path, exist_ok=True)
+
+    # Zapisywanie raportu
+    write_json_file(file_path, report_data)
+
+    log(f"Dane zapisane do pliku: {file_path}")
+    return file_path
+
+def load_file_states(data_dir, revenue_dir, rollup_dir, report_date):
+    """
+    Zwraca (stany statystyk dni historii, dzień current, iterator wartości dnia current) z partycji dziennych
+    lub None, gdy danych nie można wczytać.
+    """
     revenue_path = os.path.join(data_dir, revenue_dir)
 
-    # Aktualna data i czas UTC
-    datetime_utc = datetime.now(timezone.utc)
-    datetime_utc_string = datetime_utc.strftime("%Y-%m-%d %H:%M:%S")
-    
     # Sprawdzenie, czy katalog z danymi istnieje
     if not os.path.isdir(revenue_path):
-        print(f"{datetime_utc_string}(UTC) - Katalog {revenue_path} nie istnieje")
+        log(f"Katalog {revenue_path} nie istnieje")
         return
 
-    # Pobranie listy plików JSON
-    json_files = get_json_files(revenue_path)
-    if not json_files:
-        print(f"{datetime_utc_string}(UTC) - Brak plików JSON w katalogu {revenue_path}")
-        return
-
-    # Parsowanie dat z nazw plików i filtrowanie poprawnych
-    dated_files = []
-    for file in json_files:
-        file_date = parse_date_from_filename(file)
-        if file_date:
-            dated_files.append((file_date, file))
-        else:
-            print(f"{datetime_utc_string}(UTC) - Pomijanie pliku z niepoprawnym formatem daty: {file}")
-
+    # Partycje z katalogu partycji (bez listowania katalogu z danymi), posortowane według daty
+    dated_files = catalog_range(get_catalog(data_dir, revenue_dir), end=report_date)
     if not dated_files:
-        print(f"{datetime_utc_string}(UTC) - Nie znaleziono żadnych plików z poprawnym formatem daty")
+        log(f"Brak plików z danymi w katalogu {revenue_path}")
         return
 
-    # Sortowanie plików według daty
-    dated_files.sort(key=lambda x: x[0])
-
-    # Plik current (najpóźniejszy)
-    current_date, current_file = dated_files[-1]
-    current_date_str = current_date.strftime("%Y-%m-%d")
-
-    # Pobranie wszystkich plików z wyjątkiem current
-    other_files = [file for date, file in dated_files[:-1]]
-
-    # Wczytywanie danych z pozostałych plików
-    combined_data = []
-    for file in other_files:
-        data = load_data(os.path.join(revenue_path, file))
-        if data is not None:
-            combined_data.extend(data)
-        else:
-            print(f"{datetime_utc_string}(UTC) - Nie można wczytać danych z pliku: {file}")
-
-    if not combined_data:
-        print(f"{datetime_utc_string}(UTC) - Brak danych w plikach historycznych")
+    # Plik current (najpóźniejszy lub z dnia report_date)
+    current_date_str, current_file = dated_files[-1]
+    if report_date is not None and current_date_str != report_date:
+        log(f"Brak partycji z dnia {report_date} w katalogu {revenue_path}")
         return
 
-    # Obliczanie statystyk dla danych historycznych
-    other_min, other_max, other_avg = compute_statistics(combined_data)
+    # Stany statystyk dni historii (podsumowania dni)
+    daily_states = load_daily_states(data_dir, revenue_dir, rollup_dir, dated_files[:-1], before=current_date_str)
 
     # Wczytywanie danych z pliku current
-    current_data = load_data(os.path.join(revenue_path, current_file))
+    current_data = iter_revenue_values(os.path.join(revenue_path, current_file))
     if current_data is None:
-        print(f"{datetime_utc_string}(UTC) - Nie można wczytać danych z pliku bieżącego")
+        log("Nie można wczytać danych z pliku bieżącego")
+        return
+    return daily_states, current_date_str, current_data
+
+def load_sqlite_states(data_dir, revenue_dir, report_date):
+    """
+    Zwraca (stany statystyk dni historii, dzień current, None) z bazy formatu sqlite - stany dni liczone są
+    przez SQLite (GROUP BY dzień) - lub None, gdy brak próbek.
+    """
+    end_ts = get_day_range(report_date)[1] if report_date is not None else None
+    date_range = query_date_range(data_dir, revenue_dir, end_ts)
+    if date_range is None:
+        log(f"Brak próbek {revenue_dir} w bazie")
+        return
+    current_date_str = date_range[1]
+    if report_date is not None and current_date_str != report_date:
+        log(f"Brak próbek {revenue_dir} z dnia {report_date} w bazie")
         return
+    return query_daily_stats(data_dir, revenue_dir, end_ts=get_day_range(current_date_str)[0]), current_date_str, None
+
+def generate_report(data_dir, report_dir, revenue_dir, rollup_dir, hashrate_dir=None, report_date=None):
+    """
+    Generuje raport historia vs current dla katalogu z danymi data_dir. Zwraca ścieżkę raportu lub None.
+    Dniem current jest najpóźniejsza partycja lub dzień report_date ("YYYY-MM-DD"), historią - wszystkie wcześniejsze dni.
+    Sekcja "analytics" raportu (analytics.py) obejmuje hashrate urządzeń, gdy podano hashrate_dir.
+    """
+    # Ścieżki
+    report_path = os.path.join(data_dir, report_dir)
 
-    # Obliczanie statystyk dla danych bieżących
-    current_min, current_max, current_avg = compute_statistics(current_data)
+    # Stany dni historii i dane dnia current (partycje dzienne lub baza formatu sqlite)
+    use_sqlite = get_storage_format() == "sqlite"
+    if use_sqlite:
+        result = load_sqlite_states(data_dir, revenue_dir, report_date)
+    else:
+        result = load_file_states(data_dir, revenue_dir, rollup_dir, report_date)
+    if result is None:
+        return
+    daily_states, current_date_str, current_data = result
 
-    if None in [other_min, other_max, other_avg, current_min, current_max, current_avg]:
-        print(f"{datetime_utc_string}(UTC) - Błąd w obliczaniu statystyk. Upewnij się, że dane są poprawne")
+    # Obliczanie statystyk dla danych historycznych przez połączenie podsumowań dni
+    with span("statistics"):
+        history_stats = merge_stats(*daily_states.values())
+    if not history_stats["count"]:
+        log("Brak danych w plikach historycznych")
         return
 
-    # Przygotowanie danych do raportu
-    report_data = {
-        "history": {
-            "start_date": dated_files[0][0].strftime("%Y-%m-%d"),
-            "end_date": dated_files[-2][0].strftime("%Y-%m-%d"),
-            "min_revenue60m": other_min,
-            "max_revenue60m": other_max,
-            "avg_revenue60m": other_avg
-        },
-        "current": {
-            "date": current_date_str,
-            "min_revenue60m": current_min,
-            "max_revenue60m": current_max,
-            "avg_revenue60m": current_avg
-        }
-    }
+    # Obliczanie statystyk dla danych bieżących (jeden przebieg, z blokadą współdzieloną partycji bieżącej)
+    # oraz wskaźniki analityczne (średnia krocząca, zmienność, zmiany, wydajność, anomalie hashrate)
+    with nullcontext() if use_sqlite else partition_lock(data_dir, revenue_dir, current_date_str, shared=True):
+        with span("statistics"):
+            if use_sqlite:
+                current_stats = query_stats(data_dir, revenue_dir, *get_day_range(current_date_str))
+            else:
+                current_stats = compute_stats(current_data)
+        with span("analytics"):
+            analytics = compute_analytics(data_dir, revenue_dir, hashrate_dir, current_date_str, get_analytics_settings())
+
+    if not current_stats["count"]:
+        log("Błąd w obliczaniu statystyk. Upewnij się, że dane są poprawne")
+        return
 
-    # Ścieżka do pliku raportu
-    file_name = f"{current_date_str}.json"
-    file_path = os.path.join(report_path, file_name)
+    # Przygotowanie i zapisywanie raportu
+    report_data = build_report_data(history_stats, list(daily_states), current_date_str, current_stats, analytics)
+    return write_report(report_path, current_date_str, report_data)
 
-    # Tworzenie katalogu na raport, jeśli nie istnieje
-    os.makedirs(report_path, exist_ok=True)
+@instrumented_job("report_revenue_history_vs_current")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    report_dir = get_environ("REPORT_DIR")
+    if not report_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
 
-    # Zapisywanie raportu
-    write_json_file(file_path, report_data)
+    rollup_dir = get_environ_or_default("ROLLUP_DIR", "rollup")
+    hashrate_dir = get_environ_or_default("HASHRATE_DIR", None)
 
-    print(f"{datetime_utc_string}(UTC) - Dane zapisane do pliku: {file_path}")
+    with job_lock(data_dir, "report_revenue_history_vs_current") as acquired:
+        if not acquired: return
+        generate_report(data_dir, report_dir, revenue_dir, rollup_dir, hashrate_dir)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,107 @@
+from helper import get_environ, get_environ_or_default, get_compiled_template, get_datetime_utc, log
+from tenants import get_wallet_registry
+from mailer import get_smtp_config, build_message, send_messages
+from send_report import render_report
+from locks import job_lock
+from metrics import instrumented_job
+from concurrent.futures import ProcessPoolExecutor
+import report
+import report_revenue_history_vs_current
+import os
+
+# Ustawienia raportów, skompilowany szablon i dzień raportu wspólne dla wszystkich portfeli,
+# przekazywane do procesów puli raz (inicjalizacja procesu), a nie z każdym zadaniem.
+# Każdy proces ma własne cache modułów (podsumowania partycji, katalogi partycji, szablon),
+# więc generowanie raportów nie wymaga blokad między portfelami
+shared_context = None
+
+def init_worker(context):
+    """Inicjalizuje proces puli."""
+    global shared_context
+    shared_context = context
+
+def build_tenant_report(tenant):
+    """
+    Generuje raporty dzienne portfela i zwraca gotową wiadomość e-mail
+    ({"from_email", "recipients", "message"}) lub None, gdy raportu nie można wysłać (wykonywane w procesie puli).
+    """
+    settings, compiled_template, date_utc_string = shared_context
+    data_dir = tenant["data_dir"]
+
+    report.generate_report(data_dir, settings["report_dir"], settings["revenue_dir"])
+    if not report_revenue_history_vs_current.generate_report(data_dir, settings["report_dir"], settings["revenue_dir"], settings["rollup_dir"], settings["hashrate_dir"]):
+        log(f"Brak raportu dla portfela {tenant['wallet']}")
+        return None
+
+    if not tenant["recipients"]:
+        log(f"Brak odbiorców raportu dla portfela {tenant['wallet']}")
+        return None
+
+    html_content = render_report(compiled_template, data_dir, settings["report_dir"], tenant["subject"], tenant["organization"], date_utc_string)
+    if html_content is None:
+        return None
+
+    return {
+        "from_email": settings["from_email"],
+        "recipients": tenant["recipients"],
+        "message": build_message(settings["from_email"], tenant["subject"], html_content)
+    }
+
+@instrumented_job("report_tenants")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    report_dir = get_environ("REPORT_DIR")
+    if not report_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+    template_dir = get_environ("TEMPLATE_DIR")
+    if not template_dir: return
+    template_file_name = get_environ("TEMPLATE_FILE_NAME")
+    if not template_file_name: return
+    from_email = get_environ("FROM_EMAIL")
+    if not from_email: return
+    smtp_config = get_smtp_config()
+    if not smtp_config: return
+    max_workers = int(get_environ_or_default("REPORT_CONCURRENCY", os.cpu_count() or 1))
+
+    settings = {
+        "report_dir": report_dir,
+        "revenue_dir": revenue_dir,
+        "rollup_dir": get_environ_or_default("ROLLUP_DIR", "rollup"),
+        "hashrate_dir": get_environ_or_default("HASHRATE_DIR", None),
+        "from_email": from_email
+    }
+
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
+
+    # Portfele (najemcy) z rejestru
+    tenants = get_wallet_registry(data_dir)
+    if not tenants:
+        log("Rejestr portfeli jest pusty (zmienne WALLETS_FILE lub WALLETS)")
+        return
+
+    # Szablon kompilowany raz i współdzielony przez wszystkie portfele
+    compiled_template = get_compiled_template(template_dir, template_file_name)
+    if not compiled_template: return
+
+    # Uruchomienie jest pomijane, gdy poprzednie jeszcze trwa (raporty nie zostaną wysłane dwukrotnie)
+    with job_lock(data_dir, "report_tenants") as acquired:
+        if not acquired: return
+
+        # Generowanie raportów portfeli (obliczenia w Pythonie) w puli procesów - każdy portfel ma osobny katalog danych
+        context = (settings, compiled_template, date_utc_string)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(context,)) as executor:
+            results = list(executor.map(build_tenant_report, tenants))
+        messages = [message for message in results if message is not None]
+
+        # Wysyłanie wszystkich wiadomości przez wspólną pulę połączeń SMTP
+        if messages:
+            send_messages(smtp_config, messages)
+        log(f"Wysłano raporty {len(messages)} z {len(tenants)} portfeli")
+
+# Wykonanie funkcji
+if __name__ == "__main__":
+    main()
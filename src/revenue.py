@@ -1,55 +1,80 @@
-from helper import make_api_request, read_json_file, write_json_file, get_environ
+from helper import make_api_request, append_record, get_environ, get_storage_format, log
+from timeseries import append_columns
+from catalog import record_sample
+from sqlite_store import add_samples
+from locks import job_lock, partition_lock
+from metrics import instrumented_job
 from datetime import datetime, timezone
 import os
 
-def main():
-    # Pobieranie zmiennych
-    url = get_environ("API_URL_BASE")
-    if not url: return
-    data_dir = get_environ("DATA_DIR")
-    if not data_dir: return
-    revenue_dir = get_environ("REVENUE_DIR")
-    if not revenue_dir: return
-    
-    # Aktualna data i czas UTC
-    datetime_utc = datetime.now(timezone.utc)
+def store_revenue(data, data_dir, revenue_dir, datetime_utc):
+    """Zapisuje revenue60m z odpowiedzi /user/base do dziennej partycji. Zwraca ścieżkę pliku lub None."""
     date_utc_string = datetime_utc.strftime("%Y-%m-%d")
-    datetime_utc_string = datetime_utc.strftime("%Y-%m-%d %H:%M:%S")
 
-    # Ścieżka pliku
-    file_name = f"{date_utc_string}.json"
+    # Ścieżka katalogu
     path = os.path.join(data_dir, revenue_dir)
-    file_path = os.path.join(path, file_name)
 
-    # Wysłanie zapytania
-    data = make_api_request(url)
-    if data is None:
-        return
-    
     # Nagroda za 1h
     try:
         revenue60m = data["revenue"]["revenue60m"]
     except KeyError:
-        print(f"{datetime_utc_string}(UTC) - Nie można znaleźć revenue60m w danych API.")
+        log("Nie można znaleźć revenue60m w danych API.")
         return
 
-    # Odczytywanie istniejących danych
-    existing_data = read_json_file(file_path)
-
-    # Dodawanie nowych danych
+    # Nowe dane (czas próbki w sekundach epoki)
+    timestamp = int(datetime_utc.timestamp())
     new_data = {
         "revenue60m": revenue60m,
-        "datetime_utc": datetime_utc_string
+        "timestamp": timestamp
     }
-    existing_data.append(new_data)
+
+    # Format sqlite: próbka w bazie (w cyklu kolektora wstawiana razem z pozostałymi, sqlite_store.insert_batch)
+    storage_format = get_storage_format()
+    if storage_format == "sqlite":
+        return add_samples(data_dir, revenue_dir, [(timestamp, revenue60m)])
 
     # Tworzenie katalogu, jeśli nie istnieje
     os.makedirs(path, exist_ok=True)
 
-    # Zapisywanie zaktualizowanych danych do pliku
-    write_json_file(file_path, existing_data)
+    # Zapisywanie danych do pliku (dopisanie w formatach jsonl i columnar, nadpisanie w formacie json)
+    # i aktualizacja katalogu partycji (liczba próbek, rozmiar, podsumowanie) z blokadą partycji
+    with partition_lock(data_dir, revenue_dir, date_utc_string):
+        if storage_format == "columnar":
+            file_path = append_columns(path, date_utc_string, {"ts": timestamp, "val": revenue60m})
+        else:
+            file_path = append_record(path, date_utc_string, new_data, storage_format)
+
+        record_sample(data_dir, revenue_dir, file_path, revenue60m)
+    return file_path
+
+@instrumented_job("revenue")
+def main():
+    # Pobieranie zmiennych
+    url = get_environ("API_URL_BASE")
+    if not url: return
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    revenue_dir = get_environ("REVENUE_DIR")
+    if not revenue_dir: return
+    
+    # Aktualna data i czas UTC
+    datetime_utc = datetime.now(timezone.utc)
+
+    # Pominięcie uruchomienia, gdy poprzednie (np. poprzedni tick crona) jeszcze trwa
+    with job_lock(data_dir, "revenue") as acquired:
+        if not acquired: return
+
+        # Wysłanie zapytania
+        data = make_api_request(url)
+        if data is None:
+            return
+
+        # Zapisywanie danych
+        file_path = store_revenue(data, data_dir, revenue_dir, datetime_utc)
+        if file_path is None:
+            return
 
-    print(f"{datetime_utc_string}(UTC) - Dane zapisane do pliku: {file_path}")
+    log(f"Dane zapisane do pliku: {file_path}")
 
 # Wykonanie funkcji
 if __name__ == "__main__":
@@ -1,57 +1,44 @@
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from datetime import datetime, timezone
-from helper import get_environ, replace_placeholders, get_html_template, get_revenue60m_data, set_bg_color, set_html_entity, get_datetime_utc
+from helper import get_environ, get_compiled_template, render_template, get_revenue60m_data, set_bg_color, set_html_entity, get_datetime_utc
+from mailer import get_smtp_config, build_message, send_messages
+from locks import job_lock
+from metrics import instrumented_job
+import html
 
-def main():
-    # Pobieranie zmiennych
-    data_dir = get_environ("DATA_DIR")
-    if not data_dir: return
-    report_dir = get_environ("REPORT_DIR")
-    if not report_dir: return
-    template_dir = get_environ("TEMPLATE_DIR")
-    if not template_dir: return
-    template_file_name = get_environ("TEMPLATE_FILE_NAME")
-    if not template_file_name: return
-    smtp_server = get_environ("SMTP_SERVER")
-    if not smtp_server: return
-    smtp_port = get_environ("SMTP_PORT")
-    if not smtp_port: return
-    smtp_username = get_environ("SMTP_USERNAME")
-    if not smtp_username: return
-    smtp_password = get_environ("SMTP_PASSWORD")
-    if not smtp_password: return
-    msg_subject = get_environ("MSG_SUBJECT")
-    if not msg_subject: msg_subject = "This is subject"
-    msg_organization = get_environ("MSG_ORGANIZATION")
-    if not msg_organization: msg_organization = "This is organization"
-    from_email = get_environ("FROM_EMAIL")
-    if not from_email: return
-    to_emails = get_environ("TO_EMAILS")
-    if not to_emails: return
+def format_value(value, digits):
+    """Formatuje wartość wskaźnika do szablonu ("-", gdy wskaźnika nie można obliczyć)."""
+    return "-" if value is None else str(round(value, digits))
 
-    # Parsowanie listy adresów email
-    to_emails = [email.strip() for email in to_emails.split(",")]
-
-    # Aktualna data i czas UTC
-    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
-
-    # Tworzenie wiadomości
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = msg_subject
-    msg["From"] = from_email
-
-    # Odczytywanie szablonu HTML z pliku
-    html_template = get_html_template(template_dir, template_file_name)
-    if not html_template: return
+def get_analytics_placeholders(analytics):
+    """Przygotowuje symbole zastępcze sekcji analityki (analytics.py) z raportu historycznego."""
+    analytics = analytics or {}
+    dod_percent = analytics.get("dod_percent")
+    wow_percent = analytics.get("wow_percent")
+    anomalies = analytics.get("anomalies") or []
+    return {
+        "ROLLING-MEAN": format_value(analytics.get("rolling_mean_revenue60m"), 8),
+        "VOLATILITY": format_value(analytics.get("volatility_revenue60m"), 8),
+        "DOD-PERCENT": format_value(dod_percent, 2),
+        "DOD-BG-COLOR": set_bg_color(dod_percent or 0),
+        "WOW-PERCENT": format_value(wow_percent, 2),
+        "WOW-BG-COLOR": set_bg_color(wow_percent or 0),
+        "EFFICIENCY": format_value(analytics.get("efficiency_revenue60m_per_ths"), 8),
+        "HASHRATE": format_value(analytics.get("hashrate_ths"), 2),
+        "ANOMALIES": ", ".join(
+            html.escape(f"{anomaly['worker']} (-{anomaly['drop_percent']}%)") for anomaly in anomalies
+        ) or "brak"
+    }
 
-    # Odczytywanie szablonu HTML z pliku
+def render_report(compiled_template, data_dir, report_dir, msg_subject, msg_organization, date_utc_string):
+    """Wypełnia skompilowany szablon danymi z raportu dziennego katalogu data_dir. Zwraca HTML lub None."""
+    # Dane z raportu dziennego
+    revenue60m_data = get_revenue60m_data(data_dir, report_dir, date_utc_string)
+    if revenue60m_data is None: return
     (
         min_revenue_history, max_revenue_history, avg_revenue_history, 
         min_revenue_current, max_revenue_current, avg_revenue_current, 
-        min_revenue_percent, max_revenue_percent, avg_revenue_percent
-    ) = get_revenue60m_data(data_dir, report_dir)
+        min_revenue_percent, max_revenue_percent, avg_revenue_percent,
+        analytics
+    ) = revenue60m_data
 
     # Przygotowanie danych do zastąpienia
     placeholders = {
@@ -75,39 +62,59 @@ def main():
         "AVG-REVENUE-CURRENT": str(round(avg_revenue_current, 8)),
         "AVG-REVENUE-PERCENT": str(avg_revenue_percent),
         "AVG-BG-COLOR": set_bg_color(avg_revenue_percent),
-        "AVG-HTML-ENTITY": set_html_entity(avg_revenue_percent)
+        "AVG-HTML-ENTITY": set_html_entity(avg_revenue_percent),
+        # Analityka
+        **get_analytics_placeholders(analytics)
     }
 
     # Treść wiadomości w HTML
-    html_content = replace_placeholders(html_template, placeholders)
+    return render_template(compiled_template, placeholders)
+
+@instrumented_job("send_report")
+def main():
+    # Pobieranie zmiennych
+    data_dir = get_environ("DATA_DIR")
+    if not data_dir: return
+    report_dir = get_environ("REPORT_DIR")
+    if not report_dir: return
+    template_dir = get_environ("TEMPLATE_DIR")
+    if not template_dir: return
+    template_file_name = get_environ("TEMPLATE_FILE_NAME")
+    if not template_file_name: return
+    smtp_config = get_smtp_config()
+    if not smtp_config: return
+    msg_subject = get_environ("MSG_SUBJECT")
+    if not msg_subject: msg_subject = "This is subject"
+    msg_organization = get_environ("MSG_ORGANIZATION")
+    if not msg_organization: msg_organization = "This is organization"
+    from_email = get_environ("FROM_EMAIL")
+    if not from_email: return
+    to_emails = get_environ("TO_EMAILS")
+    if not to_emails: return
+
+    # Parsowanie listy adresów email
+    to_emails = [email.strip() for email in to_emails.split(",")]
+
+    # Aktualna data i czas UTC
+    datetime_utc, date_utc_string, datetime_utc_string = get_datetime_utc()
 
-    # Dodawanie treści do wiadomości
-    html_part = MIMEText(html_content, "html")
-    msg.attach(html_part)
+    # Odczytywanie skompilowanego szablonu HTML (plik wczytywany ponownie tylko po zmianie)
+    compiled_template = get_compiled_template(template_dir, template_file_name)
+    if not compiled_template: return
 
-    # Inicjalizacja połączenia SMTP
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()  # Inicjowanie szyfrowania TLS
-        server.login(smtp_username, smtp_password)
-    except Exception as e:
-        print(f"{datetime_utc_string}(UTC) - Wystąpił błąd podczas łączenia z serwerem SMTP: {e}")
-        return
+    # Uruchomienie jest pomijane, gdy poprzednie jeszcze trwa (raport nie zostanie wysłany dwukrotnie)
+    with job_lock(data_dir, "send_report") as acquired:
+        if not acquired: return
 
-    # Wysyłanie wiadomości do każdego odbiorcy
-    for to_email in to_emails:
-        try:
-            # Aktualizacja pola "To"
-            msg["To"] = to_email
+        # Treść wiadomości w HTML
+        html_content = render_report(compiled_template, data_dir, report_dir, msg_subject, msg_organization, date_utc_string)
+        if html_content is None: return
 
-            # Wysłanie wiadomości
-            server.sendmail(from_email, to_email, msg.as_string())
-            print(f"{datetime_utc_string}(UTC) - Wiadomość została wysłana do {to_email}")
-        except Exception as e:
-            print(f"{datetime_utc_string}(UTC) - Wystąpił błąd podczas wysyłania do {to_email}: {e}")
+        # Tworzenie wiadomości (serializacja jeden raz dla wszystkich odbiorców)
+        message = build_message(from_email, msg_subject, html_content)
 
-    # Zamknięcie połączenia SMTP
-    server.quit()
+        # Wysyłanie wiadomości do wszystkich odbiorców w jednej transakcji SMTP (lub paczkach SMTP_BATCH_SIZE)
+        send_messages(smtp_config, [{"from_email": from_email, "recipients": to_emails, "message": message}])
 
 # Wykonanie funkcji
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+from helper import write_json_file
+from archive import iter_partition_records
+import json
+import os
+
+# Rekordy dziennego pliku pełnych odpowiedzi /user/workers (format jsonl):
+# {"ts": ..., "full": {...}}   - pełna odpowiedź (pierwsza w pliku lub gdy delta nie jest mniejsza)
+# {"ts": ..., "delta": {...}}  - łatka względem poprzedniej odpowiedzi (diff_json)
+# {"ts": ..., "same": true}    - odpowiedź identyczna z poprzednią
+# Rekordy bez tych kluczy to surowe odpowiedzi API zapisane przed wprowadzeniem delt.
+
+# Węzły łatki:
+# {"=": wartość}                      - zastąpienie wartości
+# {"d": {klucz: węzeł}, "x": [klucze]} - zmiany i usunięte klucze słownika
+# {"l": {"indeks": węzeł}}            - zmiany elementów listy o niezmienionej długości
+
+def diff_json(old, new):
+    """Zwraca łatkę zamieniającą old w new lub None, gdy wartości są równe."""
+    if old == new:
+        return None
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = {}
+        changed = {}
+        for key, value in new.items():
+            if key not in old:
+                changed[key] = {"=": value}
+                continue
+            node = diff_json(old[key], value)
+            if node is not None:
+                changed[key] = node
+        removed = [key for key in old if key not in new]
+        if changed:
+            patch["d"] = changed
+        if removed:
+            patch["x"] = removed
+        return patch
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        changed = {}
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            node = diff_json(old_item, new_item)
+            if node is not None:
+                changed[str(index)] = node
+        return {"l": changed}
+
+    return {"=": new}
+
+def apply_patch(old, patch):
+    """Nakłada łatkę (diff_json) na wartość old i zwraca nową wartość."""
+    if "=" in patch:
+        return patch["="]
+
+    if "l" in patch:
+        result = list(old)
+        for index, node in patch["l"].items():
+            result[int(index)] = apply_patch(result[int(index)], node)
+        return result
+
+    result = dict(old)
+    for key in patch.get("x", []):
+        del result[key]
+    for key, node in patch.get("d", {}).items():
+        result[key] = apply_patch(result.get(key), node)
+    return result
+
+def encode_snapshot(previous, data, timestamp):
+    """Zwraca rekord do zapisu: pełną odpowiedź, deltę względem previous lub znacznik "same"."""
+    if previous is None:
+        return {"ts": timestamp, "full": data}
+
+    patch = diff_json(previous, data)
+    if patch is None:
+        return {"ts": timestamp, "same": True}
+
+    # Delta opłaca się tylko wtedy, gdy jest mniejsza od pełnej odpowiedzi
+    if len(json.dumps(patch, separators=(",", ":"))) >= len(json.dumps(data, separators=(",", ":"))):
+        return {"ts": timestamp, "full": data}
+    return {"ts": timestamp, "delta": patch}
+
+def decode_snapshots(records):
+    """Odtwarza kolejne pełne odpowiedzi API z rekordów pliku dziennego."""
+    current = None
+    for record in records:
+        if "full" in record:
+            current = record["full"]
+        elif "delta" in record:
+            current = apply_patch(current, record["delta"])
+        elif "same" in record:
+            pass
+        else:
+            current = record
+        yield current
+
+def load_snapshots(file_path):
+    """
+    Zwraca strumieniowo pełne odpowiedzi /user/workers zapisane w pliku dziennym (json, jsonl
+    lub skompresowanej partycji .jsonl.gz), odtwarzając delty i znaczniki "same" (decode_snapshots).
+    """
+    return decode_snapshots(iter_partition_records(file_path))
+
+def get_last_snapshot_path(path, name):
+    """Zwraca ścieżkę pliku z ostatnią zapisaną odpowiedzią dla partycji <name>."""
+    return os.path.join(path, f"{name}.snapshot")
+
+def load_last_snapshot(file_path, last_snapshot_path):
+    """
+    Zwraca ostatnią zapisaną odpowiedź, jeśli odpowiada aktualnej zawartości pliku dziennego.
+    Gdy rozmiar pliku dziennego różni się od zapamiętanego (np. przerwany zapis), zwraca None,
+    co wymusza zapis pełnej odpowiedzi.
+    """
+    if not os.path.exists(file_path) or not os.path.exists(last_snapshot_path):
+        return None
+    try:
+        with open(last_snapshot_path, "r") as file:
+            last_snapshot = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if last_snapshot.get("size") != os.path.getsize(file_path):
+        return None
+    return last_snapshot["snapshot"]
+
+def save_last_snapshot(file_path, last_snapshot_path, data):
+    """Zapamiętuje ostatnią odpowiedź razem z rozmiarem pliku dziennego po jej zapisaniu (zapis atomowy)."""
+    write_json_file(last_snapshot_path, {"size": os.path.getsize(file_path), "snapshot": data}, compact=True)
+
+def remove_last_snapshots(path):
+    """Usuwa zapamiętane odpowiedzi wcześniejszych partycji (wywoływane przy zapisie pełnej odpowiedzi)."""
+    for file in os.listdir(path):
+        if file.endswith(".snapshot"):
+            os.remove(os.path.join(path, file))
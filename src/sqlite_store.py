@@ -0,0 +1,335 @@
+from helper import get_environ_or_default, get_date_from_timestamp, get_partition_timestamp, log
+from stats import new_stats, MIN_POSITIVE_VALUE, LOG_GAMMA
+from metrics import span, inc_counter
+from contextlib import contextmanager
+import threading
+import sqlite3
+import json
+import math
+import time
+import os
+
+# Format zapisu "sqlite" (STORAGE_FORMAT=sqlite): próbki revenue60m i hashrate urządzeń w jednej bazie SQLite
+# <DATA_DIR>/<SQLITE_FILE> w trybie WAL (odczyty raportów nie blokują zapisów kolektora).
+# Portfel próbki to ścieżka katalogu danych portfela względem DATA_DIR (katalog portfela z rejestru,
+# "" dla katalogu głównego), więc katalogi portfeli collector.py współdzielą jedną bazę.
+# Zapytania o zakres czasu korzystają z indeksów (wallet, series, ts) i (worker, ts), a min/max/średnia,
+# wariancja i koszyki percentyli (stats.py) liczone są przez SQLite - bez wczytywania próbek do Pythona.
+# Pełne odpowiedzi /user/workers (dokumenty) są zapisywane jak w formacie columnar - do plików jsonl.
+# Stany statystyk zamkniętych dni (query_daily_stats) są zapamiętywane w tabeli daily_stats, tak jak podsumowania
+# partycji w formatach plikowych, więc raport historyczny liczy przez SQLite tylko dni bez stanu (zwykle dzień bieżący).
+# Zapis lub usunięcie próbek dnia usuwa jego stan w tej samej transakcji.
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS samples (wallet TEXT NOT NULL, series TEXT NOT NULL, ts INTEGER NOT NULL, value REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS samples_wallet_series_ts ON samples (wallet, series, ts)",
+    "CREATE TABLE IF NOT EXISTS worker_samples (wallet TEXT NOT NULL, worker TEXT NOT NULL, ts INTEGER NOT NULL, hashrate REAL NOT NULL, last_share INTEGER)",
+    "CREATE INDEX IF NOT EXISTS worker_samples_worker_ts ON worker_samples (worker, ts)",
+    # Odczyty wszystkich urządzeń portfela z zakresu czasu (analityka raportu)
+    "CREATE INDEX IF NOT EXISTS worker_samples_wallet_ts ON worker_samples (wallet, ts)",
+    # Stany statystyk (stats.py, JSON) zamkniętych dni - dzień to numer dnia epoki (ts / 86400)
+    "CREATE TABLE IF NOT EXISTS daily_stats (wallet TEXT NOT NULL, series TEXT NOT NULL, day INTEGER NOT NULL, state TEXT NOT NULL, PRIMARY KEY (wallet, series, day))"
+)
+
+# Połączenia i niezapisane wiersze bieżącego bloku insert_batch() - osobne dla każdego wątku
+# (połączenie SQLite może być używane tylko w wątku, który je utworzył)
+local_state = threading.local()
+
+def get_store_location(data_dir):
+    """
+    Zwraca (ścieżka bazy, portfel) dla katalogu danych data_dir. Baza leży w katalogu DATA_DIR,
+    a katalog spoza DATA_DIR (np. katalog generatora lub benchmarku) ma własną bazę.
+    """
+    file_name = get_environ_or_default("SQLITE_FILE", "mining.db")
+    root = os.environ.get("DATA_DIR")
+    if root:
+        relative = os.path.relpath(os.path.abspath(data_dir), os.path.abspath(root))
+        if relative == ".":
+            return os.path.join(root, file_name), ""
+        if not relative.startswith(os.pardir):
+            return os.path.join(root, file_name), relative.replace(os.sep, "/")
+    return os.path.join(data_dir, file_name), ""
+
+def stats_bin(value):
+    """Zwraca klucz koszyka percentyli wartości (jak stats.update_stats) lub None dla koszyka "zero"."""
+    if value < MIN_POSITIVE_VALUE:
+        return None
+    return str(math.ceil(math.log(value) / LOG_GAMMA))
+
+def get_connection(db_path):
+    """
+    Zwraca połączenie z bazą (jedno na wątek) - przy pierwszym użyciu ustawia tryb WAL i tworzy schemat.
+    Proces potomny (np. pula procesów backfill.py) nie używa połączeń odziedziczonych po procesie nadrzędnym.
+    """
+    connections = getattr(local_state, "connections", None)
+    if connections is None or local_state.pid != os.getpid():
+        connections = local_state.connections = {}
+        local_state.pid = os.getpid()
+    connection = connections.get(db_path)
+    if connection is None:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        connection = sqlite3.connect(db_path, timeout=float(get_environ_or_default("SQLITE_BUSY_TIMEOUT", 30)))
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        connection.create_function("stats_bin", 1, stats_bin, deterministic=True)
+        connections[db_path] = connection
+    return connection
+
+def flush_rows(db_path, rows):
+    """Zapisuje wiersze obu tabel jedną transakcją (i usuwa zapamiętane stany statystyk dni, do których dopisano próbki)."""
+    connection = get_connection(db_path)
+    with span("sqlite_insert"), connection:
+        if rows["samples"]:
+            connection.executemany("INSERT INTO samples (wallet, series, ts, value) VALUES (?, ?, ?, ?)", rows["samples"])
+            connection.executemany(
+                "DELETE FROM daily_stats WHERE wallet = ? AND series = ? AND day = ?",
+                {(wallet, series, ts // 86400) for wallet, series, ts, value in rows["samples"]}
+            )
+        if rows["worker_samples"]:
+            connection.executemany(
+                "INSERT INTO worker_samples (wallet, worker, ts, hashrate, last_share) VALUES (?, ?, ?, ?, ?)", rows["worker_samples"]
+            )
+    inc_counter("sqlite_rows_written_total", len(rows["samples"]) + len(rows["worker_samples"]))
+
+@contextmanager
+def insert_batch():
+    """
+    Grupuje wstawienia jednego cyklu kolektora: wiersze zapisane w bloku trafiają do bazy na jego końcu,
+    jedną transakcją na bazę (jeden zapis do WAL zamiast transakcji na każdą próbkę).
+    """
+    if getattr(local_state, "pending", None) is not None:
+        yield  # Blok zagnieżdżony - wiersze zapisuje blok zewnętrzny
+        return
+    local_state.pending = {}
+    try:
+        yield
+    finally:
+        pending = local_state.pending
+        local_state.pending = None
+        for db_path, rows in pending.items():
+            try:
+                flush_rows(db_path, rows)
+            except sqlite3.Error as e:
+                log(f"Nie udało się zapisać próbek do bazy {db_path}: {e}")
+
+def add_rows(db_path, table, rows):
+    """Dodaje wiersze do bieżącego bloku insert_batch() lub zapisuje je od razu poza blokiem."""
+    pending = getattr(local_state, "pending", None)
+    if pending is None:
+        batch = {"samples": [], "worker_samples": []}
+        batch[table].extend(rows)
+        try:
+            flush_rows(db_path, batch)
+        except sqlite3.Error as e:
+            log(f"Nie udało się zapisać próbek do bazy {db_path}: {e}")
+            return False
+        return True
+    pending.setdefault(db_path, {"samples": [], "worker_samples": []})[table].extend(rows)
+    return True
+
+def add_samples(data_dir, series, samples):
+    """Zapisuje próbki (znacznik czasu, wartość) szeregu series. Zwraca ścieżkę bazy lub None."""
+    db_path, wallet = get_store_location(data_dir)
+    if not add_rows(db_path, "samples", [(wallet, series, timestamp, value) for timestamp, value in samples]):
+        return None
+    return db_path
+
+def add_worker_samples(data_dir, samples):
+    """Zapisuje odczyty urządzeń (urządzenie, znacznik czasu, hashrate [H/s], ostatni udział). Zwraca ścieżkę bazy lub None."""
+    db_path, wallet = get_store_location(data_dir)
+    if not add_rows(db_path, "worker_samples", [(wallet,) + tuple(sample) for sample in samples]):
+        return None
+    return db_path
+
+def get_day_range(date_str):
+    """Zwraca zakres [początek, koniec) dnia date_str (UTC) w sekundach epoki."""
+    start = get_partition_timestamp(date_str)
+    return start, start + 86400
+
+def get_range_condition(start_ts, end_ts):
+    """Zwraca warunek zakresu [start_ts, end_ts) kolumny ts i jego parametry (granice opcjonalne)."""
+    condition = ""
+    params = []
+    if start_ts is not None:
+        condition += " AND ts >= ?"
+        params.append(start_ts)
+    if end_ts is not None:
+        condition += " AND ts < ?"
+        params.append(end_ts)
+    return condition, params
+
+def query_samples(data_dir, series, start_ts=None, end_ts=None):
+    """Zwraca próbki (znacznik czasu, wartość) szeregu series z zakresu [start_ts, end_ts) posortowane według czasu."""
+    db_path, wallet = get_store_location(data_dir)
+    condition, params = get_range_condition(start_ts, end_ts)
+    with span("sqlite_query"):
+        return get_connection(db_path).execute(
+            f"SELECT ts, value FROM samples WHERE wallet = ? AND series = ?{condition} ORDER BY ts", [wallet, series] + params
+        ).fetchall()
+
+def query_worker_samples(data_dir, start_ts=None, end_ts=None, worker=None):
+    """
+    Zwraca odczyty (urządzenie, znacznik czasu, hashrate [H/s]) z zakresu [start_ts, end_ts) posortowane według czasu:
+    jednego urządzenia (indeks (worker, ts)) lub wszystkich urządzeń portfela (indeks (wallet, ts)).
+    """
+    db_path, wallet = get_store_location(data_dir)
+    condition, params = get_range_condition(start_ts, end_ts)
+    if worker is not None:
+        condition += " AND worker = ?"
+        params.append(worker)
+    with span("sqlite_query"):
+        return get_connection(db_path).execute(
+            f"SELECT worker, ts, hashrate FROM worker_samples WHERE wallet = ?{condition} ORDER BY ts", [wallet] + params
+        ).fetchall()
+
+def compute_daily_stats(connection, wallet, series, start_ts=None, end_ts=None):
+    """
+    Liczy stany statystyk (stats.py) dni z zakresu [start_ts, end_ts) ({numer dnia: stan}).
+    Liczba próbek, min, max, średnia, suma kwadratów odchyleń i koszyki percentyli liczone są przez SQLite
+    (GROUP BY dzień) - wynik odpowiada stats.compute_stats dla próbek każdego dnia.
+    """
+    condition, params = get_range_condition(start_ts, end_ts)
+    where = f"wallet = ? AND series = ?{condition}"
+    params = [wallet, series] + params
+
+    states = {}
+    rows = connection.execute(
+        f"""
+        WITH days AS (SELECT ts / 86400 AS day, AVG(value) AS mean FROM samples WHERE {where} GROUP BY day)
+        SELECT day, COUNT(*), MIN(value), MAX(value), days.mean, SUM((value - days.mean) * (value - days.mean))
+        FROM samples JOIN days ON samples.ts / 86400 = days.day
+        WHERE {where} GROUP BY day
+        """,
+        params + params
+    ).fetchall()
+    for day, count, minimum, maximum, mean, m2 in rows:
+        state = new_stats()
+        state.update({"count": count, "min": minimum, "max": maximum, "mean": mean, "m2": m2})
+        states[day] = state
+
+    for day, key, count in connection.execute(
+        f"SELECT ts / 86400 AS day, stats_bin(value) AS bin, COUNT(*) FROM samples WHERE {where} GROUP BY day, bin", params
+    ):
+        if key is None:
+            states[day]["zero"] = count
+        else:
+            states[day]["bins"][key] = count
+    return states
+
+def get_uncached_ranges(start_ts, end_ts, cached_days):
+    """Zwraca zakresy [początek, koniec) z [start_ts, end_ts) niepokryte przez dni cached_days (posortowane)."""
+    ranges = []
+    start = start_ts
+    for day in cached_days:
+        if start is None or start < day * 86400:
+            ranges.append((start, day * 86400))
+        start = (day + 1) * 86400
+    if end_ts is None or start is None or start < end_ts:
+        ranges.append((start, end_ts))
+    return ranges
+
+def query_daily_stats(data_dir, series, start_ts=None, end_ts=None):
+    """
+    Zwraca stany statystyk (stats.py) dni z zakresu [start_ts, end_ts) ({data: stan}, posortowane według daty).
+    Stany zamkniętych dni zawartych w całości w zakresie pochodzą z tabeli daily_stats, a pozostałe dni
+    (dzień bieżący, dni bez zapamiętanego stanu i dni brzegowe zakresu) liczy compute_daily_stats.
+    Nowo policzone stany zamkniętych dni są zapamiętywane, więc koszt raportu nie rośnie z długością historii.
+    """
+    db_path, wallet = get_store_location(data_dir)
+    connection = get_connection(db_path)
+
+    # Zakres dni, których stan można zapamiętać: pełne dni zakresu sprzed dnia bieżącego (UTC)
+    first_day = None if start_ts is None else -(-start_ts // 86400)
+    last_day = int(time.time()) // 86400
+    if end_ts is not None:
+        last_day = min(last_day, end_ts // 86400)
+
+    with span("sqlite_query"), connection:
+        # Transakcja zapisu: próbki dopisane w trakcie obliczeń nie zostaną pominięte w zapamiętanym stanie
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        condition, params = " AND day < ?", [last_day]
+        if first_day is not None:
+            condition, params = condition + " AND day >= ?", params + [first_day]
+        states = {
+            day: json.loads(state) for day, state in connection.execute(
+                f"SELECT day, state FROM daily_stats WHERE wallet = ? AND series = ?{condition} ORDER BY day", [wallet, series] + params
+            )
+        }
+
+        computed = {}
+        for range_start, range_end in get_uncached_ranges(start_ts, end_ts, list(states)):
+            computed.update(compute_daily_stats(connection, wallet, series, range_start, range_end))
+        connection.executemany(
+            "INSERT OR REPLACE INTO daily_stats (wallet, series, day, state) VALUES (?, ?, ?, ?)",
+            [
+                (wallet, series, day, json.dumps(state, separators=(",", ":")))
+                for day, state in computed.items() if (first_day is None or day >= first_day) and day < last_day
+            ]
+        )
+        states.update(computed)
+    return {get_date_from_timestamp(day * 86400): states[day] for day in sorted(states)}
+
+def query_stats(data_dir, series, start_ts=None, end_ts=None):
+    """Zwraca stan statystyk (stats.py) szeregu series z zakresu [start_ts, end_ts) liczony przez SQLite."""
+    db_path, wallet = get_store_location(data_dir)
+    condition, params = get_range_condition(start_ts, end_ts)
+    where = f"wallet = ? AND series = ?{condition}"
+    params = [wallet, series] + params
+    connection = get_connection(db_path)
+
+    state = new_stats()
+    with span("sqlite_query"):
+        count, minimum, maximum, mean = connection.execute(
+            f"SELECT COUNT(*), MIN(value), MAX(value), AVG(value) FROM samples WHERE {where}", params
+        ).fetchone()
+        if not count:
+            return state
+        m2, = connection.execute(f"SELECT SUM((value - ?) * (value - ?)) FROM samples WHERE {where}", [mean, mean] + params).fetchone()
+        state.update({"count": count, "min": minimum, "max": maximum, "mean": mean, "m2": m2})
+        for key, bin_count in connection.execute(f"SELECT stats_bin(value) AS bin, COUNT(*) FROM samples WHERE {where} GROUP BY bin", params):
+            if key is None:
+                state["zero"] = bin_count
+            else:
+                state["bins"][key] = bin_count
+    return state
+
+def query_date_range(data_dir, series, end_ts=None):
+    """Zwraca pierwszy i ostatni dzień z próbkami szeregu series (przed end_ts) lub None, gdy brak próbek."""
+    db_path, wallet = get_store_location(data_dir)
+    condition, params = get_range_condition(None, end_ts)
+    first, last = get_connection(db_path).execute(
+        f"SELECT MIN(ts), MAX(ts) FROM samples WHERE wallet = ? AND series = ?{condition}", [wallet, series] + params
+    ).fetchone()
+    if first is None:
+        return None
+    return get_date_from_timestamp(first), get_date_from_timestamp(last)
+
+def query_daily_totals(data_dir, series):
+    """Zwraca sumy i liczby próbek szeregu series dla wszystkich dni ({data: (suma, liczba)})."""
+    db_path, wallet = get_store_location(data_dir)
+    with span("sqlite_query"):
+        rows = get_connection(db_path).execute(
+            "SELECT ts / 86400 AS day, SUM(value), COUNT(*) FROM samples WHERE wallet = ? AND series = ? GROUP BY day ORDER BY day",
+            (wallet, series)
+        ).fetchall()
+    return {get_date_from_timestamp(day * 86400): (total, count) for day, total, count in rows}
+
+def delete_samples(data_dir, series, start_ts, end_ts):
+    """Usuwa próbki szeregu series z zakresu [start_ts, end_ts) (ponowny import dnia) i zapamiętane stany tych dni."""
+    db_path, wallet = get_store_location(data_dir)
+    with get_connection(db_path) as connection:
+        connection.execute("DELETE FROM samples WHERE wallet = ? AND series = ? AND ts >= ? AND ts < ?", (wallet, series, start_ts, end_ts))
+        connection.execute(
+            "DELETE FROM daily_stats WHERE wallet = ? AND series = ? AND day >= ? AND day < ?",
+            (wallet, series, start_ts // 86400, -(-end_ts // 86400))
+        )
+
+def delete_worker_samples(data_dir, start_ts, end_ts):
+    """Usuwa odczyty urządzeń portfela z zakresu [start_ts, end_ts) (ponowny import dnia)."""
+    db_path, wallet = get_store_location(data_dir)
+    with get_connection(db_path) as connection:
+        connection.execute("DELETE FROM worker_samples WHERE wallet = ? AND ts >= ? AND ts < ?", (wallet, start_ts, end_ts))
@@ -0,0 +1,97 @@
+import math
+
+# Względna dokładność percentyli. Wartości dodatnie trafiają do koszyków o logarytmicznie
+# rosnącej szerokości (jak w DDSketch), więc błąd percentyla nie przekracza 1% wartości,
+# a liczba koszyków rośnie tylko z logarytmem zakresu danych.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Wartości mniejsze od tego progu (w tym zero i wartości ujemne) trafiają do koszyka "zero"
+MIN_POSITIVE_VALUE = 1e-12
+
+def new_stats():
+    """
+    Tworzy pusty stan agregatora statystyk.
+    Stan jest zwykłym słownikiem, więc można go zapisać do JSON i połączyć z innymi stanami (merge_stats).
+    """
+    return {
+        "count": 0,
+        "min": None,
+        "max": None,
+        "mean": 0.0,
+        "m2": 0.0,
+        "zero": 0,
+        "bins": {}
+    }
+
+def update_stats(state, value):
+    """Dodaje jedną wartość do stanu (algorytm Welforda dla średniej i wariancji)."""
+    state["count"] += 1
+    if state["min"] is None or value < state["min"]:
+        state["min"] = value
+    if state["max"] is None or value > state["max"]:
+        state["max"] = value
+    delta = value - state["mean"]
+    state["mean"] += delta / state["count"]
+    state["m2"] += delta * (value - state["mean"])
+
+    if value < MIN_POSITIVE_VALUE:
+        state["zero"] += 1
+    else:
+        key = str(math.ceil(math.log(value) / LOG_GAMMA))
+        state["bins"][key] = state["bins"].get(key, 0) + 1
+    return state
+
+def update_stats_many(state, values):
+    """Dodaje do stanu wszystkie wartości z iteratora w jednym przebiegu."""
+    for value in values:
+        update_stats(state, value)
+    return state
+
+def merge_stats(*states):
+    """Łączy stany agregatorów (np. z wielu plików lub urządzeń) w nowy stan."""
+    merged = new_stats()
+    for state in states:
+        if not state["count"]:
+            continue
+        count = merged["count"] + state["count"]
+        delta = state["mean"] - merged["mean"]
+        merged["mean"] += delta * state["count"] / count
+        merged["m2"] += state["m2"] + delta * delta * merged["count"] * state["count"] / count
+        merged["count"] = count
+        merged["min"] = state["min"] if merged["min"] is None else min(merged["min"], state["min"])
+        merged["max"] = state["max"] if merged["max"] is None else max(merged["max"], state["max"])
+        merged["zero"] += state["zero"]
+        for key, bin_count in state["bins"].items():
+            merged["bins"][key] = merged["bins"].get(key, 0) + bin_count
+    return merged
+
+def stats_variance(state):
+    """Zwraca wariancję (populacyjną) wartości w stanie."""
+    if not state["count"]:
+        return None
+    return state["m2"] / state["count"]
+
+def stats_percentile(state, percentile):
+    """
+    Zwraca przybliżoną wartość percentyla (0-100) metodą najbliższej rangi
+    z dokładnością względną RELATIVE_ACCURACY.
+    """
+    if not state["count"]:
+        return None
+    rank = max(1, math.ceil(percentile / 100 * state["count"]))
+
+    seen = state["zero"]
+    if rank <= seen:
+        return max(state["min"], 0.0)
+    for key in sorted(state["bins"], key=int):
+        seen += state["bins"][key]
+        if rank <= seen:
+            value = 2 * GAMMA ** int(key) / (GAMMA + 1)
+            return min(max(value, state["min"]), state["max"])
+    return state["max"]
+
+def compute_stats(values):
+    """Oblicza stan statystyk dla iteratora wartości w jednym przebiegu."""
+    return update_stats_many(new_stats(), values)
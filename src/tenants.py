@@ -0,0 +1,64 @@
+from helper import read_json_file, get_environ_or_default, log
+import os
+
+# Rejestr portfeli (WALLETS_FILE) to plik JSON z listą portfeli, np.:
+# [
+#     {
+#         "wallet": "kaspa:adres_portfela",
+#         "recipients": ["adres@email", ...],
+#         "organization": "Nazwa klienta",  - opcjonalnie (domyślnie MSG_ORGANIZATION)
+#         "subject": "Temat wiadomości"       - opcjonalnie (domyślnie MSG_SUBJECT)
+#     }
+# ]
+# Bez rejestru używana jest lista WALLETS z odbiorcami TO_EMAILS wspólnymi dla wszystkich portfeli.
+
+def get_wallet_slug(wallet):
+    """Zwraca nazwę katalogu danych portfela (bez znaków niedozwolonych w nazwach plików)."""
+    return wallet.replace(":", "_").replace("/", "_")
+
+def split_list(value):
+    """Dzieli listę wartości oddzielonych przecinkami (pomija puste)."""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def get_wallet_registry(data_dir):
+    """
+    Zwraca listę portfeli (najemców) z rejestru WALLETS_FILE lub ze zmiennej WALLETS.
+    Każdy wpis zawiera adres portfela, katalog danych (data_dir/<portfel>), odbiorców raportu,
+    organizację i temat wiadomości.
+    """
+    default_recipients = split_list(os.environ.get("TO_EMAILS"))
+    default_organization = get_environ_or_default("MSG_ORGANIZATION", "This is organization")
+    default_subject = get_environ_or_default("MSG_SUBJECT", "This is subject")
+
+    wallets_file = os.environ.get("WALLETS_FILE")
+    if wallets_file:
+        entries = read_json_file(wallets_file)
+        if not isinstance(entries, list):
+            log(f"Niepoprawny format rejestru portfeli: {wallets_file}")
+            return []
+    else:
+        entries = [{"wallet": wallet} for wallet in split_list(os.environ.get("WALLETS"))]
+
+    registry = []
+    seen = set()
+    for entry in entries:
+        wallet = entry.get("wallet") if isinstance(entry, dict) else None
+        if not wallet or wallet in seen:
+            log(f"Pominięto niepoprawny lub powtórzony wpis rejestru portfeli: {entry}")
+            continue
+        seen.add(wallet)
+
+        recipients = entry.get("recipients", default_recipients)
+        if isinstance(recipients, str):
+            recipients = split_list(recipients)
+
+        registry.append({
+            "wallet": wallet,
+            "data_dir": os.path.join(data_dir, get_wallet_slug(wallet)),
+            "recipients": recipients,
+            "organization": entry.get("organization") or default_organization,
+            "subject": entry.get("subject") or default_subject
+        })
+    return registry
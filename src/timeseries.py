@@ -0,0 +1,80 @@
+from metrics import inc_counter
+from array import array
+import mmap
+import os
+
+# Kolumny szeregów czasowych i ich typy (kody modułu array)
+# ts  - znacznik czasu próbki w sekundach epoki (int64)
+# val - wartość próbki (float64)
+# lst - czas ostatniego udziału urządzenia w sekundach epoki (int64)
+COLUMN_TYPES = {
+    "ts": "q",
+    "val": "d",
+    "lst": "q"
+}
+
+# Kolumny szeregu revenue60m oraz szeregu hashrate pojedynczego urządzenia
+REVENUE_COLUMNS = ("ts", "val")
+HASHRATE_COLUMNS = ("ts", "val", "lst")
+
+def get_column_path(path, name, column):
+    """Zwraca ścieżkę pliku kolumny <name>.<column>."""
+    return os.path.join(path, f"{name}.{column}")
+
+def append_columns(path, name, values):
+    """
+    Dopisuje jedną próbkę do plików kolumn partycji <name>.
+    Każda kolumna to ciąg wartości stałej długości (8 bajtów), więc zapis próbki
+    kosztuje O(1) niezależnie od rozmiaru partycji. Kolumny dłuższe od wspólnej liczby wierszy
+    (przerwany zapis poprzedniej próbki) są przycinane przed dopisaniem, aby wartości nie przesunęły się
+    względem znaczników czasu. Zwraca ścieżkę kolumny "val".
+    """
+    file_paths = {column: get_column_path(path, name, column) for column in values}
+    sizes = {column: os.path.getsize(file_path) if os.path.exists(file_path) else 0 for column, file_path in file_paths.items()}
+    rows = min(size // array(COLUMN_TYPES[column]).itemsize for column, size in sizes.items())
+    for column, value in values.items():
+        with open(file_paths[column], "ab") as file:
+            expected = rows * array(COLUMN_TYPES[column]).itemsize
+            if sizes[column] != expected:
+                file.truncate(expected)
+            file.write(array(COLUMN_TYPES[column], [value]).tobytes())
+    inc_counter("bytes_written_total", 8 * len(values))
+    return file_paths["val"]
+
+def replace_columns(path, name, columns):
+    """
+    Zapisuje pełne kolumny partycji <name> ({kolumna: lista wartości}) atomowo: każda kolumna trafia
+    do pliku tymczasowego, który po fsync zastępuje plik kolumny (os.replace).
+    """
+    for column, values in columns.items():
+        file_path = get_column_path(path, name, column)
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(array(COLUMN_TYPES[column], values).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        inc_counter("bytes_written_total", 8 * len(values))
+        os.replace(tmp_path, file_path)
+
+def read_column(file_path, column):
+    """
+    Odwzorowuje plik kolumny w pamięci (mmap) i zwraca memoryview z wartościami bez kopiowania.
+    Niepełny rekord na końcu pliku (przerwany zapis) jest pomijany.
+    """
+    typecode = COLUMN_TYPES[column]
+    itemsize = array(typecode).itemsize
+    size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    size -= size % itemsize
+    if size == 0:
+        return memoryview(array(typecode))
+
+    inc_counter("bytes_read_total", size, source="file")
+    with open(file_path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)[:size].cast(typecode)
+
+def read_columns(path, name, columns):
+    """Wczytuje kolumny partycji <name> i przycina je do wspólnej długości."""
+    views = {column: read_column(get_column_path(path, name, column), column) for column in columns}
+    length = min(len(view) for view in views.values())
+    return {column: view[:length] for column, view in views.items()}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Moduły projektu są skryptami w katalogu src (importowanymi bez pakietu)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
@@ -0,0 +1,150 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+import pytest
+import requests
+
+import helper
+import metrics
+from helper import make_api_request
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Odpowiada wynikiem server.respond(nagłówki) - (status, nagłówki, treść) - i zapamiętuje nagłówki zapytań."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        status, headers, body = self.server.respond(self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def api_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubApiHandler)
+    server.requests = []
+    server.respond = lambda headers: (200, {}, b"{}")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def api(api_server, tmp_path, monkeypatch):
+    """Zwraca (URL, sesja HTTP) z czystym cache odpowiedzi w katalogu tmp_path i bez oczekiwania między próbami."""
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(helper, "response_cache", {})
+    monkeypatch.setattr(helper, "API_CACHE_TTL", 0)
+    monkeypatch.setattr(helper, "API_RETRIES", 2)
+    monkeypatch.setattr(helper, "get_retry_delay", lambda attempt: 0)
+    with requests.Session() as session:
+        yield f"http://127.0.0.1:{api_server.server_address[1]}/api/user/base", session
+
+def cache_hits(reason):
+    return metrics.metric_values.get("api_cache_hits_total", {}).get((("reason", reason),), 0)
+
+def json_body(data):
+    return json.dumps(data).encode()
+
+def test_etag_revalidation_reuses_cached_data(api_server, api):
+    url, session = api
+    api_server.respond = lambda headers: (
+        (304, {}, b"") if headers.get("If-None-Match") == '"v1"' else (200, {"ETag": '"v1"'}, json_body({"revenue": 1}))
+    )
+    hits = cache_hits("not_modified")
+
+    first = make_api_request(url, session)
+    second = make_api_request(url, session)
+
+    assert first == {"revenue": 1}
+    assert second is first
+    assert "If-None-Match" not in api_server.requests[0]
+    assert api_server.requests[1]["If-None-Match"] == '"v1"'
+    assert cache_hits("not_modified") == hits + 1
+
+def test_last_modified_revalidation(api_server, api):
+    url, session = api
+    last_modified = "Sun, 18 Oct 2026 12:00:00 GMT"
+    api_server.respond = lambda headers: (
+        (304, {}, b"") if headers.get("If-Modified-Since") == last_modified
+        else (200, {"Last-Modified": last_modified}, json_body([1, 2]))
+    )
+
+    assert make_api_request(url, session) == [1, 2]
+    assert make_api_request(url, session) == [1, 2]
+    assert api_server.requests[1]["If-Modified-Since"] == last_modified
+
+def test_unchanged_body_is_not_parsed_again(api_server, api, monkeypatch):
+    url, session = api
+    api_server.respond = lambda headers: (200, {}, json_body({"workers": ["rig000"]}))
+    hits = cache_hits("same_hash")
+
+    first = make_api_request(url, session)
+    monkeypatch.setattr(helper.json, "loads", lambda *args, **kwargs: pytest.fail("treść o tym samym skrócie parsowana ponownie"))
+    second = make_api_request(url, session)
+
+    assert second is first
+    assert cache_hits("same_hash") == hits + 1
+
+def test_changed_body_is_parsed(api_server, api):
+    url, session = api
+    bodies = iter([json_body({"revenue": 1}), json_body({"revenue": 2})])
+    api_server.respond = lambda headers: (200, {}, next(bodies))
+
+    assert make_api_request(url, session) == {"revenue": 1}
+    assert make_api_request(url, session) == {"revenue": 2}
+
+def test_cache_ttl_and_expiry(api_server, api, monkeypatch):
+    url, session = api
+    monkeypatch.setattr(helper, "API_CACHE_TTL", 30)
+    api_server.respond = lambda headers: (200, {}, json_body({"revenue": len(api_server.requests)}))
+    now = [1_000_000.0]
+    monkeypatch.setattr(helper.time, "time", lambda: now[0])
+
+    assert make_api_request(url, session) == {"revenue": 1}
+    now[0] += 29
+    assert make_api_request(url, session) == {"revenue": 1}
+    assert len(api_server.requests) == 1
+
+    # Cache w pliku - odpowiedź pobrana przez inny proces w tym samym cyklu
+    monkeypatch.setattr(helper, "response_cache", {})
+    assert make_api_request(url, session) == {"revenue": 1}
+    assert len(api_server.requests) == 1
+
+    now[0] += 2
+    assert make_api_request(url, session) == {"revenue": 2}
+    assert len(api_server.requests) == 2
+
+def test_retries_on_server_errors(api_server, api):
+    url, session = api
+    statuses = iter([503, 429])
+    api_server.respond = lambda headers: (next(statuses, 200), {}, json_body({"ok": True}))
+
+    assert make_api_request(url, session) == {"ok": True}
+    assert len(api_server.requests) == 3
+
+def test_gives_up_after_retries(api_server, api):
+    url, session = api
+    api_server.respond = lambda headers: (503, {}, b"")
+
+    assert make_api_request(url, session) is None
+    assert len(api_server.requests) == helper.API_RETRIES + 1
+
+def test_client_error_is_not_retried(api_server, api):
+    url, session = api
+    api_server.respond = lambda headers: (404, {}, b"")
+
+    assert make_api_request(url, session) is None
+    assert len(api_server.requests) == 1
+
+def test_connection_error_returns_none(api, monkeypatch):
+    url, session = api
+    monkeypatch.setattr(helper, "API_RETRIES", 1)
+
+    assert make_api_request("http://127.0.0.1:9/api", session) is None
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import helper
+from helper import iter_json_array
+
+MIXED_ARRAYS = [
+    [],
+    ["x", 0.1, "y"],
+    [0, 1.0, -0.5e-3, 12345, 1E+10, True, False, None],
+    ["a,]b", "\"]", [1, [2.25]], {"k": 10.5, "l": [3, {"m": -7}]}],
+    [{"timestamp": 1760745600 + i, "revenue60m": i / 3} for i in range(20)]
+]
+
+def write_text(tmp_path, text):
+    file_path = tmp_path / "data.json"
+    file_path.write_text(text)
+    return str(file_path)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+@pytest.mark.parametrize("data", MIXED_ARRAYS)
+@pytest.mark.parametrize("indent", [None, 4])
+def test_reads_array_across_chunk_boundaries(tmp_path, monkeypatch, chunk_size, data, indent):
+    """Elementy (również liczby przecięte granicą fragmentu, np. "0." z "0.1") są identyczne z json.load."""
+    monkeypatch.setattr(helper, "JSON_CHUNK_SIZE", chunk_size)
+    file_path = write_text(tmp_path, "  \n" + json.dumps(data, indent=indent) + "\n")
+    assert list(iter_json_array(file_path)) == data
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64 * 1024])
+def test_truncated_file_yields_complete_records(tmp_path, monkeypatch, chunk_size):
+    """Ucięty plik zwraca prefiks kompletnych rekordów, a z keep_corrupt=True zachowuje oryginał."""
+    monkeypatch.setattr(helper, "JSON_CHUNK_SIZE", chunk_size)
+    data = [{"x": index, "y": [index] * 3} for index in range(10)]
+    text = json.dumps(data, indent=4)
+    for cut in range(1, len(text) - 1, 17):
+        file_path = write_text(tmp_path, text[:cut])
+        records = list(iter_json_array(file_path, keep_corrupt=True))
+        assert records == data[:len(records)]
+        assert (tmp_path / "data.json.corrupt").read_text() == text[:cut]
+
+def test_rejects_non_array(tmp_path):
+    assert list(iter_json_array(write_text(tmp_path, '{"a": 1}'))) == []
+
+def test_projects_nested_fields(tmp_path):
+    record = {
+        "timestamp": 1,
+        "revenue60m": 2.5,
+        "hashrate24h": {"worker": "rig000", "hashrate": 100, "hashrate_unit": "TH/s", "last_share_time": 5}
+    }
+    file_path = write_text(tmp_path, json.dumps([record, 7]))
+    fields = ("revenue60m", "hashrate24h.worker", "hashrate24h.missing", "missing")
+    assert list(iter_json_array(file_path, fields)) == [{"revenue60m": 2.5, "hashrate24h": {"worker": "rig000"}}, 7]
+
+def test_streamed_append_matches_json_dump(tmp_path, monkeypatch):
+    """Dopisywanie do tablicy JSON (strumieniowe przepisanie) daje plik identyczny z json.dump(..., indent=4)."""
+    monkeypatch.setattr(helper, "JSON_CHUNK_SIZE", 3)
+    records = [{"a": index, "b": [0.1, None, "x"]} for index in range(5)]
+    helper.append_record(str(tmp_path), "day", records[0], "json")
+    helper.append_records(str(tmp_path), "day", records[1:], "json")
+    assert (tmp_path / "day.json").read_text() == json.dumps(records, indent=4)
@@ -0,0 +1,112 @@
+import socketserver
+import threading
+
+import pytest
+
+from mailer import build_message, send_messages
+
+class StubSmtpHandler(socketserver.StreamRequestHandler):
+    """Minimalny serwer SMTP: odrzuca adresy zaczynające się od "bad" i zlicza połączenia i transakcje."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 test")
+        in_data = False
+        recipients = []
+        for raw_line in self.rfile:
+            line = raw_line.decode(errors="replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    with self.server.lock:
+                        self.server.transactions.append(recipients)
+                    recipients = []
+                    self.reply("250 OK")
+                continue
+            command = line[:4].upper()
+            if command == "EHLO":
+                self.reply("250-test")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("235 OK")
+            elif command == "RCPT":
+                address = line.split(":", 1)[1].strip(" <>")
+                if address.startswith("bad"):
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                in_data = True
+                self.reply("354 OK")
+            elif command == "QUIT":
+                self.reply("221 OK")
+                return
+            else:
+                self.reply("250 OK")
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubSmtpHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.transactions = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def get_config(port, **overrides):
+    config = {
+        "server": "127.0.0.1",
+        "port": port,
+        "username": "test",
+        "password": "test",
+        "starttls": False,
+        "timeout": 5,
+        "batch_size": 2,
+        "max_connections": 2
+    }
+    config.update(overrides)
+    return config
+
+def test_messages_share_pooled_connections(smtp_server):
+    message = build_message("from@localhost", "Raport", "<p>raport</p>")
+    messages = [
+        {"from_email": "from@localhost", "recipients": [f"user{index}-{n}@localhost" for n in range(5)], "message": message}
+        for index in range(6)
+    ]
+
+    results = send_messages(get_config(smtp_server.server_address[1]), messages)
+
+    assert results == [[]] * 6
+    # 5 odbiorców w paczkach po 2 - trzy transakcje na wiadomość, połączeń nie więcej niż max_connections
+    assert len(smtp_server.transactions) == 18
+    assert sorted(address for batch in smtp_server.transactions for address in batch) == sorted(
+        address for item in messages for address in item["recipients"]
+    )
+    assert 1 <= smtp_server.connections <= 2
+
+def test_refused_recipients_are_reported(smtp_server):
+    message = build_message("from@localhost", "Raport", "<p>raport</p>")
+    messages = [{"from_email": "from@localhost", "recipients": ["ok@localhost", "bad@localhost", "bad2@localhost"], "message": message}]
+
+    assert send_messages(get_config(smtp_server.server_address[1]), messages) == [["bad@localhost", "bad2@localhost"]]
+    assert [address for batch in smtp_server.transactions for address in batch] == ["ok@localhost"]
+
+def test_connection_failure_returns_all_recipients():
+    message = build_message("from@localhost", "Raport", "<p>raport</p>")
+    messages = [{"from_email": "from@localhost", "recipients": ["a@localhost", "b@localhost"], "message": message}]
+
+    assert send_messages(get_config(9, timeout=1), messages) == [["a@localhost", "b@localhost"]]
+
+def test_message_hides_recipients():
+    message = build_message("from@localhost", "Raport", "<p>raport</p>")
+
+    assert "To: undisclosed-recipients:;" in message
+    assert "Subject: Raport" in message
@@ -0,0 +1,87 @@
+import copy
+import os
+
+import pytest
+
+from archive import archive_partition
+from hashrate_full_data import store_full_data
+from helper import append_jsonl_records
+from snapshot import apply_patch, decode_snapshots, diff_json, encode_snapshot, load_snapshots
+from datetime import datetime, timezone
+
+def get_response(revenue, workers):
+    return {"wallet": "kaspa:test", "stats": {"revenue": revenue, "pool": {"fee": 0.01, "tags": ["pplns"]}}, "workers": workers}
+
+RESPONSES = [
+    get_response(1.0, [{"worker": "rig000", "hashrate24h": {"hashrate": 10.5, "hashrate_unit": "GH/s"}}]),
+    # Bez zmian - znacznik "same"
+    get_response(1.0, [{"worker": "rig000", "hashrate24h": {"hashrate": 10.5, "hashrate_unit": "GH/s"}}]),
+    # Zagnieżdżone słowniki i element listy o niezmienionej długości
+    get_response(1.5, [{"worker": "rig000", "hashrate24h": {"hashrate": 11.0, "hashrate_unit": "GH/s"}}]),
+    # Lista innej długości i nowy klucz
+    dict(get_response(1.5, [{"worker": "rig000"}, {"worker": "rig001", "offline": True}]), extra={"note": None}),
+    # Usunięte klucze
+    {"wallet": "kaspa:test", "stats": {"pool": {"tags": []}}, "workers": []},
+    # Zmiana typu wartości
+    {"wallet": "kaspa:test", "stats": [1, 2, 3], "workers": {}}
+]
+
+def encode_all(responses):
+    records = []
+    previous = None
+    for timestamp, response in enumerate(responses):
+        records.append(encode_snapshot(previous, response, timestamp))
+        previous = response
+    return records
+
+@pytest.mark.parametrize("old, new", [
+    ({"a": {"b": 1, "c": [1, 2]}}, {"a": {"b": 2, "c": [1, 3]}}),
+    ({"a": 1, "b": 2}, {"a": 1}),
+    ({"a": [1, 2]}, {"a": [1, 2, 3]}),
+    ({"a": [{"x": 1}, {"x": 2}]}, {"a": [{"x": 1}, {"x": 3, "y": 4}]}),
+    ({"a": 1}, [1]),
+    ({"a": None}, {"a": {"b": None}})
+])
+def test_patch_round_trip(old, new):
+    original = copy.deepcopy(old)
+    patch = diff_json(old, new)
+
+    assert apply_patch(old, patch) == new
+    assert old == original
+
+def test_equal_values_have_no_patch():
+    assert diff_json({"a": [1, {"b": 2}]}, {"a": [1, {"b": 2}]}) is None
+
+def test_records_decode_to_original_responses():
+    records = encode_all(RESPONSES)
+
+    assert "full" in records[0]
+    assert records[1] == {"ts": 1, "same": True}
+    assert "delta" in records[2]
+    assert list(decode_snapshots(records)) == RESPONSES
+
+def test_raw_records_decode_unchanged():
+    # Surowe odpowiedzi zapisane przed wprowadzeniem delt oraz znacznik "same" formatu json
+    records = [RESPONSES[0], {"ts": 1, "same": True}, RESPONSES[2]]
+
+    assert list(decode_snapshots(records)) == RESPONSES[:3]
+
+def test_load_snapshots_from_jsonl_and_archive(tmp_path):
+    file_path = str(tmp_path / "2026-10-18.jsonl")
+    append_jsonl_records(file_path, encode_all(RESPONSES))
+
+    assert list(load_snapshots(file_path)) == RESPONSES
+
+    archive_path = archive_partition([file_path])
+    assert archive_path.endswith(".jsonl.gz")
+    assert list(load_snapshots(archive_path)) == RESPONSES
+
+@pytest.mark.parametrize("storage_format", ["json", "jsonl"])
+def test_stored_full_data_reads_back(tmp_path, monkeypatch, storage_format):
+    monkeypatch.setenv("STORAGE_FORMAT", storage_format)
+    data_dir = str(tmp_path)
+    for second, response in enumerate(RESPONSES):
+        file_path = store_full_data(response, data_dir, "hashrate", datetime(2026, 10, 18, 12, 0, second, tzinfo=timezone.utc))
+
+    assert os.path.basename(file_path) == f"2026-10-18.{storage_format}"
+    assert list(load_snapshots(file_path)) == RESPONSES
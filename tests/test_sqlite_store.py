@@ -0,0 +1,78 @@
+import random
+import time
+
+import pytest
+
+import sqlite_store
+from sqlite_store import add_samples, delete_samples, get_connection, get_store_location, query_daily_stats
+from helper import get_date_from_timestamp
+from stats import compute_stats
+
+DAY = 86400
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Zwraca katalog danych z próbkami czterech zamkniętych dni i dnia bieżącego oraz licznik wywołań stats_bin."""
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    calls = []
+    stats_bin = sqlite_store.stats_bin
+    monkeypatch.setattr(sqlite_store, "stats_bin", lambda value: calls.append(value) or stats_bin(value))
+
+    rng = random.Random(0)
+    today = int(time.time()) // DAY
+    samples = [((today - days) * DAY + offset, rng.uniform(0, 10)) for days in range(4, -1, -1) for offset in range(0, DAY, 3600)]
+    samples.append(((today - 2) * DAY + 60, 0.0))
+    add_samples(str(tmp_path), "revenue60m", samples)
+    return str(tmp_path), samples, calls
+
+def get_expected(samples, start_ts=None, end_ts=None):
+    days = {}
+    for timestamp, value in samples:
+        if (start_ts is None or timestamp >= start_ts) and (end_ts is None or timestamp < end_ts):
+            days.setdefault(get_date_from_timestamp(timestamp), []).append(value)
+    return {date_str: compute_stats(sorted(values)) for date_str, values in sorted(days.items())}
+
+def assert_states_equal(states, expected):
+    assert list(states) == list(expected)
+    for date_str, state in states.items():
+        for key in ("count", "min", "max", "zero", "bins"):
+            assert state[key] == expected[date_str][key]
+        assert state["mean"] == pytest.approx(expected[date_str]["mean"])
+        assert state["m2"] == pytest.approx(expected[date_str]["m2"])
+
+def test_closed_days_are_computed_once(store):
+    data_dir, samples, calls = store
+
+    assert_states_equal(query_daily_stats(data_dir, "revenue60m"), get_expected(samples))
+    assert set(calls) == {value for timestamp, value in samples}
+
+    # Drugie zapytanie liczy przez SQLite tylko dzień bieżący
+    calls.clear()
+    assert_states_equal(query_daily_stats(data_dir, "revenue60m"), get_expected(samples))
+    today = int(time.time()) // DAY
+    assert set(calls) == {value for timestamp, value in samples if timestamp >= today * DAY}
+
+def test_partial_range_is_not_cached(store):
+    data_dir, samples, calls = store
+    today = int(time.time()) // DAY
+    start_ts, end_ts = (today - 3) * DAY + 7200, (today - 1) * DAY
+
+    assert_states_equal(query_daily_stats(data_dir, "revenue60m", start_ts, end_ts), get_expected(samples, start_ts, end_ts))
+    assert_states_equal(query_daily_stats(data_dir, "revenue60m"), get_expected(samples))
+
+    db_path, wallet = get_store_location(data_dir)
+    cached = [day for day, in get_connection(db_path).execute("SELECT day FROM daily_stats ORDER BY day")]
+    assert cached == [today - 4, today - 3, today - 2, today - 1]
+
+def test_new_samples_invalidate_cached_day(store):
+    data_dir, samples, calls = store
+    today = int(time.time()) // DAY
+    query_daily_stats(data_dir, "revenue60m")
+
+    late_sample = [((today - 3) * DAY + 100, 123.0)]
+    add_samples(data_dir, "revenue60m", late_sample)
+    assert_states_equal(query_daily_stats(data_dir, "revenue60m"), get_expected(samples + late_sample))
+
+    delete_samples(data_dir, "revenue60m", (today - 2) * DAY, (today - 1) * DAY)
+    remaining = [sample for sample in samples + late_sample if not (today - 2) * DAY <= sample[0] < (today - 1) * DAY]
+    assert_states_equal(query_daily_stats(data_dir, "revenue60m"), get_expected(remaining))
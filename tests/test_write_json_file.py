@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+import helper
+from helper import append_jsonl_file, write_batch, write_json_file
+
+def test_concurrent_writers_do_not_share_tmp_files(tmp_path):
+    file_path = str(tmp_path / "state.json")
+    payloads = [{"writer": index, "data": list(range(2000))} for index in range(16)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda payload: write_json_file(file_path, payload), payloads))
+
+    assert all(results)
+    with open(file_path) as file:
+        assert json.load(file) in payloads
+    assert os.listdir(tmp_path) == ["state.json"]
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    file_path = str(tmp_path / "state.json")
+    write_json_file(file_path, {"version": 1}, compact=True)
+
+    assert not write_json_file(file_path, {"version": object()})
+    with open(file_path) as file:
+        assert file.read() == '{"version":1}'
+    assert os.listdir(tmp_path) == ["state.json"]
+
+def test_append_is_synced_outside_batch(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(helper.os, "fsync", lambda fd: synced.append(fd))
+    file_path = str(tmp_path / "2026-10-18.jsonl")
+
+    append_jsonl_file(file_path, {"revenue60m": 1})
+    assert len(synced) == 1
+
+    with write_batch():
+        append_jsonl_file(file_path, {"revenue60m": 2})
+        assert len(synced) == 1
+    assert len(synced) >= 2